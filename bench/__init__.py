@@ -0,0 +1,12 @@
+# Benchmarks
+# ==========
+# Timing for the emulator, at three levels: single opcodes, the trace
+# machinery, and whole programs. Every result is a time per unit of work
+# (ns per step, ns per instruction), so lower is always better, and two
+# runs can be compared key by key.
+#
+# Run as: python -m bench run --save bench/baseline.json
+#         python -m bench compare bench/baseline.json current.json
+
+from .suite import run_suite, BENCHMARKS
+from .results import save_results, load_results, compare_results
@@ -0,0 +1,54 @@
+from argparse import ArgumentParser
+
+from .suite import run_suite, BENCHMARKS, DEFAULT_ROM
+from .results import save_results, load_results, compare_results, DEFAULT_THRESHOLD
+
+# Run as: python -m bench run [--only ops trace programs rom] [--save results.json]
+#     or: python -m bench compare baseline.json results.json
+
+
+def print_results(name, results):
+	print(f'--- {name} ---')
+	if not results: print('(skipped)')
+	for key, ns in results.items():
+		print(f'{ns:>12.1f} ns  {key}')
+
+
+def print_comparison(rows, threshold):
+	for name, before, after, ratio, verdict in rows:
+		print(f'{before:>12.1f} {after:>12.1f} ns  {ratio:>6.2f}x  {verdict:<11}  {name}')
+
+	regressions = [row for row in rows if row[4] == 'regression']
+	print(f'{len(rows)} compared, {len(regressions)} regressed by more than {threshold:.0%}')
+	return len(regressions)
+
+
+parser = ArgumentParser(prog='python -m bench')
+commands = parser.add_subparsers(dest='command', required=True)
+
+run_parser = commands.add_parser('run', help='run the benchmarks')
+run_parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='run only these parts')
+run_parser.add_argument('--scale', type=float, default=1.0, help='multiply every iteration count by this')
+run_parser.add_argument('--rom', default=DEFAULT_ROM, help='rom image for the rom benchmark')
+run_parser.add_argument('--save', help='write the results to this JSON file')
+run_parser.add_argument('--compare', help='compare the results against this JSON baseline')
+run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+compare_parser = commands.add_parser('compare', help='compare two saved runs')
+compare_parser.add_argument('baseline')
+compare_parser.add_argument('current')
+compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+args = parser.parse_args()
+
+if args.command == 'run':
+	results = run_suite(args.only, args.scale, args.rom, report=print_results)
+	if args.save: save_results(args.save, results)
+
+	if args.compare:
+		rows = compare_results(load_results(args.compare), results, args.threshold)
+		exit(1 if print_comparison(rows, args.threshold) else 0)
+
+elif args.command == 'compare':
+	rows = compare_results(load_results(args.baseline), load_results(args.current), args.threshold)
+	exit(1 if print_comparison(rows, args.threshold) else 0)
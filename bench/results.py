@@ -0,0 +1,48 @@
+import os
+import json
+import platform
+from datetime import datetime, timezone
+
+
+DEFAULT_THRESHOLD = 0.10 # 10% slower counts as a regression
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json') # the committed baseline
+
+
+def save_results(path: str, results: dict):
+	document = {
+		'meta': {
+			'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+			'python': platform.python_version(),
+			'implementation': platform.python_implementation(),
+			'machine': platform.machine(),
+		},
+		'results': results,
+	}
+
+	with open(path, 'w') as file:
+		json.dump(document, file, indent='\t', sort_keys=True)
+
+
+def load_results(path: str):
+	with open(path) as file:
+		return json.load(file)['results']
+
+
+def compare_results(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD):
+	"""
+	Returns (name, baseline, current, ratio, verdict) for every benchmark
+	in both runs. ratio is current / baseline; verdict is 'regression' or
+	'improvement' when it moves by more than threshold, and '' otherwise.
+	"""
+	rows = []
+	for name in sorted(baseline.keys() & current.keys()):
+		before, after = baseline[name], current[name]
+		ratio = after / before if before > 0 else float('inf')
+
+		if ratio > 1 + threshold: verdict = 'regression'
+		elif ratio < 1 - threshold: verdict = 'improvement'
+		else: verdict = ''
+
+		rows.append((name, before, after, ratio, verdict))
+
+	return rows
@@ -0,0 +1,209 @@
+import os
+import random
+from time import perf_counter_ns
+
+from emulator.state import State, initialize_state_from_rom
+from emulator.opcodes import OPCODE_LIST
+from emulator.step import step, run
+from emulator.trace import Trace, StateDiff
+from emulator.compiler import BlockEngine
+
+
+DEFAULT_ROM = os.path.join('roms', 'invaders', 'invaders')
+
+REPEAT = 5 # each timing is the best of this many runs
+
+
+def random_state(seed: int):
+	generator = random.Random(seed)
+	state = State()
+	state.MEM[:] = generator.randbytes(State.MEMSIZE)
+	state.A, state.B, state.C, state.D, state.E, state.H, state.L = generator.randbytes(7)
+	state.SP = 0x2400
+
+	return state
+
+
+def best_ns(function, number: int):
+	"""Best of REPEAT runs of function(number), in ns per iteration."""
+	function(number) # warm up
+	times = []
+	for _ in range(REPEAT):
+		start = perf_counter_ns()
+		function(number)
+		times.append(perf_counter_ns() - start)
+
+	return min(times) / number
+
+
+# Opcodes ======
+
+def op_key(op):
+	registers = [arg for arg in op.str_args if '{' not in arg] # leave out immediates
+	return f'op/{op.code:#04x} {op.name} {", ".join(registers)}'.rstrip()
+
+
+def bench_ops(scale: float):
+	"""ns per step() of each opcode, with the loop's own overhead taken out."""
+	number = max(1, int(20_000 * scale))
+	results = {}
+
+	for op in OPCODE_LIST:
+		state = random_state(op.code)
+		PC, SP, MEM, code = 0x1000, state.SP, state.MEM, op.code
+
+		# put the op back every time: a store through a random HL can land on it.
+		def stepped(n):
+			for _ in range(n):
+				MEM[PC] = code
+				state.PC = PC
+				state.SP = SP
+				step(state)
+
+		def overhead(n):
+			for _ in range(n):
+				MEM[PC] = code
+				state.PC = PC
+				state.SP = SP
+
+		results[op_key(op)] = max(0.0, best_ns(stepped, number) - best_ns(overhead, number))
+
+	return results
+
+
+# Trace ======
+
+def bench_trace(scale: float):
+	number = max(1, int(2_000 * scale))
+	results = {}
+
+	before, after = random_state(1), random_state(1)
+	step(after)
+	results['trace/StateDiff'] = best_ns(lambda n: [StateDiff.between(before, after) for _ in range(n)], number)
+
+	def forward(n):
+		trace = Trace(random_state(2))
+		for _ in range(n): trace.step_forward()
+
+	def backward(n):
+		trace = Trace(random_state(2))
+		for _ in range(n): trace.step_forward()
+		start = perf_counter_ns()
+		for _ in range(n): trace.step_backward()
+		return perf_counter_ns() - start
+
+	results['trace/step_forward'] = best_ns(forward, number)
+	results['trace/step_backward'] = min(backward(number) for _ in range(REPEAT)) / number
+
+	return results
+
+
+# Programs ======
+# fixed instruction counts of small loops, and of a real ROM when one is
+# available. Each runs on the interpreter and on the block compiler.
+
+PROGRAMS = {
+	# nested countdown: branch heavy.
+	'countdown': bytes([
+		0x06, 0x00,       # 0x00 mvi b, 0
+		0x0E, 0x00,       # 0x02 mvi c, 0
+		0x0D,             # 0x04 dcr c
+		0xC2, 0x04, 0x00, # 0x05 jnz 0x0004
+		0x05,             # 0x08 dcr b
+		0xC2, 0x02, 0x00, # 0x09 jnz 0x0002
+		0xC3, 0x00, 0x00, # 0x0C jmp 0x0000
+	]),
+	# a run of flag-setting ALU ops.
+	'alu': bytes([
+		0x80, 0x89, 0x92, 0xAB, 0x24, 0x2D, 0xB8, 0xB7, # add b; adc c; sub d; xra e; inr h; dcr l; cmp b; ora a
+		0x05,             # dcr b
+		0xC2, 0x00, 0x00, # jnz 0x0000
+		0x27,             # daa
+		0xC3, 0x00, 0x00, # jmp 0x0000
+	]),
+	# copy 256 bytes from 0x2000 to 0x3000, forever.
+	'memcopy': bytes([
+		0x21, 0x00, 0x20, # 0x00 lxi h, 0x2000
+		0x11, 0x00, 0x30, # 0x03 lxi d, 0x3000
+		0x06, 0x00,       # 0x06 mvi b, 0
+		0x7E,             # 0x08 mov a, m
+		0x12,             # 0x09 stax d
+		0x23,             # 0x0A inx h
+		0x13,             # 0x0B inx d
+		0x05,             # 0x0C dcr b
+		0xC2, 0x08, 0x00, # 0x0D jnz 0x0008
+		0xC3, 0x00, 0x00, # 0x10 jmp 0x0000
+	]),
+	# calls and returns, with the stack traffic around them.
+	'calls': bytes([
+		0x31, 0x00, 0x24, # 0x00 lxi sp, 0x2400
+		0xCD, 0x09, 0x00, # 0x03 call 0x0009
+		0xC3, 0x03, 0x00, # 0x06 jmp 0x0003
+		0xC5,             # 0x09 push b
+		0xD5,             # 0x0A push d
+		0xD1,             # 0x0B pop d
+		0xC1,             # 0x0C pop b
+		0xC9,             # 0x0D ret
+	]),
+}
+
+# engine name -> a function of a state, giving a function that runs it n
+# instructions on from wherever it is.
+ENGINES = {
+	'interpreter': lambda state: lambda n: run(state, n),
+	'compiled': lambda state: BlockEngine(state).run,
+}
+
+
+def bench_program(key: str, rom: bytes, number: int):
+	"""
+	ns per instruction of rom, on each engine, in the steady state: one
+	machine runs on across every timing, and best_ns's warm-up run builds
+	the engine and compiles its blocks before any of them.
+	"""
+	results = {}
+	for engine_name, engine in ENGINES.items():
+		program = engine(initialize_state_from_rom(rom))
+		results[f'{key}/{engine_name}'] = best_ns(program, number)
+
+	return results
+
+
+def bench_programs(scale: float):
+	number = max(1, int(200_000 * scale))
+	results = {}
+	for name, rom in PROGRAMS.items():
+		results.update(bench_program(f'program/{name}', rom, number))
+
+	return results
+
+
+def bench_rom(scale: float, path: str = DEFAULT_ROM):
+	if not os.path.exists(path): return {}
+
+	with open(path, 'rb') as file: rom = file.read()
+	name = os.path.basename(path)
+
+	return bench_program(f'rom/{name}', rom, max(1, int(500_000 * scale)))
+
+
+BENCHMARKS = {
+	'ops': bench_ops,
+	'trace': bench_trace,
+	'programs': bench_programs,
+	'rom': bench_rom,
+}
+
+
+def run_suite(only=None, scale: float = 1.0, rom: str = DEFAULT_ROM, report=None):
+	results = {}
+	for name, benchmark in BENCHMARKS.items():
+		if only and name not in only: continue
+
+		if name == 'rom': part = benchmark(scale, rom)
+		else: part = benchmark(scale)
+
+		if report: report(name, part)
+		results.update(part)
+
+	return results
@@ -1,3 +1,18 @@
+from argparse import ArgumentParser
+
 import editor
+from emulator.tracefile import COMPRESSIONS, NONE
+
+# Run as: python -m edit
+#     or: python -m edit --record session.trace
+#     or: python -m edit --replay session.trace
+#     or: python -m edit --window 100000
+
+parser = ArgumentParser(prog='python -m edit')
+parser.add_argument('--record', default=None, help='write every step taken to this trace file')
+parser.add_argument('--replay', default=None, help='browse a trace file instead of running the rom')
+parser.add_argument('--compress', choices=COMPRESSIONS, default=NONE, help='compression for --record')
+parser.add_argument('--window', type=int, default=None, help='keep only the last this many steps in memory')
+args = parser.parse_args()
 
-editor.run()
\ No newline at end of file
+editor.run(args.record, args.replay, args.compress, args.window)
@@ -1,10 +1,15 @@
 import curses
 import curses.panel as panel
 
-from emulator.trace import Trace
+from emulator.trace import Trace, RingTrace
+from emulator.tracefile import TraceWriter, TraceFile
 from emulator.state import State, initialize_state_from_rom
 from emulator.state import Uint8Registers as U8
 from emulator.state import Uint16Registers as U16
+from emulator.rom import open_image
+from emulator.memory import invaders_map
+from emulator.ports import invaders_bus
+from emulator.breakpoints import Breakpoints
 
 from emulator.step import step
 
@@ -40,6 +45,9 @@ class EditorState():
 		self.partial_input = ''
 		self.command_history = []
 
+		self.breakpoints = Breakpoints()
+		self.message = '' # what the last command has to say
+
 
 	def render(self, trace):
 		H, W = self.parent_screen.getmaxyx()
@@ -61,7 +69,7 @@ class EditorState():
 		self.register_panel.render(state)
 
 		last_command_name = self.command_history[-1].longname if len(self.command_history) else ''
-		self.input_panel.render(self.partial_input, last_command_name)
+		self.input_panel.render(self.partial_input, last_command_name, self.message)
 	
 
 	def handle_input(self):
@@ -111,19 +119,33 @@ class EditorState():
 
 
 
-def ui_main(stdscr):
+def ui_main(stdscr, record=None, replay=None, compression='none', window=None):
+
+	if replay:
+		trace = TraceFile(replay).replay()
+	else:
+		state = open_image('roms/invaders/invaders').to_state()
+		invaders_map().install(state)
+		invaders_bus().install(state)
+		writer = TraceWriter(record, state, compression) if record else None
+		trace = RingTrace(state, window, writer=writer) if window else Trace(state, writer=writer)
 
-	file = open('roms/invaders/invaders', 'rb')
-	state = initialize_state_from_rom(file.read())
-	trace = Trace(state)
 	editor = EditorState(stdscr)
 
 	while editor.is_running: 
 		editor.render(trace)
 		command = editor.handle_input()
 
-		if command is not None: command.execute(trace, editor)
+		if command is not None:
+			editor.message = ''
+			command.execute(trace, editor)
+
+	trace.close()
 
 
-def run():
-	curses.wrapper(ui_main)
\ No newline at end of file
+def run(record=None, replay=None, compression='none', window=None):
+	"""
+	record: a trace file to write the session's steps to; replay: one to
+	browse instead of running. window: keep only that many steps in memory.
+	"""
+	curses.wrapper(ui_main, record, replay, compression, window)
@@ -1,5 +1,6 @@
-from .step import StepCommand
+from .step import StepCommand, GotoCommand
 from .quit import QuitCommand
+from .breakpoints import BreakCommand, DeleteCommand, ContinueCommand
 
 
 def parse_command_string(partial_input: str):
@@ -27,6 +28,10 @@ def parse_command_string(partial_input: str):
 
 EDITOR_COMMAND_LIST = [
 	StepCommand,
+	GotoCommand,
+	BreakCommand,
+	DeleteCommand,
+	ContinueCommand,
 	QuitCommand
 ]
 
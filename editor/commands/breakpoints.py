@@ -0,0 +1,68 @@
+from editor.commands.abstract import Command
+from emulator.breakpoints import ConditionError
+
+
+class BreakCommand(Command):
+	name : str = 'b'
+	longname : str = 'break'
+
+	def execute(self, trace, editor):
+		# b 0x1a5f, or b pc == 0x1a5f and A > 0x20
+		try:
+			breakpoint = editor.breakpoints.add(' '.join(self.args))
+			editor.message = f'breakpoint {breakpoint}'
+
+		except ConditionError as error:
+			editor.message = str(error)
+
+
+class DeleteCommand(Command):
+	name : str = 'd'
+	longname : str = 'delete'
+
+	def execute(self, trace, editor):
+		# d 2 deletes breakpoint #2; d on its own deletes them all.
+		try:
+			numbers = [int(number.lstrip('#')) for number in self.args]
+
+		except ValueError:
+			editor.message = f'no breakpoint {" ".join(self.args)}'
+			return
+
+		try:
+			for number in numbers: editor.breakpoints.remove(number)
+			if not numbers: editor.breakpoints.clear()
+			editor.message = f'{len(editor.breakpoints)} breakpoints'
+
+		except ValueError as error: # d 99, say
+			editor.message = str(error)
+
+
+class ContinueCommand(Command):
+	name : str = 'c'
+	longname : str = 'continue'
+
+	LIMIT : int = 100000 # steps to give up after, each repeat
+
+	def execute(self, trace, editor):
+		breakpoints = editor.breakpoints
+
+		for i in range(self.repeats):
+			for count in range(self.LIMIT):
+				position = trace.position
+				trace.step_forward()
+				state = trace.current_state()
+
+				if trace.position == position: # halted, or the end of a replay
+					editor.message = 'halted' if state.HALTED else 'end of the trace'
+					return
+
+				if state.PC in breakpoints.pcs or breakpoints.anywhere:
+					breakpoint = breakpoints.check(state)
+					if breakpoint:
+						editor.message = f'stopped at {breakpoint}'
+						break
+
+			else:
+				editor.message = f'no breakpoint in {self.LIMIT} steps'
+				return
@@ -8,3 +8,24 @@ class StepCommand(Command):
 	def execute(self, trace, editor):
 		for i in range(self.repeats):
 			trace.step_forward()
+
+
+class GotoCommand(Command):
+	name : str = 'goto'
+	longname : str = 'goto'
+
+	def execute(self, trace, editor):
+		# goto 5000 moves to step 5000, running up to it if it hasn't been recorded yet.
+		try:
+			target = int(self.args[0], 0)
+
+		except (IndexError, ValueError):
+			editor.message = 'goto needs a step number'
+			return
+
+		try:
+			trace.seek(target)
+			editor.message = f'step {trace.position}'
+
+		except ValueError as error: # before a ring trace's window, say
+			editor.message = str(error)
@@ -8,7 +8,7 @@ class InputPanel():
 
 		self.window = curses.newwin(2, cols, y, 0)
 
-	def render(self, partial_input, last_command_name):
+	def render(self, partial_input, last_command_name, message=''):
 		self.window.clear()
 		self.window.attron(curses.color_pair(WHITE_BG_COLOR))
 		self.window.attron(curses.A_BOLD)
@@ -16,6 +16,7 @@ class InputPanel():
 
 		command_string = f'({last_command_name}): {partial_input}'
 		command_string = command_string + (' ' * (W - len(command_string)))
+		if message: command_string = command_string[:max(0, W - len(message) - 1)] + message + ' '
 
 		self.window.addstr(0, 0, command_string)
 
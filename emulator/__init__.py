@@ -1,24 +1,9 @@
 from .state import State, initialize_state_from_rom
 from .state import FlagsRegisters as F
 from .step import step
+from .runner import run, run_state, RunResult, StopReason
 
 
-def emulate_from_rom(rom: bytes):
-	state = initialize_state_from_rom(rom)
-	state.FLAGS[F.E] = True
-
-	while state.FLAGS[F.E]:
-		print(state)
-
-		try:
-			step(state)
-			input()
-		except:
-			print('Exception')
-			state.FLAGS[F.E] = False
-
-	print('Done.')
-
 
 
 	
@@ -0,0 +1,546 @@
+# Batch Engine
+# ============
+# Runs N independent machines in lockstep, for fuzzing and parameter
+# sweeps. Every register is an (N,) array and memory is one (N, 65536)
+# array, so an instruction is carried out for many machines by a single
+# NumPy kernel instead of N trips through Op.step.
+#
+# Each step reads every machine's opcode, groups the machines by it, and
+# runs one kernel per group. Machines in the same group share an opcode
+# but nothing else: registers, addresses and branch outcomes are all per
+# machine. Flags are computed eagerly here; an array op is cheap, and
+# laziness would only add masks.
+#
+# The Op classes in emulator/opcodes remain the reference semantics; the
+# kernels below have to agree with their step() methods, and
+# test/test_batch.py checks that they do.
+
+import numpy as np
+
+from .state import State, U8_NAMES, U16_NAMES, FLAG_NAMES
+from .opcodes import *
+from .step import OPS
+from .cycles import CYCLES, CYCLES_TAKEN
+from .flags import PARITY, DAA as DAA_TABLE
+from .ports import OPEN_BUS
+from .memory import as_buffer
+
+
+CYCLES_ARRAY = np.array(CYCLES, dtype=np.int64)
+PARITY_ARRAY = np.array(PARITY, dtype=bool)
+DAA_RESULT = np.array([result for result, aux in DAA_TABLE], dtype=np.int32)
+DAA_AUX = np.array([aux for result, aux in DAA_TABLE], dtype=np.int32)
+
+CONDITION_FLAGS = {
+	'nz': ('Z', False), 'z': ('Z', True),
+	'nc': ('CY', False), 'c': ('CY', True),
+	'po': ('P', False), 'pe': ('P', True),
+	'p': ('S', False), 'm': ('S', True),
+}
+
+
+class BatchState():
+	"""
+	N machines. A–L are (N,) uint8, SP and PC (N,) uint16, the flags and
+	HALTED (N,) bool, CYCLES (N,) int64, and MEM (N, 65536) uint8. Machine
+	i can be copied out as a State with to_state(i).
+	"""
+	MEMSIZE = State.MEMSIZE
+
+	__slots__ = U8_NAMES + U16_NAMES + FLAG_NAMES + ('HALTED', 'CYCLES', 'MEM')
+
+	def __init__(self, n: int):
+		for name in U8_NAMES: setattr(self, name, np.zeros(n, dtype=np.uint8))
+		for name in U16_NAMES: setattr(self, name, np.zeros(n, dtype=np.uint16))
+		for name in FLAG_NAMES: setattr(self, name, np.zeros(n, dtype=bool))
+		self.HALTED = np.zeros(n, dtype=bool)
+		self.CYCLES = np.zeros(n, dtype=np.int64)
+		self.MEM = np.zeros((n, BatchState.MEMSIZE), dtype=np.uint8)
+
+	@staticmethod
+	def from_states(states: list):
+		batch = BatchState(len(states))
+		for i, state in enumerate(states):
+			batch.set_state(i, state)
+
+		return batch
+
+	@staticmethod
+	def from_rom(data: bytes, n: int, base_pointer: int = 0):
+		"""n copies of the machine initialize_state_from_rom would give."""
+		batch = BatchState(n)
+		batch.MEM[:, base_pointer:base_pointer + len(data)] = np.frombuffer(data, dtype=np.uint8)
+		return batch
+
+	def set_state(self, i: int, state: State):
+		for name in U8_NAMES + U16_NAMES + FLAG_NAMES + ('HALTED', 'CYCLES'):
+			getattr(self, name)[i] = getattr(state, name)
+		self.MEM[i] = np.frombuffer(as_buffer(state.MEM), dtype=np.uint8)
+
+	def to_state(self, i: int):
+		state = State()
+		for name in U8_NAMES + U16_NAMES + ('CYCLES',):
+			setattr(state, name, int(getattr(self, name)[i]))
+		for name in FLAG_NAMES + ('HALTED',):
+			setattr(state, name, bool(getattr(self, name)[i]))
+		state.MEM[:] = self.MEM[i].tobytes()
+
+		return state
+
+	def to_states(self):
+		return [self.to_state(i) for i in range(len(self))]
+
+	def __len__(self):
+		return len(self.PC)
+
+
+# Kernels ======
+# each takes (op, batch, rows): the op every machine in rows is about to
+# run, and the indices of those machines. PC has already been moved past
+# the opcode, as step() does. Values are widened to int32 before any
+# arithmetic and masked back on the way out.
+
+def get(batch, name, rows):
+	return getattr(batch, name)[rows].astype(np.int32)
+
+def load(batch, rows, addr):
+	return batch.MEM[rows, addr].astype(np.int32)
+
+def imm8(batch, rows):
+	return load(batch, rows, batch.PC[rows])
+
+def imm16(batch, rows):
+	PC = get(batch, 'PC', rows)
+	return load(batch, rows, PC) | (load(batch, rows, (PC + 0x1) & 0xFFFF) << 8)
+
+def skip(batch, rows, n):
+	batch.PC[rows] = (get(batch, 'PC', rows) + n) & 0xFFFF
+
+def pair(batch, rows, rh, rl):
+	return (get(batch, rh, rows) << 8) | get(batch, rl, rows)
+
+def set_pair(batch, rows, rh, rl, value):
+	getattr(batch, rh)[rows] = (value >> 8) & 0xFF
+	getattr(batch, rl)[rows] = value & 0xFF
+
+def set_zsp(batch, rows, result):
+	result = result & 0xFF
+	batch.Z[rows] = result == 0
+	batch.S[rows] = (result & 0x80) != 0
+	batch.P[rows] = PARITY_ARRAY[result]
+
+def push(batch, rows, high, low):
+	SP = get(batch, 'SP', rows)
+	batch.MEM[rows, (SP - 0x1) & 0xFFFF] = high
+	batch.MEM[rows, (SP - 0x2) & 0xFFFF] = low
+	batch.SP[rows] = (SP - 0x2) & 0xFFFF
+
+def condition(op, batch, rows):
+	"""Mask of the machines in rows that take op's branch."""
+	name = op.name.lstrip('*') # aliases are unconditional.
+	if name in ('jmp', 'call', 'ret'): return np.ones(len(rows), dtype=bool)
+
+	flag, value = CONDITION_FLAGS[name[1:]]
+	return getattr(batch, flag)[rows] == value
+
+
+# data transfer ------
+
+def kernel_mov_reg_reg(op, batch, rows):
+	getattr(batch, op.r1_name)[rows] = getattr(batch, op.r2_name)[rows]
+
+def kernel_mov_reg_mem(op, batch, rows):
+	getattr(batch, op.r1_name)[rows] = load(batch, rows, pair(batch, rows, 'H', 'L'))
+
+def kernel_mov_mem_reg(op, batch, rows):
+	batch.MEM[rows, pair(batch, rows, 'H', 'L')] = getattr(batch, op.r1_name)[rows]
+
+def kernel_mvi_reg_imm(op, batch, rows):
+	getattr(batch, op.r1_name)[rows] = imm8(batch, rows)
+	skip(batch, rows, 1)
+
+def kernel_mvi_mem_imm(op, batch, rows):
+	batch.MEM[rows, pair(batch, rows, 'H', 'L')] = imm8(batch, rows)
+	skip(batch, rows, 1)
+
+def kernel_lxi_reg_imm(op, batch, rows):
+	set_pair(batch, rows, op.rh_name, op.rl_name, imm16(batch, rows))
+	skip(batch, rows, 2)
+
+def kernel_lxi_sp(op, batch, rows):
+	batch.SP[rows] = imm16(batch, rows)
+	skip(batch, rows, 2)
+
+def kernel_lda(op, batch, rows):
+	batch.A[rows] = load(batch, rows, imm16(batch, rows))
+	skip(batch, rows, 2)
+
+def kernel_sta(op, batch, rows):
+	batch.MEM[rows, imm16(batch, rows)] = batch.A[rows]
+	skip(batch, rows, 2)
+
+def kernel_shld(op, batch, rows):
+	addr = imm16(batch, rows)
+	batch.MEM[rows, (addr + 0x1) & 0xFFFF] = batch.H[rows]
+	batch.MEM[rows, addr] = batch.L[rows]
+	skip(batch, rows, 2)
+
+def kernel_lhld(op, batch, rows):
+	addr = imm16(batch, rows)
+	batch.H[rows] = load(batch, rows, (addr + 0x1) & 0xFFFF)
+	batch.L[rows] = load(batch, rows, addr)
+	skip(batch, rows, 2)
+
+def kernel_ldax_reg(op, batch, rows):
+	batch.A[rows] = load(batch, rows, pair(batch, rows, op.r1_name, op.r2_name))
+
+def kernel_stax_reg(op, batch, rows):
+	batch.MEM[rows, pair(batch, rows, op.r1_name, op.r2_name)] = batch.A[rows]
+
+def kernel_xchg(op, batch, rows):
+	D, E, H, L = (getattr(batch, name)[rows] for name in 'DEHL')
+	batch.D[rows], batch.E[rows], batch.H[rows], batch.L[rows] = H, L, D, E
+
+
+# arithmetic and logic ------
+
+def kernel_alu(expression, carry_in=False, source='reg', store_result=True):
+	def kernel(op, batch, rows):
+		A = get(batch, 'A', rows)
+		if source == 'reg': value = get(batch, op.r_name, rows)
+		elif source == 'mem': value = load(batch, rows, pair(batch, rows, 'H', 'L'))
+		else: value = imm8(batch, rows)
+
+		carry = get(batch, 'CY', rows) if carry_in else 0
+		if expression == '+': result = A + value + carry
+		elif expression == '-': result = A - value - carry
+		elif expression == '&': result = A & value
+		elif expression == '^': result = A ^ value
+		else: result = A | value
+
+		# AC as the interpreter works it out; see emulator/flags.py.
+		if expression == '+': batch.AC[rows] = ((A ^ value ^ result) & 0x10) != 0
+		elif expression == '-': batch.AC[rows] = ((A ^ value ^ result) & 0x10) == 0
+		elif expression == '&': batch.AC[rows] = ((A | value) & 0x08) != 0
+		else: batch.AC[rows] = False
+
+		set_zsp(batch, rows, result)
+		batch.CY[rows] = (result > 0xFF) | (result < 0x00)
+		if store_result: batch.A[rows] = result & 0xFF
+		if source == 'imm': skip(batch, rows, 1)
+
+	return kernel
+
+def kernel_inr_dcr(expression, source='reg'):
+	def kernel(op, batch, rows):
+		if source == 'reg': value = get(batch, op.r_name, rows)
+		else:
+			addr = pair(batch, rows, 'H', 'L')
+			value = load(batch, rows, addr)
+
+		if expression == '+':
+			result = (value + 1) & 0xFF
+			batch.AC[rows] = (result & 0x0F) == 0x00
+		else:
+			result = (value - 1) & 0xFF
+			batch.AC[rows] = (result & 0x0F) != 0x0F
+
+		set_zsp(batch, rows, result)
+		if source == 'reg': getattr(batch, op.r_name)[rows] = result
+		else: batch.MEM[rows, addr] = result
+
+	return kernel
+
+def kernel_inx_dcx(delta, sp=False):
+	def kernel(op, batch, rows):
+		if sp: batch.SP[rows] = (get(batch, 'SP', rows) + delta) & 0xFFFF
+		else: set_pair(batch, rows, op.rh_name, op.rl_name, (pair(batch, rows, op.rh_name, op.rl_name) + delta) & 0xFFFF)
+
+	return kernel
+
+def kernel_dad(op, batch, rows):
+	if isinstance(op, DAD_SP): value = get(batch, 'SP', rows)
+	else: value = pair(batch, rows, op.rh_name, op.rl_name)
+
+	result = value + pair(batch, rows, 'H', 'L')
+	batch.CY[rows] = result > 0xFFFF
+	set_pair(batch, rows, 'H', 'L', result & 0xFFFF)
+
+def kernel_daa(op, batch, rows):
+	index = get(batch, 'A', rows) | (get(batch, 'CY', rows) << 8) | (get(batch, 'AC', rows) << 9)
+	result, aux = DAA_RESULT[index], DAA_AUX[index]
+
+	set_zsp(batch, rows, result)
+	batch.CY[rows] = result > 0xFF
+	batch.AC[rows] = ((aux ^ result) & 0x10) != 0
+	batch.A[rows] = result & 0xFF
+
+def kernel_rlc(op, batch, rows):
+	A = get(batch, 'A', rows)
+	batch.CY[rows] = (A & 0x80) != 0
+	batch.A[rows] = ((A << 1) & 0xFF) | (A >> 7)
+
+def kernel_rrc(op, batch, rows):
+	A = get(batch, 'A', rows)
+	batch.CY[rows] = (A & 0x01) != 0
+	batch.A[rows] = ((A & 0x01) << 7) | (A >> 1)
+
+def kernel_ral(op, batch, rows):
+	result = (get(batch, 'A', rows) << 1) | get(batch, 'CY', rows)
+	batch.CY[rows] = result > 0xFF
+	batch.A[rows] = result & 0xFF
+
+def kernel_rar(op, batch, rows):
+	A = get(batch, 'A', rows)
+	batch.A[rows] = (get(batch, 'CY', rows) << 7) | (A >> 1)
+	batch.CY[rows] = (A & 0x01) != 0
+
+def kernel_cma(op, batch, rows):
+	batch.A[rows] = ~batch.A[rows]
+
+def kernel_cmc(op, batch, rows):
+	batch.CY[rows] = ~batch.CY[rows]
+
+def kernel_stc(op, batch, rows):
+	batch.CY[rows] = True
+
+
+# machine ------
+
+def kernel_nop(op, batch, rows):
+	pass
+
+def kernel_push_reg(op, batch, rows):
+	push(batch, rows, getattr(batch, op.rh_name)[rows], getattr(batch, op.rl_name)[rows])
+
+def kernel_push_psw(op, batch, rows):
+	psw = get(batch, 'CY', rows) | 2 \
+		| (get(batch, 'P', rows) << 2) \
+		| (get(batch, 'AC', rows) << 4) \
+		| (get(batch, 'Z', rows) << 6) \
+		| (get(batch, 'S', rows) << 7)
+
+	push(batch, rows, batch.A[rows], psw)
+
+def kernel_pop_reg(op, batch, rows):
+	SP = get(batch, 'SP', rows)
+	getattr(batch, op.rh_name)[rows] = load(batch, rows, (SP + 0x1) & 0xFFFF)
+	getattr(batch, op.rl_name)[rows] = load(batch, rows, SP)
+	batch.SP[rows] = (SP + 0x2) & 0xFFFF
+
+def kernel_pop_psw(op, batch, rows):
+	SP = get(batch, 'SP', rows)
+	psw = load(batch, rows, SP)
+	batch.CY[rows] = (psw & 0x01) != 0
+	batch.P[rows] = (psw & 0x04) != 0
+	batch.AC[rows] = (psw & 0x10) != 0
+	batch.Z[rows] = (psw & 0x40) != 0
+	batch.S[rows] = (psw & 0x80) != 0
+	batch.A[rows] = load(batch, rows, (SP + 0x1) & 0xFFFF)
+	batch.SP[rows] = (SP + 0x2) & 0xFFFF
+
+def kernel_xthl(op, batch, rows):
+	SP = get(batch, 'SP', rows)
+	SP_plus_1 = (SP + 0x1) & 0xFFFF
+	H, L = batch.H[rows], batch.L[rows]
+
+	batch.L[rows] = load(batch, rows, SP)
+	batch.H[rows] = load(batch, rows, SP_plus_1)
+	batch.MEM[rows, SP] = L
+	batch.MEM[rows, SP_plus_1] = H
+
+def kernel_sphl(op, batch, rows):
+	batch.SP[rows] = pair(batch, rows, 'H', 'L')
+
+def kernel_in(op, batch, rows):
+	skip(batch, rows, 1) # no port bus; every port reads as an open bus.
+	batch.A[rows] = OPEN_BUS
+
+def kernel_out(op, batch, rows):
+	skip(batch, rows, 1)
+
+def kernel_ei(op, batch, rows):
+	batch.DI[rows] = False
+
+def kernel_di(op, batch, rows):
+	batch.DI[rows] = True
+
+def kernel_hlt(op, batch, rows):
+	batch.HALTED[rows] = True
+	batch.RUN[rows] = False
+
+
+# branches ------
+
+def kernel_jcond(op, batch, rows):
+	taken = condition(op, batch, rows)
+	target = imm16(batch, rows)
+	batch.PC[rows] = np.where(taken, target, (get(batch, 'PC', rows) + 0x2) & 0xFFFF)
+
+def kernel_ccond(op, batch, rows):
+	taken = condition(op, batch, rows)
+	skip(batch, rows[~taken], 2)
+
+	rows = rows[taken]
+	ret = (get(batch, 'PC', rows) + 0x2) & 0xFFFF
+	push(batch, rows, ret >> 8, ret & 0xFF)
+	batch.CYCLES[rows] += CYCLES_TAKEN[op.code] - CYCLES[op.code]
+	# read after the push, like CCOND_Imm: the stack may overlap the address.
+	batch.PC[rows] = imm16(batch, rows)
+
+def kernel_rcond(op, batch, rows):
+	rows = rows[condition(op, batch, rows)]
+	SP = get(batch, 'SP', rows)
+	batch.PC[rows] = load(batch, rows, SP) | (load(batch, rows, (SP + 0x1) & 0xFFFF) << 8)
+	batch.SP[rows] = (SP + 0x2) & 0xFFFF
+	batch.CYCLES[rows] += CYCLES_TAKEN[op.code] - CYCLES[op.code]
+
+def kernel_rst(op, batch, rows):
+	PC = get(batch, 'PC', rows)
+	push(batch, rows, PC >> 8, PC & 0xFF)
+	batch.PC[rows] = op.addr
+
+def kernel_pchl(op, batch, rows):
+	batch.PC[rows] = pair(batch, rows, 'H', 'L')
+
+
+KERNELS = {
+	MOV_Reg_Reg: kernel_mov_reg_reg,
+	MOV_Reg_Mem: kernel_mov_reg_mem,
+	MOV_Mem_Reg: kernel_mov_mem_reg,
+	MVI_Reg_Imm: kernel_mvi_reg_imm,
+	MVI_Mem_Imm: kernel_mvi_mem_imm,
+	LXI_Reg_Imm: kernel_lxi_reg_imm,
+	LXI_SP: kernel_lxi_sp,
+	LDA: kernel_lda,
+	STA: kernel_sta,
+	SHLD: kernel_shld,
+	LHLD: kernel_lhld,
+	LDAX_Reg: kernel_ldax_reg,
+	STAX_Reg: kernel_stax_reg,
+	XCHG: kernel_xchg,
+
+	ADD_Reg: kernel_alu('+'),
+	ADD_Mem: kernel_alu('+', source='mem'),
+	ADI: kernel_alu('+', source='imm'),
+	ADC_Reg: kernel_alu('+', carry_in=True),
+	ADC_Mem: kernel_alu('+', carry_in=True, source='mem'),
+	ACI: kernel_alu('+', carry_in=True, source='imm'),
+	SUB_Reg: kernel_alu('-'),
+	SUB_Mem: kernel_alu('-', source='mem'),
+	SUI: kernel_alu('-', source='imm'),
+	SBB_Reg: kernel_alu('-', carry_in=True),
+	SBB_Mem: kernel_alu('-', carry_in=True, source='mem'),
+	SBI: kernel_alu('-', carry_in=True, source='imm'),
+	INR_Reg: kernel_inr_dcr('+'),
+	INR_Mem: kernel_inr_dcr('+', source='mem'),
+	DCR_Reg: kernel_inr_dcr('-'),
+	DCR_Mem: kernel_inr_dcr('-', source='mem'),
+	INX_Reg: kernel_inx_dcx(+1),
+	INX_SP: kernel_inx_dcx(+1, sp=True),
+	DCX_Reg: kernel_inx_dcx(-1),
+	DCX_SP: kernel_inx_dcx(-1, sp=True),
+	DAD_Reg: kernel_dad,
+	DAD_SP: kernel_dad,
+	DAA: kernel_daa,
+
+	ANA_Reg: kernel_alu('&'),
+	ANA_Mem: kernel_alu('&', source='mem'),
+	ANI: kernel_alu('&', source='imm'),
+	XRA_Reg: kernel_alu('^'),
+	XRA_Mem: kernel_alu('^', source='mem'),
+	XRI: kernel_alu('^', source='imm'),
+	ORA_Reg: kernel_alu('|'),
+	ORA_Mem: kernel_alu('|', source='mem'),
+	ORI: kernel_alu('|', source='imm'),
+	CMP_Reg: kernel_alu('-', store_result=False),
+	CMP_Mem: kernel_alu('-', source='mem', store_result=False),
+	CPI: kernel_alu('-', source='imm', store_result=False),
+	RLC: kernel_rlc,
+	RRC: kernel_rrc,
+	RAL: kernel_ral,
+	RAR: kernel_rar,
+	CMA: kernel_cma,
+	CMC: kernel_cmc,
+	STC: kernel_stc,
+
+	NOP: kernel_nop,
+	PUSH_Reg: kernel_push_reg,
+	PUSH_PSW: kernel_push_psw,
+	POP_Reg: kernel_pop_reg,
+	POP_PSW: kernel_pop_psw,
+	XTHL: kernel_xthl,
+	SPHL: kernel_sphl,
+	IN_Imm: kernel_in,
+	OUT_Imm: kernel_out,
+	EI: kernel_ei,
+	DI: kernel_di,
+	HLT: kernel_hlt,
+
+	JCOND_Imm: kernel_jcond,
+	CCOND_Imm: kernel_ccond,
+	RCOND: kernel_rcond,
+	RST: kernel_rst,
+	PCHL: kernel_pchl,
+}
+
+
+def missing_kernel(op, batch, rows):
+	raise NotImplementedError(f'[{op.code}] {op.name}: no batch kernel!')
+
+# opcode -> (op, kernel), dense like step.DISPATCH_TABLE.
+BATCH_TABLE = tuple((op, KERNELS.get(type(op), missing_kernel)) for op in OPS)
+
+
+# Stepping ======
+
+def step(batch: BatchState, rows=None):
+	"""
+	One instruction on each machine in rows (default: all of them) that
+	isn't halted. Equivalent to calling emulator.step.step on each one.
+	"""
+	if rows is None: rows = np.arange(len(batch))
+	rows = rows[~batch.HALTED[rows]] # a halted machine fetches nothing
+	if len(rows) == 0: return
+
+	# fetch & decode
+	PC = batch.PC[rows]
+	opcodes = batch.MEM[rows, PC]
+	batch.PC[rows] = (PC.astype(np.int32) + 0x1) & 0xFFFF
+
+	# group machines by opcode: one sort, then one kernel call per run.
+	order = np.argsort(opcodes, kind='stable')
+	grouped = opcodes[order].astype(np.int32)
+	starts = np.flatnonzero(np.diff(grouped, prepend=-1))
+	ends = np.append(starts[1:], len(grouped))
+
+	# execute & writeback
+	for start, end in zip(starts, ends):
+		op, kernel = BATCH_TABLE[grouped[start]]
+		kernel(op, batch, rows[order[start:end]])
+
+	batch.CYCLES[rows] += CYCLES_ARRAY[opcodes]
+
+
+def run(batch: BatchState, n: int):
+	"""n instructions on every machine. Equivalent to calling step n times."""
+	rows = np.arange(len(batch))
+	for _ in range(n): step(batch, rows)
+
+
+def run_until_halt(batch: BatchState, max_steps: int):
+	"""
+	Runs every machine until it halts or has run max_steps instructions;
+	halted machines drop out of the lockstep. Returns the (N,) array of
+	instructions each one retired.
+	"""
+	steps = np.zeros(len(batch), dtype=np.int64)
+
+	for _ in range(max_steps):
+		rows = np.flatnonzero(~batch.HALTED)
+		if len(rows) == 0: break
+
+		step(batch, rows)
+		steps[rows] += 1
+
+	return steps
@@ -0,0 +1,186 @@
+# Breakpoints
+# ===========
+# Stop a run when PC reaches an address, optionally only when a condition
+# on the machine holds too:
+#
+#     pc == 0x1A5F and A > 0x20 and mem[0x20F0] == 1
+#
+# A condition is a python expression over the registers (A–L, PC, SP, and
+# the pairs BC, DE, HL), the flags (Z, S, P, CY, AC), M (the byte at HL),
+# mem[...], and cycles. It's parsed and checked once, when it's added,
+# and compiled into a function of the state, so a hit costs one call.
+#
+# The run loop only ever checks PC against a set; conditions are looked
+# up by PC and tested when it's in the set, so any number of breakpoints
+# cost one set lookup per instruction. A condition that doesn't pin PC
+# with a `pc == address` term has nowhere to hang; it works, but it's
+# tested after every instruction, and the run loop slows to match.
+
+import ast
+
+
+# what each name in a condition stands for, as an expression over state.
+NAMES = {
+	'A': 'state.A', 'B': 'state.B', 'C': 'state.C', 'D': 'state.D',
+	'E': 'state.E', 'H': 'state.H', 'L': 'state.L',
+	'PC': 'state.PC', 'SP': 'state.SP',
+	'BC': '((state.B << 8) | state.C)',
+	'DE': '((state.D << 8) | state.E)',
+	'HL': '((state.H << 8) | state.L)',
+	'M': 'state.MEM[(state.H << 8) | state.L]',
+	'Z': 'state.Z', 'S': 'state.S', 'P': 'state.P', 'CY': 'state.CY', 'AC': 'state.AC',
+	'MEM': 'state.MEM',
+	'CYCLES': 'state.CYCLES',
+}
+
+# everything else a condition may contain: arithmetic, comparisons and
+# logic over integers, and indexing into memory.
+ALLOWED = (
+	ast.Expression, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Compare, ast.IfExp,
+	ast.Subscript, ast.Name, ast.Constant, ast.Load,
+	ast.And, ast.Or, ast.Not, ast.Invert, ast.UAdd, ast.USub,
+	ast.Add, ast.Sub, ast.Mult, ast.FloorDiv, ast.Mod,
+	ast.BitAnd, ast.BitOr, ast.BitXor, ast.LShift, ast.RShift,
+	ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+
+class ConditionError(ValueError):
+	pass
+
+
+class Rename(ast.NodeTransformer):
+	def visit_Name(self, node):
+		return ast.parse(NAMES[node.id.upper()], mode='eval').body
+
+
+def parse_condition(condition: str):
+	try:
+		tree = ast.parse(condition.strip(), mode='eval')
+	except SyntaxError as error:
+		raise ConditionError(f'{condition!r}: {error.msg}') from None
+
+	for node in ast.walk(tree):
+		if not isinstance(node, ALLOWED):
+			raise ConditionError(f'{condition!r}: {type(node).__name__.lower()} is not allowed in a condition')
+		if isinstance(node, ast.Name) and node.id.upper() not in NAMES:
+			raise ConditionError(f'{condition!r}: no register, flag or name {node.id!r}')
+		if isinstance(node, ast.Constant) and type(node.value) not in (int, bool):
+			raise ConditionError(f'{condition!r}: only integer constants are allowed')
+
+	return tree
+
+
+def compile_condition(condition: str):
+	"""condition as a function of the state, returning a truth value."""
+	tree = Rename().visit(parse_condition(condition))
+	source = f'lambda state: {ast.unparse(tree)}'
+	return eval(compile(source, f'<breakpoint {condition}>', 'eval'), {'__builtins__': {}})
+
+
+def pc_of(tree):
+	"""The address a condition pins PC to, if it has a top-level `pc == address` term."""
+	body = tree.body
+	terms = body.values if isinstance(body, ast.BoolOp) and isinstance(body.op, ast.And) else [body]
+
+	for term in terms:
+		if not (isinstance(term, ast.Compare) and len(term.ops) == 1 and isinstance(term.ops[0], ast.Eq)):
+			continue
+
+		left, right = term.left, term.comparators[0]
+		for name, value in ((left, right), (right, left)):
+			if isinstance(name, ast.Name) and name.id.upper() == 'PC' and isinstance(value, ast.Constant):
+				return value.value & 0xFFFF
+
+	return None
+
+
+class Breakpoint():
+	def __init__(self, number: int, pc: int = None, condition: str = None):
+		self.number = number
+		self.pc = pc # None for a condition with no PC to hang on
+		self.condition = condition # None for a plain PC breakpoint
+		self.test = compile_condition(condition) if condition else None
+		self.hits = 0
+
+	def __str__(self):
+		where = f'{self.pc:#06x}' if self.pc is not None else 'anywhere'
+		when = f' if {self.condition}' if self.condition else ''
+		return f'#{self.number} at {where}{when}'
+
+	def __repr__(self):
+		return f'Breakpoint({self})'
+
+
+class Breakpoints():
+	def __init__(self):
+		self.all = []
+		self.by_pc = {} # pc -> [Breakpoint]
+		self.anywhere = [] # conditions tested after every instruction
+		self.pcs = frozenset()
+		self.numbered = 0
+
+	def add(self, where):
+		"""
+		where is an address, or a string: an address, or a condition. A
+		condition is checked when it's added and raises ConditionError if
+		it isn't a valid one.
+		"""
+		if isinstance(where, int):
+			pc, condition = where & 0xFFFF, None
+		else:
+			tree = parse_condition(where)
+			body = tree.body
+			if isinstance(body, ast.Constant) and type(body.value) is int:
+				pc, condition = body.value & 0xFFFF, None
+			else:
+				pc, condition = pc_of(tree), where.strip()
+
+		self.numbered += 1
+		breakpoint = Breakpoint(self.numbered, pc, condition)
+		self.all.append(breakpoint)
+		self.index(breakpoint)
+		self.pcs = frozenset(self.by_pc)
+		return breakpoint
+
+	def remove(self, number: int):
+		"""Removes breakpoint #number; raises ValueError if there's no such breakpoint."""
+		kept = [breakpoint for breakpoint in self.all if breakpoint.number != number]
+		if len(kept) == len(self.all): raise ValueError(f'no breakpoint #{number}')
+
+		self.all = kept
+		self.update()
+
+	def clear(self):
+		self.all = []
+		self.update()
+
+	def index(self, breakpoint: Breakpoint):
+		if breakpoint.pc is None: self.anywhere.append(breakpoint)
+		else: self.by_pc.setdefault(breakpoint.pc, []).append(breakpoint)
+
+	def update(self):
+		self.by_pc = {}
+		self.anywhere = []
+		for breakpoint in self.all: self.index(breakpoint)
+		self.pcs = frozenset(self.by_pc)
+
+	def check(self, state):
+		"""The first breakpoint that state is stopped at, counting the hit; None if there isn't one."""
+		for breakpoint in self.by_pc.get(state.PC, ()):
+			if breakpoint.test is None or breakpoint.test(state):
+				breakpoint.hits += 1
+				return breakpoint
+
+		for breakpoint in self.anywhere:
+			if breakpoint.test(state):
+				breakpoint.hits += 1
+				return breakpoint
+
+		return None
+
+	def __len__(self):
+		return len(self.all)
+
+	def __iter__(self):
+		return iter(self.all)
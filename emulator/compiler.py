@@ -0,0 +1,708 @@
+# Basic-Block Compiler
+# ====================
+# An optional execution engine. Straight-line runs of instructions are
+# decoded once, turned into the source of a single python function, and
+# compiled; after that, the block runs as one call instead of one
+# dispatch per instruction. Registers live in locals for the duration of
+# a block, immediates are folded into constants, and flag computations
+# that are overwritten before anything reads them are dropped.
+#
+# Blocks are linked: each remembers the blocks that ran after it, so a
+# loop of short blocks goes from one to the next without a lookup.
+#
+# The Op classes in emulator/opcodes remain the reference semantics; the
+# templates below have to agree with their step() methods, and
+# test/test_compiler.py checks that they do.
+#
+# Stores go through the state's memory map like the interpreter's do (see
+# emulator/memory.py), except that a trapped ROM write leaves registers
+# as they were when the block was entered.
+#
+# Self-modifying code: every page holding compiled code is marked in
+# CODE. A store that lands on a marked page drops every block on that
+# page, and the running block exits right after the storing instruction,
+# so the next instruction is decoded from the new bytes.
+
+import re
+
+from .state import State
+
+from .opcodes import *
+from .step import OPS, EI_CODE
+from .cycles import CYCLES, CYCLES_TAKEN, MAX_OP_CYCLES
+from .flags import PARITY
+from .memory import page_aliases
+
+
+MAX_BLOCK_LENGTH = 64 # instructions
+
+REGISTERS = ('A', 'B', 'C', 'D', 'E', 'H', 'L', 'SP')
+FLAGS = ('Z', 'S', 'P', 'CY', 'AC')
+LOCALS = frozenset(REGISTERS + FLAGS)
+ALL_FLAGS = frozenset(FLAGS)
+
+NAME_PATTERN = re.compile(r'\b[A-Z]{1,2}\b')
+TARGET_PATTERN = re.compile(r'^\s*([A-Za-z_]\w*(?:\s*,\s*[A-Za-z_]\w*)*)\s*(?<![=<>!])=(?!=)')
+ASSIGN_PATTERN = re.compile(r'(?<![=<>!])=(?!=)')
+
+CONDITION_SOURCE = {
+	'nz': 'not Z', 'z': 'Z',
+	'nc': 'not CY', 'c': 'CY',
+	'po': 'not P', 'pe': 'P',
+	'p': 'not S', 'm': 'S',
+}
+
+
+class Stmt():
+	"""
+	One statement of a block body. `kind` is 'code' for plain lines,
+	'check' for a post-store code-page check, 'call' for a fallback to
+	Op.step, and 'end' for the block's exit.
+	"""
+	def __init__(self, src: str, kind: str = 'code', **info):
+		self.src = src
+		self.kind = kind
+		self.info = info
+
+		if kind == 'code':
+			names = set(NAME_PATTERN.findall(src)) & LOCALS
+			target_match = TARGET_PATTERN.match(src)
+			self.targets = set(map(str.strip, target_match.group(1).split(','))) if target_match else set()
+			rhs = ASSIGN_PATTERN.split(src, maxsplit=1)[-1]
+			self.uses = set(NAME_PATTERN.findall(rhs)) & LOCALS
+			self.names = names
+
+		elif kind == 'call':
+			self.targets = set(LOCALS)
+			self.uses = set(LOCALS)
+			self.names = set(LOCALS)
+
+		else:
+			self.targets = set()
+			self.uses = set(ALL_FLAGS) | (set(NAME_PATTERN.findall(src)) & LOCALS)
+			self.names = set(NAME_PATTERN.findall(src)) & LOCALS
+
+	def is_flag_only(self):
+		return self.kind == 'code' and len(self.targets) > 0 and self.targets <= ALL_FLAGS
+
+
+# Emitters =======
+# each takes (op, block, pc) where pc is the address of the opcode, and
+# appends statements to the block. Immediates are read at compile time.
+
+def setflags_add(block, result='r', CY=True):
+	block.code(f'Z = ({result} & 0xFF) == 0')
+	block.code(f'S = ({result} & 0x80) != 0')
+	block.code(f'P = PARITY[{result} & 0xFF]')
+	if CY: block.code(f'CY = {result} > 0xFF or {result} < 0x00')
+
+
+def store(block, pairs, after=()):
+	"""
+	pairs of (address expression, value expression); one code-page check
+	after all of them, and after any `after` lines that finish the op.
+	"""
+	addrs = []
+	for i, (addr, value) in enumerate(pairs):
+		block.code(f'a{i} = {addr}')
+		addrs.append(f'a{i}')
+	for i, (addr, value) in enumerate(pairs):
+		block.code(f'if PAGES[a{i} >> 8]: MEM[a{i}] = {value}\nelse: state.MAP.write(MEM, a{i}, {value})')
+	for line in after: block.code(line)
+	block.check(addrs)
+
+
+def emit_mov_reg_reg(op, block, pc):
+	if op.r1_name != op.r2_name: block.code(f'{op.r1_name} = {op.r2_name}')
+
+def emit_mov_reg_mem(op, block, pc):
+	block.code(f'{op.r1_name} = MEM[(H << 8) | L]')
+
+def emit_mov_mem_reg(op, block, pc):
+	store(block, [('(H << 8) | L', op.r1_name)])
+
+def emit_mvi_reg_imm(op, block, pc):
+	block.code(f'{op.r1_name} = {block.imm8(pc)}')
+
+def emit_mvi_mem_imm(op, block, pc):
+	store(block, [('(H << 8) | L', block.imm8(pc))])
+
+def emit_lxi_reg_imm(op, block, pc):
+	block.code(f'{op.rl_name} = {block.imm8(pc)}')
+	block.code(f'{op.rh_name} = {block.imm8(pc, 2)}')
+
+def emit_lxi_sp(op, block, pc):
+	block.code(f'SP = {block.imm16(pc)}')
+
+def emit_lda(op, block, pc):
+	block.code(f'A = MEM[{block.imm16(pc)}]')
+
+def emit_sta(op, block, pc):
+	store(block, [(block.imm16(pc), 'A')])
+
+def emit_shld(op, block, pc):
+	addr = int(block.imm16(pc), 16)
+	store(block, [(hex((addr + 0x1) & 0xFFFF), 'H'), (hex(addr), 'L')])
+
+def emit_lhld(op, block, pc):
+	addr = int(block.imm16(pc), 16)
+	block.code(f'H = MEM[{hex((addr + 0x1) & 0xFFFF)}]')
+	block.code(f'L = MEM[{hex(addr)}]')
+
+def emit_ldax_reg(op, block, pc):
+	block.code(f'A = MEM[({op.r1_name} << 8) | {op.r2_name}]')
+
+def emit_stax_reg(op, block, pc):
+	store(block, [(f'({op.r1_name} << 8) | {op.r2_name}', 'A')])
+
+def emit_xchg(op, block, pc):
+	block.code('D, H = H, D')
+	block.code('E, L = L, E')
+
+
+# AC as the interpreter works it out; see emulator/flags.py.
+HALF_CARRY_SOURCE = {
+	'+': '((A ^ v ^ r) & 0x10) != 0',
+	'-': '((A ^ v ^ r) & 0x10) == 0',
+	'&': '((A | v) & 0x08) != 0',
+	'^': 'False',
+	'|': 'False',
+}
+
+def emit_alu(expression, carry_in=False, source='reg', CY=True, clear=(), store_result=True):
+	def emit(op, block, pc):
+		if source == 'reg': operand = op.r_name
+		elif source == 'mem': operand = 'MEM[(H << 8) | L]'
+		else: operand = block.imm8(pc)
+
+		carry = f' {expression} CY' if carry_in else ''
+		block.code(f'v = {operand}')
+		block.code(f'r = A {expression} v{carry}')
+		setflags_add(block, CY=CY)
+		block.code(f'AC = {HALF_CARRY_SOURCE[expression]}')
+		for flag in clear: block.code(f'{flag} = False')
+		if store_result: block.code('A = r & 0xFF')
+
+	return emit
+
+def emit_inr_dcr(expression, source='reg'):
+	half_carry = '(r & 0x0F) == 0x00' if expression == '+' else '(r & 0x0F) != 0x0F'
+
+	def emit(op, block, pc):
+		if source == 'reg':
+			block.code(f'r = {op.r_name} {expression} 1')
+			setflags_add(block, CY=False)
+			block.code(f'AC = {half_carry}')
+			block.code(f'{op.r_name} = r & 0xFF')
+		else:
+			block.code('a = (H << 8) | L')
+			block.code(f'r = MEM[a] {expression} 1')
+			setflags_add(block, CY=False)
+			block.code(f'AC = {half_carry}')
+			store(block, [('a', 'r & 0xFF')])
+
+	return emit
+
+def emit_inx_dcx(expression, sp=False):
+	def emit(op, block, pc):
+		if sp:
+			block.code(f'SP = (SP {expression} 1) & 0xFFFF')
+		else:
+			rh, rl = op.rh_name, op.rl_name
+			block.code(f'r = ((({rh} << 8) | {rl}) {expression} 1) & 0xFFFF')
+			block.code(f'{rh} = r >> 8')
+			block.code(f'{rl} = r & 0xFF')
+
+	return emit
+
+def emit_dad(op, block, pc):
+	operand = 'SP' if isinstance(op, DAD_SP) else f'(({op.rh_name} << 8) | {op.rl_name})'
+	block.code(f'r = {operand} + ((H << 8) | L)')
+	block.code('CY = r > 0xFFFF')
+	block.code('H = (r >> 8) & 0xFF')
+	block.code('L = r & 0xFF')
+
+def emit_rlc(op, block, pc):
+	block.code('CY = (A & 0x80) != 0')
+	block.code('A = ((A << 1) & 0xFF) | (A >> 7)')
+
+def emit_rrc(op, block, pc):
+	block.code('CY = (A & 0x01) != 0')
+	block.code('A = ((A & 0x01) << 7) | (A >> 1)')
+
+def emit_ral(op, block, pc):
+	block.code('r = (A << 1) | CY')
+	block.code('CY = r > 0xFF')
+	block.code('A = r & 0xFF')
+
+def emit_rar(op, block, pc):
+	block.code('r = A')
+	block.code('A = (CY << 7) | (r >> 1)')
+	block.code('CY = (r & 0x01) != 0')
+
+def emit_cma(op, block, pc):
+	block.code('A = A ^ 0xFF')
+
+def emit_cmc(op, block, pc):
+	block.code('CY = not CY')
+
+def emit_stc(op, block, pc):
+	block.code('CY = True')
+
+
+def emit_nop(op, block, pc):
+	pass
+
+def emit_push_reg(op, block, pc):
+	store(block, [('(SP - 0x1) & 0xFFFF', op.rh_name), ('(SP - 0x2) & 0xFFFF', op.rl_name)], after=['SP = (SP - 0x2) & 0xFFFF'])
+
+def emit_push_psw(op, block, pc):
+	psw = 'CY | 2 | (P << 2) | (AC << 4) | (Z << 6) | (S << 7)'
+	store(block, [('(SP - 0x1) & 0xFFFF', 'A'), ('(SP - 0x2) & 0xFFFF', psw)], after=['SP = (SP - 0x2) & 0xFFFF'])
+
+def emit_pop_reg(op, block, pc):
+	block.code(f'{op.rh_name} = MEM[(SP + 0x1) & 0xFFFF]')
+	block.code(f'{op.rl_name} = MEM[SP]')
+	block.code('SP = (SP + 0x2) & 0xFFFF')
+
+def emit_pop_psw(op, block, pc):
+	block.code('r = MEM[SP]')
+	block.code('CY = (r & 0x01) != 0')
+	block.code('P = (r & 0x04) != 0')
+	block.code('AC = (r & 0x10) != 0')
+	block.code('Z = (r & 0x40) != 0')
+	block.code('S = (r & 0x80) != 0')
+	block.code('A = MEM[(SP + 0x1) & 0xFFFF]')
+	block.code('SP = (SP + 0x2) & 0xFFFF')
+
+def emit_xthl(op, block, pc):
+	block.code('r = L')
+	block.code('L = MEM[SP]')
+	block.code('t = H')
+	block.code('H = MEM[(SP + 0x1) & 0xFFFF]')
+	store(block, [('SP', 'r'), ('(SP + 0x1) & 0xFFFF', 't')])
+
+def emit_sphl(op, block, pc):
+	block.code('SP = (H << 8) | L')
+
+def emit_in(op, block, pc):
+	port = block.imm8(pc)
+	block.code(f'A = state.IN[{port}]({port})')
+
+def emit_out(op, block, pc):
+	port = block.imm8(pc)
+	block.code(f'state.OUT[{port}]({port}, A)')
+
+def emit_ei(op, block, pc):
+	block.code('state.DI = False')
+
+def emit_di(op, block, pc):
+	block.code('state.DI = True')
+
+
+# block terminators: these emit the block's exit, after registers have
+# been written back, so they read locals and write state attributes.
+
+def emit_jcond(op, block, pc):
+	target = block.imm16(pc)
+	block.end(block.conditional(op, [f'state.PC = {target}']))
+
+def emit_ccond(op, block, pc):
+	target = block.imm16(pc)
+	ret = (pc + 3) & 0xFFFF
+	block.end(block.conditional(op, call_lines(hex(ret >> 8), hex(ret & 0xFF), target)))
+
+def emit_rcond(op, block, pc):
+	block.end(block.conditional(op, [
+		'state.PC = MEM[SP] | (MEM[(SP + 0x1) & 0xFFFF] << 8)',
+		'state.SP = (SP + 0x2) & 0xFFFF',
+	]))
+
+def emit_rst(op, block, pc):
+	ret = (pc + 1) & 0xFFFF
+	block.end(call_lines(hex(ret >> 8), hex(ret & 0xFF), hex(op.addr)))
+
+def emit_pchl(op, block, pc):
+	block.end(['state.PC = (H << 8) | L'])
+
+def emit_hlt(op, block, pc):
+	block.end(['state.HALTED = True', 'state.RUN = False', f'state.PC = {hex(block.next_pc)}'])
+
+def call_lines(ret_high, ret_low, target):
+	return [
+		'a0 = (SP - 0x1) & 0xFFFF',
+		'a1 = (SP - 0x2) & 0xFFFF',
+		'if PAGES[a0 >> 8] and PAGES[a1 >> 8]:',
+		f'\tMEM[a0] = {ret_high}',
+		f'\tMEM[a1] = {ret_low}',
+		'else:',
+		f'\tstate.MAP.write(MEM, a0, {ret_high})',
+		f'\tstate.MAP.write(MEM, a1, {ret_low})',
+		'state.SP = a1',
+		f'state.PC = {target}',
+		'if CODE[a0 >> 8] or CODE[a1 >> 8]: invalidate(a0, a1)',
+	]
+
+
+EMITTERS = {
+	MOV_Reg_Reg: emit_mov_reg_reg,
+	MOV_Reg_Mem: emit_mov_reg_mem,
+	MOV_Mem_Reg: emit_mov_mem_reg,
+	MVI_Reg_Imm: emit_mvi_reg_imm,
+	MVI_Mem_Imm: emit_mvi_mem_imm,
+	LXI_Reg_Imm: emit_lxi_reg_imm,
+	LXI_SP: emit_lxi_sp,
+	LDA: emit_lda,
+	STA: emit_sta,
+	SHLD: emit_shld,
+	LHLD: emit_lhld,
+	LDAX_Reg: emit_ldax_reg,
+	STAX_Reg: emit_stax_reg,
+	XCHG: emit_xchg,
+
+	ADD_Reg: emit_alu('+'),
+	ADD_Mem: emit_alu('+', source='mem'),
+	ADI: emit_alu('+', source='imm'),
+	ADC_Reg: emit_alu('+', carry_in=True),
+	ADC_Mem: emit_alu('+', carry_in=True, source='mem'),
+	ACI: emit_alu('+', carry_in=True, source='imm'),
+	SUB_Reg: emit_alu('-'),
+	SUB_Mem: emit_alu('-', source='mem'),
+	SUI: emit_alu('-', source='imm'),
+	SBB_Reg: emit_alu('-', carry_in=True),
+	SBB_Mem: emit_alu('-', carry_in=True, source='mem'),
+	SBI: emit_alu('-', carry_in=True, source='imm'),
+	INR_Reg: emit_inr_dcr('+'),
+	INR_Mem: emit_inr_dcr('+', source='mem'),
+	DCR_Reg: emit_inr_dcr('-'),
+	DCR_Mem: emit_inr_dcr('-', source='mem'),
+	INX_Reg: emit_inx_dcx('+'),
+	INX_SP: emit_inx_dcx('+', sp=True),
+	DCX_Reg: emit_inx_dcx('-'),
+	DCX_SP: emit_inx_dcx('-', sp=True),
+	DAD_Reg: emit_dad,
+	DAD_SP: emit_dad,
+
+	ANA_Reg: emit_alu('&', clear=('CY',)),
+	ANA_Mem: emit_alu('&', source='mem', clear=('CY',)),
+	ANI: emit_alu('&', source='imm', clear=('CY',)),
+	XRA_Reg: emit_alu('^', clear=('CY',)),
+	XRA_Mem: emit_alu('^', source='mem', clear=('CY',)),
+	XRI: emit_alu('^', source='imm', clear=('CY',)),
+	ORA_Reg: emit_alu('|', clear=('CY',)),
+	ORA_Mem: emit_alu('|', source='mem', clear=('CY',)),
+	ORI: emit_alu('|', source='imm', clear=('CY',)),
+	CMP_Reg: emit_alu('-', store_result=False),
+	CMP_Mem: emit_alu('-', source='mem', store_result=False),
+	CPI: emit_alu('-', source='imm', store_result=False),
+	RLC: emit_rlc,
+	RRC: emit_rrc,
+	RAL: emit_ral,
+	RAR: emit_rar,
+	CMA: emit_cma,
+	CMC: emit_cmc,
+	STC: emit_stc,
+
+	NOP: emit_nop,
+	PUSH_Reg: emit_push_reg,
+	PUSH_PSW: emit_push_psw,
+	POP_Reg: emit_pop_reg,
+	POP_PSW: emit_pop_psw,
+	XTHL: emit_xthl,
+	SPHL: emit_sphl,
+	IN_Imm: emit_in,
+	OUT_Imm: emit_out,
+	EI: emit_ei,
+	DI: emit_di,
+
+	JCOND_Imm: emit_jcond,
+	CCOND_Imm: emit_ccond,
+	RCOND: emit_rcond,
+	RST: emit_rst,
+	PCHL: emit_pchl,
+	HLT: emit_hlt,
+}
+
+TERMINATORS = (JCOND_Imm, CCOND_Imm, RCOND, RST, PCHL, HLT)
+
+# ops that are rare enough to just call into Op.step; none of them
+# write memory, so they can't invalidate code.
+FALLBACKS = (DAA,)
+
+
+class BlockBuilder():
+	def __init__(self, MEM, start: int):
+		self.MEM = MEM
+		self.start = start
+		self.next_pc = start
+		self.count = 0
+		self.cycles = 0 # not-taken cost of the ops added so far
+		self.statements = []
+		self.pages = set()
+		self.ended = False
+
+	def imm8(self, pc, offset=1):
+		return hex(self.MEM[(pc + offset) & 0xFFFF])
+
+	def imm16(self, pc):
+		return hex((self.MEM[(pc + 2) & 0xFFFF] << 8) | self.MEM[(pc + 1) & 0xFFFF])
+
+	def code(self, src):
+		self.statements.append(Stmt(src))
+
+	def check(self, addrs):
+		condition = ' or '.join(f'CODE[{a} >> 8]' for a in addrs)
+		self.statements.append(Stmt(condition, 'check', addrs=addrs, next_pc=self.next_pc, count=self.count, cycles=self.cycles))
+
+	def conditional(self, op, taken_lines):
+		extra = CYCLES_TAKEN[op.code] - CYCLES[op.code]
+		if extra: taken_lines = taken_lines + [f'state.CYCLES += {extra}']
+
+		name = op.name.lstrip('*') # aliases are unconditional.
+		if name in ('jmp', 'call', 'ret'): return taken_lines
+
+		condition = CONDITION_SOURCE[name[1:]]
+		return [f'if {condition}:'] + ['\t' + line for line in taken_lines] \
+			+ ['else:', f'\tstate.PC = {hex(self.next_pc)}']
+
+	def end(self, lines):
+		self.statements.append(Stmt('\n'.join(lines), 'end', lines=lines, count=self.count, cycles=self.cycles))
+		self.ended = True
+
+	def add(self, op, pc):
+		length = len(op)
+		for offset in range(length):
+			self.pages.add(((pc + offset) & 0xFFFF) >> 8)
+
+		self.next_pc = (pc + length) & 0xFFFF
+		self.count += 1
+		self.cycles += CYCLES[op.code]
+
+		if isinstance(op, FALLBACKS):
+			self.statements.append(Stmt('', 'call', code=op.code, pc=(pc + 1) & 0xFFFF))
+		else:
+			EMITTERS[type(op)](op, self, pc)
+
+
+	def eliminate_dead_flags(self):
+		live = set(ALL_FLAGS)
+		kept = []
+		for stmt in reversed(self.statements):
+			if stmt.is_flag_only() and not (stmt.targets & live):
+				continue
+
+			live -= stmt.targets
+			live |= stmt.uses & ALL_FLAGS
+			kept.append(stmt)
+
+		self.statements = kept[::-1]
+
+
+	def source(self, name: str):
+		if not self.ended:
+			self.end([f'state.PC = {hex(self.next_pc)}'])
+
+		self.eliminate_dead_flags()
+
+		loaded = set()
+		written = set()
+		for stmt in self.statements:
+			loaded |= stmt.names
+			written |= stmt.targets & LOCALS
+
+		loaded = [n for n in REGISTERS + FLAGS if n in loaded]
+		written = [n for n in REGISTERS + FLAGS if n in written]
+
+		# flags live in their slots, not behind the lazy-flag properties: any
+		# pending ones are worked out once, when the block is entered.
+		slot = lambda n: f'_{n}' if n in ALL_FLAGS else n
+		lazy = ALL_FLAGS.intersection(loaded)
+
+		def writeback(indent):
+			return [f'{indent}state.{slot(n)} = {n}' for n in written]
+
+		def load(indent):
+			resolve = [f'{indent}if state.LAZY: state.resolve_flags()'] if lazy else []
+			return resolve + [f'{indent}{n} = state.{slot(n)}' for n in loaded]
+
+		lines = [f'def {name}(state):', '\tMEM = state.MEM']
+		if any('PAGES[' in stmt.src for stmt in self.statements): lines.append('\tPAGES = state.PAGES')
+		lines += load('\t')
+
+		for stmt in self.statements:
+			if stmt.kind == 'code':
+				lines += [f'\t{line}' for line in stmt.src.split('\n')]
+
+			elif stmt.kind == 'check':
+				lines.append(f'\tif {stmt.src}:')
+				lines += writeback('\t\t')
+				lines.append(f'\t\tstate.PC = {hex(stmt.info["next_pc"])}')
+				lines.append(f'\t\tstate.CYCLES += {stmt.info["cycles"]}')
+				lines.append(f'\t\tinvalidate({", ".join(stmt.info["addrs"])})')
+				lines.append(f'\t\treturn {stmt.info["count"]}')
+
+			elif stmt.kind == 'call':
+				lines += writeback('\t')
+				lines.append(f'\tstate.PC = {hex(stmt.info["pc"])}')
+				lines.append(f'\tOPS[{hex(stmt.info["code"])}].step(state)')
+				lines += load('\t')
+
+			elif stmt.kind == 'end':
+				lines += writeback('\t')
+				lines.append(f'\tstate.CYCLES += {stmt.info["cycles"]}')
+				lines += [f'\t{line}' for line in stmt.info['lines']]
+				lines.append(f'\treturn {stmt.info["count"]}')
+
+		return '\n'.join(lines) + '\n'
+
+
+
+class Block():
+	"""
+	A compiled block, and links to the blocks that have run after it: one
+	for each way out of a conditional branch. The engine follows a link
+	when the next PC matches it, instead of looking the block up.
+	"""
+	__slots__ = ('function', 'length', 'next_pc', 'next', 'other_pc', 'other')
+
+	def __init__(self, function, length: int):
+		self.function = function
+		self.length = length
+		self.unlink()
+
+	def link(self, pc: int, block):
+		if self.next is None: self.next_pc, self.next = pc, block
+		else: self.other_pc, self.other = pc, block
+
+	def unlink(self):
+		self.next_pc = self.other_pc = -1
+		self.next = self.other = None
+
+
+class BlockEngine():
+	"""
+	Runs a State by compiling it into basic blocks. Blocks are cached by
+	start address for the life of the engine, so anything that writes the
+	state's memory behind the engine's back (the editor, Trace) should call
+	invalidate() or flush() afterwards.
+	"""
+	def __init__(self, state: State):
+		self.state = state
+		self.blocks = {} # key -> Block; key is the start address, or (start, limit) for truncated blocks
+		self.block_pages = {} # key -> pages its code occupies
+		self.page_blocks = [set() for _ in range(256)]
+		self.CODE = bytearray(256) # 1 if a page holds compiled code
+
+		self.namespace = { 'CODE': self.CODE, 'invalidate': self.invalidate, 'OPS': OPS, 'PARITY': PARITY }
+
+
+	def compile_block(self, start: int, limit: int = MAX_BLOCK_LENGTH):
+		MEM = self.state.MEM
+		builder = BlockBuilder(MEM, start)
+		pc = start
+
+		while builder.count < limit:
+			op = OPS[ MEM[pc] ]
+			builder.add(op, pc)
+			pc = builder.next_pc
+
+			# stop at control flow, and don't run off the top of memory.
+			if builder.ended or pc < start: break
+
+		key = start if limit == MAX_BLOCK_LENGTH else (start, limit)
+		name = f'block_{start:04x}'
+		source = builder.source(name)
+		exec(compile(source, f'<{name}>', 'exec'), self.namespace)
+		block = Block(self.namespace.pop(name), builder.count)
+
+		# code read from a page also lives on every page that mirrors it.
+		pages = { alias for page in builder.pages for alias in self.aliases(page) }
+
+		self.blocks[key] = block
+		self.block_pages[key] = pages
+		for page in pages:
+			self.page_blocks[page].add(key)
+			self.CODE[page] = 1
+
+		return block
+
+
+	def aliases(self, page: int):
+		"""Pages that are the same page as page under the state's memory map."""
+		return page_aliases(self.state.MEM, page)
+
+
+	def invalidate(self, *addrs):
+		dropped = False
+		for page in { alias for addr in addrs for alias in self.aliases(addr >> 8) }:
+			if not self.CODE[page]: continue
+
+			for key in self.page_blocks[page]:
+				self.blocks.pop(key).unlink() # the run loop may still follow its links
+				for other_page in self.block_pages.pop(key):
+					if other_page != page: self.page_blocks[other_page].discard(key)
+					if not self.page_blocks[other_page]: self.CODE[other_page] = 0
+
+			self.page_blocks[page] = set()
+			self.CODE[page] = 0
+			dropped = True
+
+		# links into a dropped block would keep running it.
+		if dropped:
+			for block in self.blocks.values(): block.unlink()
+
+
+	def flush(self):
+		for block in self.blocks.values(): block.unlink()
+		self.blocks.clear()
+		self.block_pages.clear()
+		self.page_blocks = [set() for _ in range(256)]
+		self.CODE[:] = bytes(256)
+
+
+	def run(self, n: int):
+		"""
+		Executes exactly n instructions, or up to and including a HLT, and
+		returns how many it executed. Events on state.EVENTS fire as they
+		do under step(): near the next deadline the engine runs one
+		instruction per block, and fires what's due after each.
+		"""
+		state = self.state
+		blocks = self.blocks
+		events = state.EVENTS
+		executed = 0
+		previous = None # the block that ran last, to follow its links
+
+		while executed < n and not state.HALTED:
+			PC = state.PC
+			if events is not None and state.CYCLES + MAX_BLOCK_LENGTH * MAX_OP_CYCLES > events.deadline:
+				opcode = state.MEM[PC]
+				block = blocks.get((PC, 1)) or self.compile_block(PC, 1)
+				executed += block.function(state)
+				previous = None
+				if state.CYCLES >= events.deadline and opcode != EI_CODE:
+					events.run_due(state)
+					self.invalidate(state.SP, (state.SP + 1) & 0xFFFF) # an interrupt pushes its return address
+				continue
+
+			if previous is None:
+				block = blocks.get(PC) or self.compile_block(PC)
+			elif previous.next_pc == PC:
+				block = previous.next
+			elif previous.other_pc == PC:
+				block = previous.other
+			else:
+				block = blocks.get(PC) or self.compile_block(PC)
+				previous.link(PC, block)
+
+			if executed + block.length > n:
+				remaining = n - executed
+				block = blocks.get((PC, remaining)) or self.compile_block(PC, remaining)
+				executed += block.function(state)
+				previous = None
+				continue
+
+			executed += block.function(state)
+			previous = block
+
+		return executed
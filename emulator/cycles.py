@@ -0,0 +1,35 @@
+# Cycle Table
+# ===========
+# Clock states per opcode, from the Intel 8080 Data Book. Indexed by
+# opcode. Conditional calls and returns are listed at their not-taken
+# cost; CYCLES_TAKEN has the cost when the branch is taken.
+
+CLOCK_HZ = 2_000_000
+
+CYCLES = (
+#	x0  x1  x2  x3  x4  x5  x6  x7  x8  x9  xA  xB  xC  xD  xE  xF
+	 4, 10,  7,  5,  5,  5,  7,  4,  4, 10,  7,  5,  5,  5,  7,  4, # 0x
+	 4, 10,  7,  5,  5,  5,  7,  4,  4, 10,  7,  5,  5,  5,  7,  4, # 1x
+	 4, 10, 16,  5,  5,  5,  7,  4,  4, 10, 16,  5,  5,  5,  7,  4, # 2x
+	 4, 10, 13,  5, 10, 10, 10,  4,  4, 10, 13,  5,  5,  5,  7,  4, # 3x
+	 5,  5,  5,  5,  5,  5,  7,  5,  5,  5,  5,  5,  5,  5,  7,  5, # 4x
+	 5,  5,  5,  5,  5,  5,  7,  5,  5,  5,  5,  5,  5,  5,  7,  5, # 5x
+	 5,  5,  5,  5,  5,  5,  7,  5,  5,  5,  5,  5,  5,  5,  7,  5, # 6x
+	 7,  7,  7,  7,  7,  7,  7,  7,  5,  5,  5,  5,  5,  5,  7,  5, # 7x
+	 4,  4,  4,  4,  4,  4,  7,  4,  4,  4,  4,  4,  4,  4,  7,  4, # 8x
+	 4,  4,  4,  4,  4,  4,  7,  4,  4,  4,  4,  4,  4,  4,  7,  4, # 9x
+	 4,  4,  4,  4,  4,  4,  7,  4,  4,  4,  4,  4,  4,  4,  7,  4, # Ax
+	 4,  4,  4,  4,  4,  4,  7,  4,  4,  4,  4,  4,  4,  4,  7,  4, # Bx
+	 5, 10, 10, 10, 11, 11,  7, 11,  5, 10, 10, 10, 11, 17,  7, 11, # Cx
+	 5, 10, 10, 10, 11, 11,  7, 11,  5, 10, 10, 10, 11, 17,  7, 11, # Dx
+	 5, 10, 10, 18, 11, 11,  7, 11,  5,  5, 10,  4, 11, 17,  7, 11, # Ex
+	 5, 10, 10,  4, 11, 11,  7, 11,  5,  5, 10,  4, 11, 17,  7, 11, # Fx
+)
+
+# rcc (11xxx000) and ccc (11xxx100) take 6 more states when taken.
+CYCLES_TAKEN = tuple(
+	cycles + 6 if code & 0xC7 in (0xC0, 0xC4) else cycles
+	for code, cycles in enumerate(CYCLES)
+)
+
+MAX_OP_CYCLES = max(CYCLES_TAKEN)
@@ -0,0 +1,135 @@
+# Job Farm
+# ========
+# Runs many independent ROM jobs across a pool of worker processes, one
+# job per worker at a time, so a night's worth of configurations can use
+# every core instead of one.
+#
+# Jobs refer to their ROM by path, so no job ever carries ROM bytes
+# across a pipe. Each worker maps every ROM file once when it starts (the
+# pool initializer), and the workers share those pages through the OS
+# page cache; see emulator/rom.py.
+
+import os
+import json
+import hashlib
+from time import perf_counter
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .state import U8_NAMES, U16_NAMES, FLAG_NAMES
+from .runner import run_state
+from .rom import open_image
+from .ports import PortBus, ScriptedInput
+from .snapshot import load_state
+
+
+REGISTER_NAMES = U8_NAMES + U16_NAMES + FLAG_NAMES
+
+
+@dataclass
+class Job():
+	rom : str = None # path of the ROM image; see rom.open_image
+	id : str = None # defaults to the job's position in the list
+	base : int = 0 # load address
+	registers : dict = field(default_factory=dict) # name -> initial value, e.g. { 'PC': 0x100, 'SP': 0x2400 }
+	max_steps : int = None
+	max_cycles : int = None
+	until_pc : list = None
+	io : dict = None # port -> input bytes, in the order IN should read them; see ports.ScriptedInput
+	snapshot : str = None # a save state to start from instead of the ROM; see snapshot.save_state
+
+	@staticmethod
+	def from_dict(data: dict, index: int = None):
+		"""A Job from data; index is its position in the list, for the default id."""
+		job = Job(**data)
+		if job.id is None and index is not None: job.id = str(index)
+
+		if job.rom is None and job.snapshot is None: raise ValueError(f'job {job.id}: needs a rom or a snapshot')
+		unknown = set(job.registers) - set(REGISTER_NAMES)
+		if unknown: raise ValueError(f'job {job.id}: no such registers: {", ".join(sorted(unknown))}')
+
+		# JSON keys are strings; ports may be written in hex.
+		if job.io is not None: job.io = { int(port, 0) if isinstance(port, str) else port: values for port, values in job.io.items() }
+
+		return job
+
+
+# worker side ======
+
+def load_roms(paths: list):
+	# open_image caches what it maps, so jobs find their ROMs already open.
+	for path, base in paths:
+		try: open_image(path, base)
+		except OSError: pass # the job reports it
+
+
+def run_job(job: Job):
+	start = perf_counter()
+
+	state = load_state(job.snapshot) if job.snapshot else open_image(job.rom, job.base).to_state()
+	for name, value in job.registers.items():
+		setattr(state, name, value)
+
+	script = None
+	if job.io is not None:
+		bus = PortBus()
+		script = bus.attach(ScriptedInput(job.io))
+		bus.install(state)
+
+	result = run_state(state, job.max_steps, job.max_cycles, job.until_pc)
+
+	return {
+		'id': job.id,
+		'rom': job.rom,
+		'reason': result.reason,
+		'pc': result.pc,
+		'opcode': result.opcode,
+		'steps': result.steps,
+		'cycles': result.cycles,
+		'registers': { name: getattr(state, name) for name in U8_NAMES + U16_NAMES },
+		'flags': { name: int(getattr(state, name)) for name in FLAG_NAMES },
+		'memory_sha256': hashlib.sha256(state.MEM).hexdigest(),
+		'output': { str(port): values for port, values in script.written.items() } if script else None,
+		'run_seconds': result.elapsed,
+		'job_seconds': perf_counter() - start,
+	}
+
+
+# parent side ======
+
+def farm(jobs: list, workers: int = None):
+	"""
+	Runs jobs (Job or dict) on workers processes (default: one per core),
+	yielding a result dict for each as it finishes, in completion order.
+	A job that raises yields a result with reason 'error'.
+	"""
+	jobs = [job if isinstance(job, Job) else Job.from_dict(job, index) for index, job in enumerate(jobs)]
+	for index, job in enumerate(jobs):
+		if job.id is None: job.id = str(index)
+
+	roms = sorted({ (job.rom, job.base) for job in jobs if job.rom is not None })
+
+	workers = workers or os.cpu_count() or 1
+	with ProcessPoolExecutor(workers, initializer=load_roms, initargs=(roms,)) as executor:
+		futures = { executor.submit(run_job, job): job for job in jobs }
+		for future in as_completed(futures):
+			try:
+				yield future.result()
+
+			except Exception as error:
+				# one broken job shouldn't take the night's results with it.
+				job = futures[future]
+				yield { 'id': job.id, 'rom': job.rom, 'reason': 'error', 'error': repr(error) }
+
+
+def read_jobs(file):
+	"""Jobs from a JSONL file: one JSON object per line, with Job's fields."""
+	lines = [line for line in file if line.strip()]
+	return [Job.from_dict(json.loads(line), index) for index, line in enumerate(lines)]
+
+
+def write_results(results, file):
+	"""Writes each result as one JSON line, flushing so readers see it as it lands."""
+	for result in results:
+		file.write(json.dumps(result) + '\n')
+		file.flush()
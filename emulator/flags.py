@@ -0,0 +1,69 @@
+# Flag Tables
+# ===========
+# Precomputed flag results, so working out a flag is one indexed load.
+#
+# ZSP[v] holds the Z, S and P bits for the byte v, already in their
+# places in the processor status word:
+#
+#	S Z 0 AC 0 P 1 CY
+#	7 6 5 4  3 2 1 0
+
+PSW_S = 0x80
+PSW_Z = 0x40
+PSW_AC = 0x10
+PSW_P = 0x04
+PSW_CY = 0x01
+
+
+def parity(value: int):
+	"""True when value has an even number of set bits."""
+	return bin(value).count('1') % 2 == 0
+
+
+ZSP = tuple(
+	(PSW_Z if value == 0 else 0) | (value & PSW_S) | (PSW_P if parity(value) else 0)
+	for value in range(256)
+)
+
+PARITY = tuple(parity(value) for value in range(256))
+
+
+# Half carry ======
+# AC is the carry out of bit 3. For a + b (+ carry) = r, bit 4 of
+# a ^ b ^ r is exactly that carry, so the ops record AUX = a ^ b and AC
+# is bit 4 of AUX ^ r. The 8080 subtracts by adding the complement, so
+# for a - b (- borrow), AUX = a ^ ~b = a ^ b ^ HALF_CARRY_SUB, over the
+# low five bits.
+
+HALF_CARRY_ADD = 0x00
+HALF_CARRY_SUB = 0x10
+
+
+def half_carry(aux: int, result: int):
+	return ((aux ^ result) & 0x10) != 0
+
+
+# Decimal Adjust ======
+# DAA[A | CY << 8 | AC << 9] = (result, aux), where result is the
+# adjusted accumulator with the new carry in bit 8, and aux is the
+# half-carry record for it, as the other ALU ops would leave them.
+
+def decimal_adjust(A: int, CY: bool, AC: bool):
+	correction = 0
+	carry = CY
+
+	if AC or (A & 0x0F) > 9:
+		correction |= 0x06
+
+	if CY or (A >> 4) > 9 or ((A >> 4) >= 9 and (A & 0x0F) > 9):
+		correction |= 0x60
+		carry = True
+
+	result = (A + correction) & 0xFF
+	return result | (int(carry) << 8), A ^ correction ^ HALF_CARRY_ADD
+
+
+DAA = tuple(
+	decimal_adjust(index & 0xFF, bool(index & 0x100), bool(index & 0x200))
+	for index in range(1024)
+)
@@ -0,0 +1,308 @@
+# Memory Map
+# ==========
+# The 64K address space as 256 pages of 256 bytes, each one RAM, ROM,
+# device-mapped, or a mirror of another page. State.MEM stays one flat
+# bytearray, or a PagedMemory (below), which indexes the same way:
+#
+# - writes check one byte of the map's FAST table (state.PAGES). RAM,
+#   and mirrors of RAM, are 1 there and the op stores directly; anything
+#   else goes through MemoryMap.write.
+# - reads, and instruction fetches, are a plain index into MEM.
+#
+# Mirrors resolve through the page table. Installing a map with mirrors
+# gives the state a PagedMemory, and puts each mirror page's target in
+# its slot: the very same bytearray, not a copy. A read, a write or a
+# fetch through a mirror lands on the page it mirrors, with nothing to
+# keep in step.
+#
+# A State with no map installed has every page FAST, which is how the
+# machine has always behaved. Loaders (RomImage.load_into, slice
+# assignment) write MEM directly and ignore the map, so load a ROM before
+# installing a map over it.
+
+PAGE_SIZE = 0x100
+PAGE_COUNT = 0x100
+
+RAM = 'ram'
+ROM = 'rom'
+DEVICE = 'device'
+MIRROR = 'mirror'
+
+IGNORE = 'ignore' # writes to ROM are dropped, like the real bus does
+TRAP = 'trap' # writes to ROM raise WriteProtectionError
+
+# State.PAGES when no map is installed.
+ALL_RAM = bytes([1]) * PAGE_COUNT
+ALL_SHARED = ALL_RAM
+
+
+class WriteProtectionError(Exception):
+	def __init__(self, addr: int, value: int):
+		super().__init__(f'write of {value:#04x} to ROM at {addr:#06x}')
+		self.addr = addr
+		self.value = value
+
+
+class MemoryMap():
+	"""
+	Built up with the map_* methods, which take page-aligned [start, end)
+	address ranges, then put on a State with install().
+	"""
+	def __init__(self, rom_writes: str = IGNORE):
+		if rom_writes not in (IGNORE, TRAP): raise ValueError(f'rom_writes must be {IGNORE!r} or {TRAP!r}')
+
+		self.rom_writes = rom_writes
+		self.kinds = [RAM] * PAGE_COUNT
+		self.targets = list(range(PAGE_COUNT)) # the page each page stands for; itself unless it's a mirror
+		self.devices = [None] * PAGE_COUNT
+		self.build()
+
+	def pages(self, start: int, end: int):
+		if start % PAGE_SIZE or end % PAGE_SIZE or not 0 <= start < end <= PAGE_SIZE * PAGE_COUNT:
+			raise ValueError(f'{start:#06x}–{end:#06x} is not a page-aligned range')
+
+		return range(start // PAGE_SIZE, end // PAGE_SIZE)
+
+	def map(self, start: int, end: int, kind: str, device=None):
+		for page in self.pages(start, end):
+			self.kinds[page] = kind
+			self.targets[page] = page
+			self.devices[page] = device
+
+		self.build()
+
+	def map_ram(self, start: int, end: int):
+		self.map(start, end, RAM)
+
+	def map_rom(self, start: int, end: int):
+		self.map(start, end, ROM)
+
+	def map_device(self, start: int, end: int, device):
+		"""device(addr, value) is called for every write in the range."""
+		self.map(start, end, DEVICE, device)
+
+	def map_mirror(self, start: int, end: int, target: int, size: int = None):
+		"""
+		[start, end) repeats [target, target + size); size defaults to the
+		length of the range, and must divide it.
+		"""
+		size = size or end - start
+		target_pages = self.pages(target, target + size)
+		if (end - start) % size: raise ValueError(f'a mirror of {size:#x} bytes does not tile {start:#06x}–{end:#06x}')
+		if any(self.kinds[page] == MIRROR for page in target_pages): raise ValueError('a mirror cannot target another mirror')
+
+		for offset, page in enumerate(self.pages(start, end)):
+			self.kinds[page] = MIRROR
+			self.targets[page] = target_pages[offset % len(target_pages)]
+			self.devices[page] = None
+
+		self.build()
+
+	def build(self):
+		# every page standing for the same page as each page, itself included.
+		aliases = [[] for _ in range(PAGE_COUNT)]
+		for page, target in enumerate(self.targets):
+			aliases[target].append(page)
+
+		self.kind_of = [self.kinds[target] for target in self.targets]
+		self.aliases = [tuple(page * PAGE_SIZE for page in aliases[target]) for target in self.targets]
+		self.mirrored = any(target != page for page, target in enumerate(self.targets))
+		self.FAST = bytes(1 if kind == RAM else 0 for kind in self.kind_of)
+
+	def resolve(self, addr: int):
+		"""The address a store to addr lands on: addr itself, unless it's in a mirror."""
+		return (self.targets[addr >> 8] << 8) | (addr & 0xFF)
+
+	def write(self, MEM, addr: int, value: int):
+		"""A store to a page that isn't FAST."""
+		page = addr >> 8
+		kind = self.kind_of[page]
+
+		if kind == RAM:
+			MEM[(self.targets[page] << 8) | (addr & 0xFF)] = value
+
+		elif kind == ROM:
+			if self.rom_writes == TRAP: raise WriteProtectionError(addr, value)
+
+		else:
+			target = self.targets[page]
+			self.devices[target]((target << 8) | (addr & 0xFF), value)
+
+	def install(self, state):
+		"""
+		Puts the map on state. If it has mirrors, state's memory is paged,
+		and each mirror page becomes the page it mirrors; what the mirror
+		held before is dropped.
+		"""
+		if self.mirrored:
+			if type(state.MEM) is bytearray: state.MEM = PagedMemory(state.MEM)
+			for page, target in enumerate(self.targets):
+				if target != page: state.MEM.link(page, target)
+
+		state.MAP = self
+		state.PAGES = self.FAST
+		return state
+
+	def regions(self):
+		"""(start, end, kind, target start) for each run of alike pages."""
+		regions = []
+		for page in range(PAGE_COUNT):
+			kind, target = self.kinds[page], self.targets[page]
+			if regions and regions[-1][2] == kind and (kind != MIRROR or self.targets[page - 1] + 1 == target):
+				start, _, _, target_start = regions[-1]
+				regions[-1] = (start, (page + 1) * PAGE_SIZE, kind, target_start)
+			else:
+				regions.append((page * PAGE_SIZE, (page + 1) * PAGE_SIZE, kind, target * PAGE_SIZE))
+
+		return regions
+
+	def __repr__(self):
+		lines = []
+		for start, end, kind, target in self.regions():
+			mirror = f' -> {target:#06x}' if kind == MIRROR else ''
+			lines.append(f'{start:#06x}–{end - 1:#06x} {kind}{mirror}')
+
+		return '\n'.join(lines)
+
+
+# Copy-on-write pages ======
+# State.clone() shares memory rather than copying it. A cloned state's
+# MEM is a PagedMemory: a list of 256 pages, each a 256-byte bytearray,
+# which it shares with the state it was cloned from. A page is copied
+# the first time either side writes to it, so a clone costs a page table
+# up front and 256 bytes for each page written afterwards, instead of
+# 64K. Reads are an index into the page list and then into the page.
+#
+# A memory map's mirrors link pages within one PagedMemory: two slots
+# holding the same page. Linked slots are copied together, so they stay
+# one page on either side of a clone.
+
+class PagedMemory():
+	"""
+	64K of memory as shared, copy-on-write pages. Indexes and slices like
+	a bytearray of fixed length; bytes(memory) or tobytes() flattens it.
+	"""
+	__slots__ = ('pages', 'shared', 'homes')
+
+	def __init__(self, data=None):
+		data = data if data is not None else bytes(PAGE_SIZE * PAGE_COUNT)
+		if len(data) != PAGE_SIZE * PAGE_COUNT: raise ValueError(f'memory is {PAGE_SIZE * PAGE_COUNT} bytes, not {len(data)}')
+
+		self.pages = [bytearray(data[base:base + PAGE_SIZE]) for base in range(0, PAGE_SIZE * PAGE_COUNT, PAGE_SIZE)]
+		self.shared = bytearray(PAGE_COUNT) # 1 if a page may be shared with another copy
+		self.homes = None # once pages are linked, the page each slot holds
+
+	def copy(self):
+		"""Another PagedMemory with the same pages; neither writes to them in place from here on."""
+		other = PagedMemory.__new__(PagedMemory)
+		other.pages = self.pages.copy()
+		other.shared = bytearray(ALL_SHARED)
+		other.homes = None if self.homes is None else self.homes.copy()
+		self.shared[:] = ALL_SHARED
+		return other
+
+	def link(self, page: int, target: int):
+		"""Makes page the same page as target, as a mirror of it."""
+		if self.homes is None: self.homes = list(range(PAGE_COUNT))
+		self.pages[page] = self.pages[target]
+		self.shared[page] = self.shared[target]
+		self.homes[page] = self.homes[target]
+
+	def aliases(self, page: int):
+		"""Every page that is the same page as page, itself included."""
+		if self.homes is None: return (page,)
+		home = self.homes[page]
+		return tuple(other for other in range(PAGE_COUNT) if self.homes[other] == home)
+
+	def own(self, page: int):
+		"""Gives this copy a page of its own to write to, in every slot it's linked to."""
+		copy = bytearray(self.pages[page])
+		for alias in self.aliases(page):
+			self.pages[alias] = copy
+			self.shared[alias] = 0
+
+	def owned(self):
+		"""The number of pages this copy has copied, or never shared."""
+		return PAGE_COUNT - sum(self.shared)
+
+	def __getitem__(self, addr):
+		try:
+			return self.pages[addr >> 8][addr & 0xFF]
+		except TypeError: # a slice
+			return bytearray(self.tobytes()[addr])
+
+	def __setitem__(self, addr, value):
+		try:
+			page = addr >> 8
+		except TypeError: # a slice
+			return self.write_slice(addr, value)
+
+		if self.shared[page]: self.own(page)
+		self.pages[page][addr & 0xFF] = value
+
+	def write_slice(self, addrs: slice, data):
+		"""
+		A slice over a page and its mirror writes the page from its own
+		address, so bytes(memory) taken while a mirror was stale loads back.
+		"""
+		start, stop, stride = addrs.indices(PAGE_SIZE * PAGE_COUNT)
+		data = memoryview(data).cast('B')
+		if stride != 1 or len(data) != max(stop - start, 0): raise ValueError('memory can\'t change size')
+
+		homes = self.homes
+		first, last = start >> 8, (stop - 1) >> 8
+		while start < stop:
+			page, offset = start >> 8, start & 0xFF
+			length = min(PAGE_SIZE - offset, stop - start)
+
+			if homes is None or homes[page] == page or not first <= homes[page] <= last:
+				if self.shared[page]: self.own(page)
+				self.pages[page][offset:offset + length] = data[:length]
+
+			data = data[length:]
+			start += length
+
+	def tobytes(self):
+		return b''.join(self.pages)
+
+	def __bytes__(self):
+		return self.tobytes()
+
+	def __len__(self):
+		return PAGE_SIZE * PAGE_COUNT
+
+	def __iter__(self):
+		return iter(self.tobytes())
+
+	def __eq__(self, other):
+		if isinstance(other, PagedMemory):
+			return all(page is other_page or page == other_page for page, other_page in zip(self.pages, other.pages))
+		return self.tobytes() == other
+
+	__hash__ = None
+
+	def __repr__(self):
+		return f'PagedMemory({self.owned()} of {PAGE_COUNT} pages its own)'
+
+
+def page_aliases(MEM, page: int):
+	"""The pages of MEM that are the same page as page: linked pages of a PagedMemory, or page alone."""
+	return (page,) if type(MEM) is bytearray else MEM.aliases(page)
+
+
+def as_buffer(MEM):
+	"""MEM, flat: itself if it's a bytearray, or a PagedMemory's bytes. For numpy, hashing, and files."""
+	return MEM if type(MEM) is bytearray else MEM.tobytes()
+
+
+def invaders_map(rom_writes: str = IGNORE):
+	"""
+	Space Invaders: 8K of ROM, then 8K of RAM (work RAM, stack and video
+	RAM), mirrored through the rest of the address space.
+	"""
+	memory = MemoryMap(rom_writes)
+	memory.map_rom(0x0000, 0x2000)
+	memory.map_ram(0x2000, 0x4000)
+	memory.map_mirror(0x4000, 0x10000, 0x2000, 0x2000)
+
+	return memory
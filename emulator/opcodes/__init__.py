@@ -255,35 +255,35 @@ OPCODE_LIST = [
 
 	# Branch Group
 
-	JCOND_Imm(0xC3, 'jmp', lambda FLAGS: True),
-	JCOND_Imm(0xCA, 'jz', lambda FLAGS: FLAGS[F.Z]),
-	JCOND_Imm(0xDA, 'jc', lambda FLAGS: FLAGS[F.CY]),
-	JCOND_Imm(0xEA, 'jpe', lambda FLAGS: FLAGS[F.P]),
-	JCOND_Imm(0xFA, 'jm', lambda FLAGS: FLAGS[F.S]),
-	JCOND_Imm(0xC2, 'jnz', lambda FLAGS: not FLAGS[F.Z]),
-	JCOND_Imm(0xD2, 'jnc', lambda FLAGS: not FLAGS[F.CY]),
-	JCOND_Imm(0xE2, 'jpo', lambda FLAGS: not FLAGS[F.P]),
-	JCOND_Imm(0xF2, 'jp', lambda FLAGS: not FLAGS[F.S]),
-
-	CCOND_Imm(0xCD, 'call', lambda FLAGS: True),
-	CCOND_Imm(0xCC, 'cz', lambda FLAGS: FLAGS[F.Z]),
-	CCOND_Imm(0xDC, 'cc', lambda FLAGS: FLAGS[F.CY]),
-	CCOND_Imm(0xEC, 'cpe', lambda FLAGS: FLAGS[F.P]),
-	CCOND_Imm(0xFC, 'cm', lambda FLAGS: FLAGS[F.S]),
-	CCOND_Imm(0xC4, 'cnz', lambda FLAGS: not FLAGS[F.Z]),
-	CCOND_Imm(0xD4, 'cnc', lambda FLAGS: not FLAGS[F.CY]),
-	CCOND_Imm(0xE4, 'cpo', lambda FLAGS: not FLAGS[F.P]),
-	CCOND_Imm(0xF4, 'cp', lambda FLAGS: not FLAGS[F.S]),
-
-	RCOND(0xC9, 'ret', lambda FLAGS: True),
-	RCOND(0xC8, 'rz', lambda FLAGS: FLAGS[F.Z]),
-	RCOND(0xD8, 'rc', lambda FLAGS: FLAGS[F.CY]),
-	RCOND(0xE8, 'rpe', lambda FLAGS: FLAGS[F.P]),
-	RCOND(0xF8, 'rm', lambda FLAGS: FLAGS[F.S]),
-	RCOND(0xC0, 'rnz', lambda FLAGS: not FLAGS[F.Z]),
-	RCOND(0xD0, 'rnc', lambda FLAGS: not FLAGS[F.CY]),
-	RCOND(0xE0, 'rpo', lambda FLAGS: not FLAGS[F.P]),
-	RCOND(0xF0, 'rp', lambda FLAGS: not FLAGS[F.S]),
+	JCOND_Imm(0xC3, 'jmp', lambda state: True),
+	JCOND_Imm(0xCA, 'jz', lambda state: state.Z),
+	JCOND_Imm(0xDA, 'jc', lambda state: state.CY),
+	JCOND_Imm(0xEA, 'jpe', lambda state: state.P),
+	JCOND_Imm(0xFA, 'jm', lambda state: state.S),
+	JCOND_Imm(0xC2, 'jnz', lambda state: not state.Z),
+	JCOND_Imm(0xD2, 'jnc', lambda state: not state.CY),
+	JCOND_Imm(0xE2, 'jpo', lambda state: not state.P),
+	JCOND_Imm(0xF2, 'jp', lambda state: not state.S),
+
+	CCOND_Imm(0xCD, 'call', lambda state: True),
+	CCOND_Imm(0xCC, 'cz', lambda state: state.Z),
+	CCOND_Imm(0xDC, 'cc', lambda state: state.CY),
+	CCOND_Imm(0xEC, 'cpe', lambda state: state.P),
+	CCOND_Imm(0xFC, 'cm', lambda state: state.S),
+	CCOND_Imm(0xC4, 'cnz', lambda state: not state.Z),
+	CCOND_Imm(0xD4, 'cnc', lambda state: not state.CY),
+	CCOND_Imm(0xE4, 'cpo', lambda state: not state.P),
+	CCOND_Imm(0xF4, 'cp', lambda state: not state.S),
+
+	RCOND(0xC9, 'ret', lambda state: True),
+	RCOND(0xC8, 'rz', lambda state: state.Z),
+	RCOND(0xD8, 'rc', lambda state: state.CY),
+	RCOND(0xE8, 'rpe', lambda state: state.P),
+	RCOND(0xF8, 'rm', lambda state: state.S),
+	RCOND(0xC0, 'rnz', lambda state: not state.Z),
+	RCOND(0xD0, 'rnc', lambda state: not state.CY),
+	RCOND(0xE0, 'rpo', lambda state: not state.P),
+	RCOND(0xF0, 'rp', lambda state: not state.S),
 
 	RST(0xC7),
 	RST(0xD7),
@@ -320,7 +320,26 @@ OPCODE_LIST = [
 	HLT(0x76),
 ]
 
-OPCODE_TABLE = dict(map(lambda op: (op.code, op), OPCODE_LIST))
+# The 12 unallocated opcodes. They aren't documented, but the silicon
+# decodes them as aliases of nop, jmp, ret and call, so code that hits
+# one (by accident or not) behaves like it does on a real 8080.
+ALIAS_OPCODE_LIST = [
+	NOP(0x08, '*nop'),
+	NOP(0x10, '*nop'),
+	NOP(0x18, '*nop'),
+	NOP(0x20, '*nop'),
+	NOP(0x28, '*nop'),
+	NOP(0x30, '*nop'),
+	NOP(0x38, '*nop'),
+
+	JCOND_Imm(0xCB, '*jmp', lambda state: True),
+	RCOND(0xD9, '*ret', lambda state: True),
+	CCOND_Imm(0xDD, '*call', lambda state: True),
+	CCOND_Imm(0xED, '*call', lambda state: True),
+	CCOND_Imm(0xFD, '*call', lambda state: True),
+]
+
+OPCODE_TABLE = dict(map(lambda op: (op.code, op), OPCODE_LIST + ALIAS_OPCODE_LIST))
 
 OLD_OPCODE_TABLE = {
 			 # format string for printing opcode, structure of args to read.
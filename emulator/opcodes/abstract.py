@@ -3,6 +3,7 @@ from emulator.state import State
 from emulator.state import Uint16Registers as U16
 from emulator.state import Uint8Registers as U8
 from emulator.state import FlagsRegisters as F
+from emulator.state import LAZY_CY, LAZY_ALL, LAZY_INCREMENT
 from functools import reduce
 
 class Op:
@@ -35,7 +36,7 @@ class Op:
 
 
 	def step(self, state: State):
-		assert False, f"[{self.code}] {self.name}: step unimplemented!"
+		raise NotImplementedError(f"[{self.code}] {self.name}: step unimplemented!")
 
 	def test(self, preop_state: State, postop_state: State):
 		assert False, f"[{self.code}] {self.name}: test unimplemented!"
@@ -59,34 +60,42 @@ class Op:
 		return high_bits, low_bits
 
 	def subop_addr_from_HL(self, state: State):
-		return self.subop_u8_pair_to_u16(state.REG_UINT8[ U8.H ], state.REG_UINT8[ U8.L ])
-
-	def subop_setflags_add(self, result: int, state: State, CY=True):
-		"""result may be a 16-bit uint"""
-		state.FLAGS[ F.Z ] = True if result & 0xFF == 0 else False
-		state.FLAGS[ F.S ] = True if result & 0x80 != 0 else False
-		state.FLAGS[ F.P ] = True if (result & 0xFF) % 2 == 0 else False 
-		
+		return (state.H << 8) | state.L
+
+	def subop_setflags_add(self, result: int, state: State, CY=True, aux=0):
+		"""
+		result may be a 16-bit uint; aux is the half-carry record for it
+		(see emulator/flags.py). The flags are only recorded here; State
+		works them out when something reads them.
+		"""
 		if CY:
-			state.FLAGS[ F.CY ] = True if result > 0xFF or result < 0x00 else False
+			state.LAZY = LAZY_ALL
+		else:
+			# keep the carry this op doesn't touch before result is replaced.
+			if state.LAZY & LAZY_CY: state._CY = state.CY
+			state.LAZY = LAZY_INCREMENT
+
+		state.RESULT = result
+		state.AUX = aux
 
 	def subop_get_processor_status_word(self, state: State):
-		PSW = int(state.FLAGS[F.CY]) \
+		PSW = int(state.CY) \
 			| 2 \
-			| (int(state.FLAGS[F.P]) << 2) \
-			| (int(state.FLAGS[F.AC]) << 4) \
-			| (int(state.FLAGS[F.Z]) << 6) \
-			| (int(state.FLAGS[F.S]) << 7) \
+			| (int(state.P) << 2) \
+			| (int(state.AC) << 4) \
+			| (int(state.Z) << 6) \
+			| (int(state.S) << 7) \
 
 		return PSW
 
 	def subop_set_processor_status_word(self, psw, state: State):
 		psw_safe = (psw & 0xD7) | 0x2 # = 0b11010111
-		state.FLAGS[F.CY] = bool(psw & 0x1)
-		state.FLAGS[F.P] = bool((psw >> 2) & 0x1)
-		state.FLAGS[F.AC] = bool((psw >> 4) & 0x1)
-		state.FLAGS[F.Z] = bool((psw >> 6) & 0x1)
-		state.FLAGS[F.S] = bool((psw >> 7) & 0x1)
+		state.LAZY = 0 # every flag is about to be overwritten.
+		state.CY = bool(psw & 0x1)
+		state.P = bool((psw >> 2) & 0x1)
+		state.AC = bool((psw >> 4) & 0x1)
+		state.Z = bool((psw >> 6) & 0x1)
+		state.S = bool((psw >> 7) & 0x1)
 
 	def subop_add(self, *arguments):
 		return reduce(lambda a,b: a + b, map(int, arguments))
@@ -110,6 +119,6 @@ class Op:
 
 
 
-def UnimplementedOp(Op):
-	def __init__(self):
-		super().__init__('none', 'unimplimented', [], [], '')
\ No newline at end of file
+class UnimplementedOp(Op):
+	def __init__(self, code: bytes):
+		super().__init__(code, 'unimplemented', [], [], '')
\ No newline at end of file
@@ -4,6 +4,8 @@ from emulator.state import State
 from emulator.state import Uint8Registers as U8
 from emulator.state import Uint16Registers as U16
 from emulator.state import FlagsRegisters as F
+from emulator.state import LAZY_CY, LAZY_ALL, LAZY_INCREMENT
+from emulator.flags import HALF_CARRY_SUB, DAA as DAA_TABLE
 
 from .abstract import Op
 
@@ -15,11 +17,16 @@ class ADD_Reg(Op):
 		comment_string = f'\t\t; A := {U8.to_string(r)} + A'
 		super().__init__(code, 'add', [U8.to_string(r)], [], comment_string)
 		self.r = r
+		self.r_name = U8.to_string(r)
 
 	def step(self, state: State):
-		result = self.subop_add(state.REG_UINT8[ U8.A ], state.REG_UINT8[ self.r ])
-		self.subop_setflags_add(result, state)
-		state.REG_UINT8[ U8.A ] = result & 0xFF # cast result to a uint8_t
+		A = state.A
+		value = getattr(state, self.r_name)
+		result = A + value
+		state.RESULT = result
+		state.AUX = A ^ value
+		state.LAZY = LAZY_ALL
+		state.A = result & 0xFF
 
 	def test(self, preop_state: State, postop_state: State):
 		result = preop_state.REG_UINT8[self.r] + preop_state.REG_UINT8[U8.A]
@@ -37,10 +44,13 @@ class ADD_Mem(Op):
 		super().__init__(code, 'add', ['M'], [], comment_string)
 
 	def step(self, state: State):
-		addr = self.subop_addr_from_HL(state)
-		result = self.subop_add(state.REG_UINT8[U8.A], state.MEM[addr])
-		self.subop_setflags_add(result, state)
-		state.REG_UINT8[ U8.A ] = result & 0xFF
+		A = state.A
+		value = state.MEM[ (state.H << 8) | state.L ]
+		result = A + value
+		state.RESULT = result
+		state.AUX = A ^ value
+		state.LAZY = LAZY_ALL
+		state.A = result & 0xFF
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -57,11 +67,16 @@ class ADC_Reg(Op):
 		comment_string = f'\t\t; A := A + {U8.to_string(r)} + CY'
 		super().__init__(code, 'adc', [f'{U8.to_string(r)}'], [], comment_string)
 		self.r = r
+		self.r_name = U8.to_string(r)
 
 	def step(self, state: State):
-		result = self.subop_add(state.REG_UINT8[ U8.A ], state.REG_UINT8[ self.r ], state.FLAGS[F.CY])
-		self.subop_setflags_add(result, state)
-		state.REG_UINT8[ U8.A ] = result & 0xFF # cast result to a uint8_t
+		A = state.A
+		value = getattr(state, self.r_name)
+		result = A + value + state.CY
+		state.RESULT = result
+		state.AUX = A ^ value
+		state.LAZY = LAZY_ALL
+		state.A = result & 0xFF
 
 	def test(self, preop_state: State, postop_state: State):
 		result = int(preop_state.REG_UINT8[self.r]) + int(preop_state.REG_UINT8[U8.A]) + int(preop_state.FLAGS[F.CY])
@@ -80,10 +95,13 @@ class ADC_Mem(Op):
 		super().__init__(code, 'adc', ['M'], [], comment_string)
 
 	def step(self, state: State):
-		addr = self.subop_addr_from_HL(state)
-		result = self.subop_add(state.REG_UINT8[ U8.A ], state.MEM[ addr ], state.FLAGS[F.CY])
-		self.subop_setflags_add(result, state)
-		state.REG_UINT8[ U8.A ] = result & 0xFF # cast result to a uint8_t
+		A = state.A
+		value = state.MEM[ (state.H << 8) | state.L ]
+		result = A + value + state.CY
+		state.RESULT = result
+		state.AUX = A ^ value
+		state.LAZY = LAZY_ALL
+		state.A = result & 0xFF
 
 	def test(self, preop_state: State, postop_state: State):
 		addr = self.subop_addr_from_HL(preop_state)
@@ -100,11 +118,15 @@ class ADI(Op):
 		super().__init__(code, 'adi', ['{0}'], [1], comment_string)
 
 	def step(self, state: State):
-		data_pointer = state.REG_UINT16[U16.PC]
-		result = self.subop_add(state.REG_UINT8[U8.A], state.MEM[ data_pointer ])
-		self.subop_setflags_add(result, state)
-		state.REG_UINT8[ U8.A ] = result & 0xFF
-		state.REG_UINT16[U16.PC] += 0x1
+		A = state.A
+		data_pointer = state.PC
+		value = state.MEM[ data_pointer ]
+		result = A + value
+		state.RESULT = result
+		state.AUX = A ^ value
+		state.LAZY = LAZY_ALL
+		state.A = result & 0xFF
+		state.PC = (data_pointer + 0x1) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		data_pointer = preop_state.REG_UINT16[U16.PC] + 0x1
@@ -123,11 +145,15 @@ class ACI(Op):
 		super().__init__(code, 'aci', ['{0}'], [1], comment_string)
 
 	def step(self, state: State):
-		data_pointer = state.REG_UINT16[U16.PC]
-		result = self.subop_add(state.REG_UINT8[U8.A], state.MEM[ data_pointer ], state.FLAGS[F.CY])
-		self.subop_setflags_add(result, state)
-		state.REG_UINT8[ U8.A ] = result & 0xFF
-		state.REG_UINT16[U16.PC] += 0x1
+		A = state.A
+		data_pointer = state.PC
+		value = state.MEM[ data_pointer ]
+		result = A + value + state.CY
+		state.RESULT = result
+		state.AUX = A ^ value
+		state.LAZY = LAZY_ALL
+		state.A = result & 0xFF
+		state.PC = (data_pointer + 0x1) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		data_pointer = preop_state.REG_UINT16[U16.PC] + 0x1
@@ -150,11 +176,16 @@ class SUB_Reg(Op):
 		comment_string = f'\t\t; A := {U8.to_string(r)} - A'
 		super().__init__(code, 'sub', [U8.to_string(r)], [], comment_string)
 		self.r = r
+		self.r_name = U8.to_string(r)
 
 	def step(self, state: State):
-		result = self.subop_sub(state.REG_UINT8[U8.A], state.REG_UINT8[self.r])
-		self.subop_setflags_add(result, state)
-		state.REG_UINT8[ U8.A ] = result & 0xFF # cast result to a uint8_t
+		A = state.A
+		value = getattr(state, self.r_name)
+		result = A - value
+		state.RESULT = result
+		state.AUX = A ^ value ^ HALF_CARRY_SUB
+		state.LAZY = LAZY_ALL
+		state.A = result & 0xFF
 
 	def test(self, preop_state: State, postop_state: State):
 		result = int(preop_state.REG_UINT8[U8.A]) - int(preop_state.REG_UINT8[self.r])
@@ -173,10 +204,13 @@ class SUB_Mem(Op):
 		super().__init__(code, 'sub', ['M'], [], comment_string)
 
 	def step(self, state: State):
-		addr = self.subop_addr_from_HL(state)
-		result = self.subop_sub(state.REG_UINT8[U8.A], state.MEM[addr])
-		self.subop_setflags_add(result, state)
-		state.REG_UINT8[ U8.A ] = result & 0xFF
+		A = state.A
+		value = state.MEM[ (state.H << 8) | state.L ]
+		result = A - value
+		state.RESULT = result
+		state.AUX = A ^ value ^ HALF_CARRY_SUB
+		state.LAZY = LAZY_ALL
+		state.A = result & 0xFF
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -194,11 +228,16 @@ class SBB_Reg(Op):
 		comment_string = f'\t\t; A := A - {U8.to_string(r)} - CY'
 		super().__init__(code, 'sbb', [f'{U8.to_string(r)}'], [], comment_string)
 		self.r = r
+		self.r_name = U8.to_string(r)
 
 	def step(self, state: State):
-		result = self.subop_sub(state.REG_UINT8[ U8.A ], state.REG_UINT8[ self.r ], state.FLAGS[F.CY])
-		self.subop_setflags_add(result, state)
-		state.REG_UINT8[ U8.A ] = result & 0xFF # cast result to a uint8_t
+		A = state.A
+		value = getattr(state, self.r_name)
+		result = A - value - state.CY
+		state.RESULT = result
+		state.AUX = A ^ value ^ HALF_CARRY_SUB
+		state.LAZY = LAZY_ALL
+		state.A = result & 0xFF
 
 	def test(self, preop_state: State, postop_state: State):
 		result = int(preop_state.REG_UINT8[U8.A]) - int(preop_state.REG_UINT8[self.r]) - int(preop_state.FLAGS[F.CY])
@@ -216,10 +255,13 @@ class SBB_Mem(Op):
 		super().__init__(code, 'sbb', ['M'], [], comment_string)
 
 	def step(self, state: State):
-		addr = self.subop_addr_from_HL(state)
-		result = self.subop_sub(state.REG_UINT8[U8.A], state.MEM[addr], state.FLAGS[F.CY])
-		self.subop_setflags_add(result, state)
-		state.REG_UINT8[ U8.A ] = result & 0xFF # cast result to a uint8_t
+		A = state.A
+		value = state.MEM[ (state.H << 8) | state.L ]
+		result = A - value - state.CY
+		state.RESULT = result
+		state.AUX = A ^ value ^ HALF_CARRY_SUB
+		state.LAZY = LAZY_ALL
+		state.A = result & 0xFF
 
 	def test(self, preop_state: State, postop_state: State):
 		addr = self.subop_addr_from_HL(preop_state)
@@ -236,11 +278,15 @@ class SUI(Op):
 		super().__init__(code, 'sui', ['{0}'], [1], comment_string)
 
 	def step(self, state: State):
-		data_pointer = state.REG_UINT16[U16.PC]
-		result = self.subop_sub(state.REG_UINT8[U8.A], state.MEM[ data_pointer ])
-		self.subop_setflags_add(result, state)
-		state.REG_UINT8[ U8.A ] = result & 0xFF
-		state.REG_UINT16[U16.PC] += 0x1
+		A = state.A
+		data_pointer = state.PC
+		value = state.MEM[ data_pointer ]
+		result = A - value
+		state.RESULT = result
+		state.AUX = A ^ value ^ HALF_CARRY_SUB
+		state.LAZY = LAZY_ALL
+		state.A = result & 0xFF
+		state.PC = (data_pointer + 0x1) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		data_pointer = preop_state.REG_UINT16[U16.PC] + 0x1
@@ -259,11 +305,15 @@ class SBI(Op):
 		super().__init__(code, 'sbi', ['{0}'], [1], comment_string)
 
 	def step(self, state: State):
-		data_pointer = state.REG_UINT16[U16.PC]
-		result = self.subop_sub(state.REG_UINT8[U8.A], state.MEM[ data_pointer ], state.FLAGS[F.CY])
-		self.subop_setflags_add(result, state)
-		state.REG_UINT8[ U8.A ] = result & 0xFF
-		state.REG_UINT16[U16.PC] += 0x1
+		A = state.A
+		data_pointer = state.PC
+		value = state.MEM[ data_pointer ]
+		result = A - value - state.CY
+		state.RESULT = result
+		state.AUX = A ^ value ^ HALF_CARRY_SUB
+		state.LAZY = LAZY_ALL
+		state.A = result & 0xFF
+		state.PC = (data_pointer + 0x1) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		data_pointer = preop_state.REG_UINT16[U16.PC] + 0x1
@@ -281,11 +331,16 @@ class INR_Reg(Op):
 		comment_string = f'\t\t\t; {U8.to_string(r)} := {U8.to_string(r)} + 1; set flags Z, S, P, AC'
 		super().__init__(code, 'inr', [f'{U8.to_string(r)}'], [], comment_string)
 		self.r = r
+		self.r_name = U8.to_string(r)
 
 	def step(self, state: State):
-		result = self.subop_add(state.REG_UINT8[self.r], 1)
-		self.subop_setflags_add(result, state, CY=False)
-		state.REG_UINT8[ self.r ] = result & 0xFF
+		value = getattr(state, self.r_name)
+		result = value + 1
+		if state.LAZY & LAZY_CY: state._CY = state.CY # keep the carry
+		state.RESULT = result
+		state.AUX = value ^ 0x01
+		state.LAZY = LAZY_INCREMENT
+		setattr(state, self.r_name, result & 0xFF)
 
 	def test(self, preop_state: State, postop_state: State):
 		result = int(preop_state.REG_UINT8[self.r]) + 1
@@ -300,10 +355,15 @@ class INR_Mem(Op):
 		super().__init__(code, 'inr', [f'M'], [], comment_string)
 
 	def step(self, state: State):
-		addr = self.subop_addr_from_HL(state)
-		result = self.subop_add(state.MEM[addr], 1)
-		self.subop_setflags_add(result, state, CY=False)
-		state.MEM[ addr ] = result & 0xFF
+		addr = (state.H << 8) | state.L
+		value = state.MEM[addr]
+		result = value + 1
+		if state.PAGES[addr >> 8]: state.MEM[addr] = result & 0xFF
+		else: state.MAP.write(state.MEM, addr, result & 0xFF)
+		if state.LAZY & LAZY_CY: state._CY = state.CY # keep the carry
+		state.RESULT = result
+		state.AUX = value ^ 0x01
+		state.LAZY = LAZY_INCREMENT
 
 	def test(self, preop_state: State, postop_state: State):
 		addr = self.subop_addr_from_HL(preop_state)
@@ -318,11 +378,16 @@ class DCR_Reg(Op):
 		comment_string = f'\t\t\t; {U8.to_string(r)} := {U8.to_string(r)} - 1; set flags Z, S, P, AC'
 		super().__init__(code, 'dcr', [f'{U8.to_string(r)}'], [], comment_string)
 		self.r = r
+		self.r_name = U8.to_string(r)
 
 	def step(self, state: State):
-		result = self.subop_sub(state.REG_UINT8[self.r], 1)
-		self.subop_setflags_add(result, state, CY=False)
-		state.REG_UINT8[ self.r ] = result & 0xFF
+		value = getattr(state, self.r_name)
+		result = value - 1
+		if state.LAZY & LAZY_CY: state._CY = state.CY # keep the carry
+		state.RESULT = result
+		state.AUX = value ^ 0x01 ^ HALF_CARRY_SUB
+		state.LAZY = LAZY_INCREMENT
+		setattr(state, self.r_name, result & 0xFF)
 
 	def test(self, preop_state: State, postop_state: State):
 		result = int(preop_state.REG_UINT8[self.r]) - 1
@@ -337,10 +402,15 @@ class DCR_Mem(Op):
 		super().__init__(code, 'dcr', [f'M'], [], comment_string)
 
 	def step(self, state: State):
-		addr = self.subop_addr_from_HL(state)
-		result = self.subop_sub(state.MEM[addr], 1)
-		self.subop_setflags_add(result, state, CY=False)
-		state.MEM[ addr ] = result & 0xFF
+		addr = (state.H << 8) | state.L
+		value = state.MEM[addr]
+		result = value - 1
+		if state.PAGES[addr >> 8]: state.MEM[addr] = result & 0xFF
+		else: state.MAP.write(state.MEM, addr, result & 0xFF)
+		if state.LAZY & LAZY_CY: state._CY = state.CY # keep the carry
+		state.RESULT = result
+		state.AUX = value ^ 0x01 ^ HALF_CARRY_SUB
+		state.LAZY = LAZY_INCREMENT
 
 	def test(self, preop_state: State, postop_state: State):
 		addr = self.subop_addr_from_HL(preop_state)
@@ -355,14 +425,15 @@ class INX_Reg(Op):
 		comment_string = f'\t\t\t; ({U8.to_string(rh)}{U8.to_string(rl)}) = ({U8.to_string(rh)}{U8.to_string(rl)}) + 1; no flags set.'
 		super().__init__(code, 'inx', [f'{U8.to_string(rh)}'], [], comment_string)
 		self.rh = rh
+		self.rh_name = U8.to_string(rh)
 		self.rl = rl
+		self.rl_name = U8.to_string(rl)
 
 	def step(self, state: State):
-		value = self.subop_u8_pair_to_u16(state.REG_UINT8[self.rh], state.REG_UINT8[self.rl])
-		result = self.subop_add(value, 1)
-		val_h, val_l = self.subop_u16_to_u8_pair(result)
-		state.REG_UINT8[ self.rh ] = val_h & 0xFF
-		state.REG_UINT8[ self.rl ] = val_l & 0xFF
+		value = (getattr(state, self.rh_name) << 8) | getattr(state, self.rl_name)
+		result = (value + 1) & 0xFFFF
+		setattr(state, self.rh_name, result >> 8)
+		setattr(state, self.rl_name, result & 0xFF)
 
 	def test(self, preop_state: State, postop_state: State):
 		value = self.subop_u8_pair_to_u16(preop_state.REG_UINT8[self.rh], preop_state.REG_UINT8[self.rl])
@@ -384,8 +455,7 @@ class INX_SP(Op):
 		super().__init__(code, 'inx', [f'SP'], [], comment_string)
 
 	def step(self, state: State):
-		result = self.subop_add(state.REG_UINT16[U16.SP], 1)
-		state.REG_UINT16[ U16.SP ] = result & 0xFFFF
+		state.SP = (state.SP + 1) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		SP_has_incremented = postop_state.REG_UINT16[U16.SP] == ((preop_state.REG_UINT16[U16.SP] + 1) & 0xFFFF)
@@ -397,14 +467,15 @@ class DCX_Reg(Op):
 		comment_string = f'\t\t\t; ({U8.to_string(rh)}{U8.to_string(rl)}) = ({U8.to_string(rh)}{U8.to_string(rl)}) - 1; no flags set.'
 		super().__init__(code, 'dcx', [f'{U8.to_string(rh)}'], [], comment_string)
 		self.rh = rh
+		self.rh_name = U8.to_string(rh)
 		self.rl = rl
+		self.rl_name = U8.to_string(rl)
 
 	def step(self, state: State):
-		value = self.subop_u8_pair_to_u16(state.REG_UINT8[self.rh], state.REG_UINT8[self.rl])
-		result = self.subop_sub(value, 1)
-		val_h, val_l = self.subop_u16_to_u8_pair(result)
-		state.REG_UINT8[ self.rh ] = val_h & 0xFF
-		state.REG_UINT8[ self.rl ] = val_l & 0xFF
+		value = (getattr(state, self.rh_name) << 8) | getattr(state, self.rl_name)
+		result = (value - 1) & 0xFFFF
+		setattr(state, self.rh_name, result >> 8)
+		setattr(state, self.rl_name, result & 0xFF)
 
 	def test(self, preop_state: State, postop_state: State):
 		value = self.subop_u8_pair_to_u16(preop_state.REG_UINT8[self.rh], preop_state.REG_UINT8[self.rl])
@@ -426,8 +497,7 @@ class DCX_SP(Op):
 		super().__init__(code, 'dcx', [f'SP'], [], comment_string)
 
 	def step(self, state: State):
-		result = self.subop_sub(state.REG_UINT16[U16.SP], 1)
-		state.REG_UINT16[ U16.SP ] = result & 0xFFFF
+		state.SP = (state.SP - 1) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		SP_has_incremented = postop_state.REG_UINT16[U16.SP] == ((preop_state.REG_UINT16[U16.SP] - 1) & 0xFFFF)
@@ -439,18 +509,18 @@ class DAD_Reg(Op):
 		comment_string = f'\t\t\t; (HL) = (HL) + ({U8.to_string(rh)}{U8.to_string(rl)}); CY flag set for double-precision add.'
 		super().__init__(code, 'dad', [f'{U8.to_string(rh)}'], [], comment_string)
 		self.rh = rh
+		self.rh_name = U8.to_string(rh)
 		self.rl = rl
+		self.rl_name = U8.to_string(rl)
 
 	def step(self, state: State):
-		v1 = self.subop_u8_pair_to_u16(state.REG_UINT8[self.rh], state.REG_UINT8[self.rl])
-		v2 = self.subop_u8_pair_to_u16(state.REG_UINT8[U8.H], state.REG_UINT8[U8.L])
-		result = self.subop_add(v1, v2)
-		state.FLAGS[F.CY] = True if result > 0xFFFF else False
-
-		res_h, res_l = self.subop_u16_to_u8_pair(result & 0xFFFF)
+		v1 = (getattr(state, self.rh_name) << 8) | getattr(state, self.rl_name)
+		v2 = (state.H << 8) | state.L
+		result = v1 + v2
+		state.CY = True if result > 0xFFFF else False
 
-		state.REG_UINT8[U8.H] = res_h
-		state.REG_UINT8[U8.L] = res_l
+		state.H = (result >> 8) & 0xFF
+		state.L = result & 0xFF
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -472,15 +542,13 @@ class DAD_SP(Op):
 		super().__init__(code, 'dad', [f'SP'], [], comment_string)
 
 	def step(self, state: State):
-		v1 = state.REG_UINT16[U16.SP]
-		v2 = self.subop_u8_pair_to_u16(state.REG_UINT8[U8.H], state.REG_UINT8[U8.L])
-		result = self.subop_add(v1, v2)
-		state.FLAGS[F.CY] = True if result > 0xFFFF else False
-
-		res_h, res_l = self.subop_u16_to_u8_pair(result & 0xFFFF)
+		v1 = state.SP
+		v2 = (state.H << 8) | state.L
+		result = v1 + v2
+		state.CY = True if result > 0xFFFF else False
 
-		state.REG_UINT8[U8.H] = res_h
-		state.REG_UINT8[U8.L] = res_l
+		state.H = (result >> 8) & 0xFF
+		state.L = result & 0xFF
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -502,16 +570,9 @@ class DAA(Op):
 		super().__init__(code, 'daa', [], [], comment_string)
 
 	def step(self, state: State):
-		val = int(state.REG_UINT8[U8.A])
-
-		if (val & 0x0F) > 9 or state.FLAGS[F.AC]:
-			val += 0x06
-
-		if (val & 0xF0) > 9 or state.FLAGS[F.CY]:
-			val += ((val >> 4) + 0x06) << 4
-
-		self.subop_setflags_add(val, state)
-		state.REG_UINT8[U8.A] = val & 0xFF
+		state.RESULT, state.AUX = DAA_TABLE[ state.A | (state.CY << 8) | (state.AC << 9) ]
+		state.LAZY = LAZY_ALL
+		state.A = state.RESULT & 0xFF
 
 	def test(self, preop_state: State, postop_state: State):
 		assert False, 'no test for DAA implemented.'
@@ -4,6 +4,7 @@ from emulator.state import State
 from emulator.state import Uint8Registers as U8
 from emulator.state import Uint16Registers as U16
 from emulator.state import FlagsRegisters as F
+from emulator.cycles import CYCLES, CYCLES_TAKEN
 
 from .abstract import Op
 
@@ -17,18 +18,17 @@ class JCOND_Imm(Op):
 		self.predicate = predicate
 
 	def step(self, state: State):
-		if self.predicate(state.FLAGS):
-			PC = state.REG_UINT16[U16.PC]
+		if self.predicate(state):
+			PC = state.PC
 			low_byte = state.MEM[ PC ]
-			high_byte = state.MEM[ PC + 0x1 ]
-			addr = self.subop_u8_pair_to_u16(high_byte, low_byte)
-			state.REG_UINT16[ U16.PC ] = addr 
+			high_byte = state.MEM[ (PC + 0x1) & 0xFFFF ]
+			state.PC = (high_byte << 8) | low_byte
 		
 		else:
-			state.REG_UINT16[U16.PC] += 0x2
+			state.PC = (state.PC + 0x2) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
-		if self.predicate(preop_state.FLAGS):
+		if self.predicate(preop_state):
 			PC = preop_state.REG_UINT16[U16.PC]
 			addr = (preop_state.MEM[PC + 0x2] << 8) | preop_state.MEM[ PC + 0x1 ]
 			PC_has_jumped = postop_state.REG_UINT16[U16.PC] == addr
@@ -45,29 +45,36 @@ class CCOND_Imm(Op):
 		comment_string = '\t\t; PC := {1}{0}'
 		super().__init__(code, name, ['{1}{0}'], [1,1], comment_string)
 		self.predicate = predicate 
+		self.taken_cycles = CYCLES_TAKEN[code] - CYCLES[code]
 
 	def step(self, state: State):
-		if self.predicate(state.FLAGS):
-			PC = state.REG_UINT16[U16.PC]
-			SP = state.REG_UINT16[U16.SP]
+		if self.predicate(state):
+			PC = state.PC
+			SP = state.SP
+			MEM = state.MEM
 
 			# the address of the next instruction 
 			# is pushed onto the stack.
-			PCH, PCL = self.subop_u16_to_u8_pair(PC + 0x2)
-			state.MEM[ SP - 0x1 ] = PCH
-			state.MEM[ SP - 0x2 ] = PCL
-			state.REG_UINT16[U16.SP] -= 0x2
-
-			addr_low_byte = state.MEM[ PC ]
-			addr_high_byte = state.MEM[ PC + 0x1 ]
-			addr = self.subop_u8_pair_to_u16(addr_high_byte, addr_low_byte)
-			state.REG_UINT16[ U16.PC ] = addr 
+			ret = (PC + 0x2) & 0xFFFF
+			high, low = (SP - 0x1) & 0xFFFF, (SP - 0x2) & 0xFFFF
+			if state.PAGES[high >> 8] and state.PAGES[low >> 8]:
+				MEM[high] = ret >> 8
+				MEM[low] = ret & 0xFF
+			else:
+				state.MAP.write(MEM, high, ret >> 8)
+				state.MAP.write(MEM, low, ret & 0xFF)
+			state.SP = (SP - 0x2) & 0xFFFF
+			state.CYCLES += self.taken_cycles
+
+			addr_low_byte = MEM[ PC ]
+			addr_high_byte = MEM[ (PC + 0x1) & 0xFFFF ]
+			state.PC = (addr_high_byte << 8) | addr_low_byte
 		
 		else:
-			state.REG_UINT16[U16.PC] += 0x2
+			state.PC = (state.PC + 0x2) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
-		if self.predicate(preop_state.FLAGS):
+		if self.predicate(preop_state):
 			PC = preop_state.REG_UINT16[U16.PC]
 			PC_prime = postop_state.REG_UINT16[U16.PC]
 			SP = preop_state.REG_UINT16[U16.SP]
@@ -97,19 +104,21 @@ class RCOND(Op):
 		comment_string = '\t\t; PC := (SP)(SP + 1); SP := SP + 2'
 		super().__init__(code, name, [], [], comment_string)
 		self.predicate = predicate 
+		self.taken_cycles = CYCLES_TAKEN[code] - CYCLES[code]
 
 	def step(self, state: State):
-		if self.predicate(state.FLAGS):
-			PCL = state.MEM[ state.REG_UINT16[U16.SP] ]
-			PCH = state.MEM[ state.REG_UINT16[U16.SP] + 0x1 ]
-			PC = self.subop_u8_pair_to_u16(PCH, PCL)
+		if self.predicate(state):
+			SP = state.SP
+			PCL = state.MEM[ SP ]
+			PCH = state.MEM[ (SP + 0x1) & 0xFFFF ]
 
-			state.REG_UINT16[U16.PC] = PC
-			state.REG_UINT16[U16.SP] += 0x2
+			state.PC = (PCH << 8) | PCL
+			state.SP = (SP + 0x2) & 0xFFFF
+			state.CYCLES += self.taken_cycles
 
 
 	def test(self, preop_state: State, postop_state: State):
-		if self.predicate(preop_state.FLAGS):
+		if self.predicate(preop_state):
 			PC = preop_state.REG_UINT16[U16.PC]
 			SP = preop_state.REG_UINT16[U16.SP]
 
@@ -138,12 +147,17 @@ class RST(Op):
 		self.addr = data
 
 	def step(self, state: State):
-		SP = state.REG_UINT16[U16.SP]
-		PCH, PCL = self.subop_u16_to_u8_pair(state.REG_UINT16[U16.PC])
-		state.MEM[SP - 0x1] = PCH
-		state.MEM[SP - 0x2] = PCL
-		state.REG_UINT16[U16.SP] -= 0x2
-		state.REG_UINT16[U16.PC] = self.addr
+		SP = state.SP
+		PC = state.PC
+		high, low = (SP - 0x1) & 0xFFFF, (SP - 0x2) & 0xFFFF
+		if state.PAGES[high >> 8] and state.PAGES[low >> 8]:
+			state.MEM[high] = PC >> 8
+			state.MEM[low] = PC & 0xFF
+		else:
+			state.MAP.write(state.MEM, high, PC >> 8)
+			state.MAP.write(state.MEM, low, PC & 0xFF)
+		state.SP = (SP - 0x2) & 0xFFFF
+		state.PC = self.addr
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -169,8 +183,7 @@ class PCHL(Op):
 		super().__init__(code, 'pchl', [], [], comment_string)
 
 	def step(self, state: State):
-		addr = self.subop_addr_from_HL(state)
-		state.REG_UINT16[U16.PC] = addr
+		state.PC = (state.H << 8) | state.L
 
 	def test(self, preop_state: State, postop_state: State):
 		addr = (preop_state.REG_UINT8[U8.H] << 8) | preop_state.REG_UINT8[ U8.L ]
@@ -12,10 +12,12 @@ class MOV_Reg_Reg(Op):
 		comment_string = f'\t\t; {U8.to_string(r1)} := {U8.to_string(r2)}'
 		super().__init__(code, 'mov', [U8.to_string(r1), U8.to_string(r2)], [], comment_string)
 		self.r1 = r1
+		self.r1_name = U8.to_string(r1)
 		self.r2 = r2
+		self.r2_name = U8.to_string(r2)
 
 	def step(self, state: State):
-		state.REG_UINT8[ self.r1 ] = state.REG_UINT8[ self.r2 ]
+		setattr(state, self.r1_name, getattr(state, self.r2_name))
 
 	def test(self, preop_state: State, postop_state: State):
 		R1_is_R2 = postop_state.REG_UINT8[ self.r1 ] == preop_state.REG_UINT8[ self.r2 ]
@@ -32,10 +34,11 @@ class MOV_Reg_Mem(Op):
 		comment_string = f'\t\t; {U8.to_string(r1)} := (HL)'
 		super().__init__(code, 'mov', [U8.to_string(r1), 'M'], [], comment_string)
 		self.r1 = r1
+		self.r1_name = U8.to_string(r1)
 
 	def step(self, state: State):
-		memory_location = self.subop_addr_from_HL(state)
-		state.REG_UINT8[ self.r1 ] = state.MEM[memory_location]
+		memory_location = (state.H << 8) | state.L
+		setattr(state, self.r1_name, state.MEM[memory_location])
 
 	def test(self, preop_state: State, postop_state: State):
 		memory_location = self.subop_addr_from_HL(preop_state)
@@ -53,10 +56,12 @@ class MOV_Mem_Reg(Op):
 		comment_string = f'\t\t; {U8.to_string(r1)} := (HL)'
 		super().__init__(code, 'mov', ['M', U8.to_string(r1)], [], comment_string)
 		self.r1 = r1
+		self.r1_name = U8.to_string(r1)
 
 	def step(self, state: State):
-		memory_location = self.subop_addr_from_HL(state)
-		state.MEM[memory_location] = state.REG_UINT8[ self.r1 ]
+		memory_location = (state.H << 8) | state.L
+		if state.PAGES[memory_location >> 8]: state.MEM[memory_location] = getattr(state, self.r1_name)
+		else: state.MAP.write(state.MEM, memory_location, getattr(state, self.r1_name))
 
 	def test(self, preop_state: State, postop_state: State):
 		memory_location = self.subop_addr_from_HL(preop_state)
@@ -74,13 +79,14 @@ class MVI_Reg_Imm(Op):
 			comment_string = f'\t\t; {U8.to_string(r1)} := data:{0}'
 			super().__init__(code, 'mvi', [U8.to_string(r1), '{0}'], [1], comment_string)
 			self.r1 = r1
+			self.r1_name = U8.to_string(r1)
 
 	def step(self, state: State):
-		data_from_rom = state.MEM[ state.REG_UINT16[ U16.PC ] ]
-		state.REG_UINT8[ self.r1 ] = data_from_rom
+		data_from_rom = state.MEM[ state.PC ]
+		setattr(state, self.r1_name, data_from_rom)
 		# for an immediate value, we need to increment the PC by one, again
 		# so we start executing the next opcode, not the data, on the next cycle.
-		state.REG_UINT16[ U16.PC ] += 0x01
+		state.PC = (state.PC + 0x01) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		preop_PC = preop_state.REG_UINT16[ U16.PC ]
@@ -98,12 +104,13 @@ class MVI_Mem_Imm(Op):
 			super().__init__(code, 'mvi', ['M', '{0}'], [1], comment_string)
 
 	def step(self, state: State):
-		memory_location = self.subop_addr_from_HL(state)
-		data_from_rom = state.MEM[ state.REG_UINT16[ U16.PC ] ]
-		state.MEM[memory_location] = data_from_rom
+		memory_location = (state.H << 8) | state.L
+		data_from_rom = state.MEM[ state.PC ]
+		if state.PAGES[memory_location >> 8]: state.MEM[memory_location] = data_from_rom
+		else: state.MAP.write(state.MEM, memory_location, data_from_rom)
 		# for an immediate value, we need to increment the PC by one, again
 		# so we start executing the next opcode, not the data, on the next cycle.
-		state.REG_UINT16[ U16.PC ] += 0x01
+		state.PC = (state.PC + 0x01) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		memory_location = self.subop_addr_from_HL(preop_state)
@@ -123,16 +130,19 @@ class LXI_Reg_Imm(Op):
 		comment = f'\t\t; {U8.to_string(rh)} := data:{1}; {U8.to_string(rl)} := data:{0}'
 		super().__init__(code, 'lxi', [U8.to_string(rh), '{1}{0}'], [1,1], comment)
 		self.rh = rh
+		self.rh_name = U8.to_string(rh)
 		self.rl = rl
+		self.rl_name = U8.to_string(rl)
 
 	def step(self, state: State):
-		low_byte_from_rom = state.MEM[ state.REG_UINT16[ U16.PC ] ]
-		high_byte_from_rom = state.MEM[ state.REG_UINT16[ U16.PC ] + 0x01 ]
+		PC = state.PC
+		low_byte_from_rom = state.MEM[ PC ]
+		high_byte_from_rom = state.MEM[ (PC + 0x01) & 0xFFFF ]
 
-		state.REG_UINT8[ self.rl ] = low_byte_from_rom
-		state.REG_UINT8[ self.rh ] = high_byte_from_rom
+		setattr(state, self.rl_name, low_byte_from_rom)
+		setattr(state, self.rh_name, high_byte_from_rom)
 
-		state.REG_UINT16[ U16.PC ] += 0x02
+		state.PC = (PC + 0x02) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		preop_PC = preop_state.REG_UINT16[ U16.PC ]
@@ -155,13 +165,13 @@ class LXI_SP(Op):
 		super().__init__(code, 'lxi', ['SP', '{1}{0}'], [1,1], comment)
 
 	def step(self, state: State):
-		low_byte_from_rom = state.MEM[ state.REG_UINT16[ U16.PC ] ]
-		high_byte_from_rom = state.MEM[ state.REG_UINT16[ U16.PC ] + 0x01 ]
+		PC = state.PC
+		low_byte_from_rom = state.MEM[ PC ]
+		high_byte_from_rom = state.MEM[ (PC + 0x01) & 0xFFFF ]
 
-		data = self.subop_u8_pair_to_u16(high_byte_from_rom, low_byte_from_rom)
-		state.REG_UINT16[ U16.SP ] = data
+		state.SP = (high_byte_from_rom << 8) | low_byte_from_rom
 
-		state.REG_UINT16[ U16.PC ] += 0x02
+		state.PC = (PC + 0x02) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		preop_PC = preop_state.REG_UINT16[ U16.PC ]
@@ -182,12 +192,13 @@ class LDA(Op):
 		super().__init__(code, 'lda', ['{1}{0}'], [1,1], comment)
 
 	def step(self, state: State):
-		low_byte_from_rom = state.MEM[ state.REG_UINT16[ U16.PC ] ]
-		high_byte_from_rom = state.MEM[ state.REG_UINT16[ U16.PC ] + 0x01 ]
-		addr = self.subop_u8_pair_to_u16(high_byte_from_rom, low_byte_from_rom)
+		PC = state.PC
+		low_byte_from_rom = state.MEM[ PC ]
+		high_byte_from_rom = state.MEM[ (PC + 0x01) & 0xFFFF ]
+		addr = (high_byte_from_rom << 8) | low_byte_from_rom
 
-		state.REG_UINT8[ U8.A ] = state.MEM[ addr ]
-		state.REG_UINT16[ U16.PC ] += 0x02
+		state.A = state.MEM[ addr ]
+		state.PC = (PC + 0x02) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		preop_PC = preop_state.REG_UINT16[ U16.PC ]
@@ -208,12 +219,14 @@ class STA(Op):
 		super().__init__(code, 'sta', ['{1}{0}'], [1,1], comment)
 
 	def step(self, state: State):
-		low_byte_from_rom = state.MEM[ state.REG_UINT16[ U16.PC ] ]
-		high_byte_from_rom = state.MEM[ state.REG_UINT16[ U16.PC ] + 0x01 ]
-		addr = self.subop_u8_pair_to_u16(high_byte_from_rom, low_byte_from_rom)
+		PC = state.PC
+		low_byte_from_rom = state.MEM[ PC ]
+		high_byte_from_rom = state.MEM[ (PC + 0x01) & 0xFFFF ]
+		addr = (high_byte_from_rom << 8) | low_byte_from_rom
 
-		state.MEM[ addr ] = state.REG_UINT8[ U8.A ]
-		state.REG_UINT16[ U16.PC ] += 0x02
+		if state.PAGES[addr >> 8]: state.MEM[addr] = state.A
+		else: state.MAP.write(state.MEM, addr, state.A)
+		state.PC = (PC + 0x02) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		preop_PC = preop_state.REG_UINT16[ U16.PC ]
@@ -236,14 +249,20 @@ class SHLD(Op):
 		super().__init__(code, 'shld', ['{1}{0}'], [1,1], comment)
 
 	def step(self, state: State):
-		low_byte_from_rom = state.MEM[ state.REG_UINT16[ U16.PC ] ]
-		high_byte_from_rom = state.MEM[ state.REG_UINT16[ U16.PC ] + 0x01 ]
-		addr = self.subop_u8_pair_to_u16(high_byte_from_rom, low_byte_from_rom)
+		PC = state.PC
+		low_byte_from_rom = state.MEM[ PC ]
+		high_byte_from_rom = state.MEM[ (PC + 0x01) & 0xFFFF ]
+		addr = (high_byte_from_rom << 8) | low_byte_from_rom
 
-		state.MEM[addr + 0x01] = state.REG_UINT8[U8.H]
-		state.MEM[addr] = state.REG_UINT8[U8.L]
+		high = (addr + 0x01) & 0xFFFF
+		if state.PAGES[high >> 8] and state.PAGES[addr >> 8]:
+			state.MEM[high] = state.H
+			state.MEM[addr] = state.L
+		else:
+			state.MAP.write(state.MEM, high, state.H)
+			state.MAP.write(state.MEM, addr, state.L)
 
-		state.REG_UINT16[ U16.PC ] += 0x02
+		state.PC = (PC + 0x02) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		preop_PC = preop_state.REG_UINT16[ U16.PC ]
@@ -266,14 +285,15 @@ class LHLD(Op):
 		super().__init__(code, 'lhld', ['{1}{0}'], [1,1], comment)
 
 	def step(self, state: State):
-		low_byte_from_rom = state.MEM[ state.REG_UINT16[ U16.PC ] ]
-		high_byte_from_rom = state.MEM[ state.REG_UINT16[ U16.PC ] + 0x01 ]
-		addr = self.subop_u8_pair_to_u16(high_byte_from_rom, low_byte_from_rom)
+		PC = state.PC
+		low_byte_from_rom = state.MEM[ PC ]
+		high_byte_from_rom = state.MEM[ (PC + 0x01) & 0xFFFF ]
+		addr = (high_byte_from_rom << 8) | low_byte_from_rom
 
-		state.REG_UINT8[U8.H] = state.MEM[addr + 0x01]
-		state.REG_UINT8[U8.L] = state.MEM[addr]
+		state.H = state.MEM[(addr + 0x01) & 0xFFFF]
+		state.L = state.MEM[addr]
 
-		state.REG_UINT16[ U16.PC ] += 0x02
+		state.PC = (PC + 0x02) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		preop_PC = preop_state.REG_UINT16[ U16.PC ]
@@ -295,14 +315,16 @@ class LDAX_Reg(Op):
 		comment = f'\t\t\t; A := ({U8.to_string(r1)}{U8.to_string(r2)})'
 		super().__init__(code, 'ldax', [f'{U8.to_string(r1)}'], [], comment)
 		self.r1 = r1
+		self.r1_name = U8.to_string(r1)
 		self.r2 = r2
+		self.r2_name = U8.to_string(r2)
 
 	def step(self, state: State):
-		low_byte_from_reg = state.REG_UINT8[self.r2]
-		high_byte_from_reg = state.REG_UINT8[self.r1]
-		addr = self.subop_u8_pair_to_u16(high_byte_from_reg, low_byte_from_reg)
+		low_byte_from_reg = getattr(state, self.r2_name)
+		high_byte_from_reg = getattr(state, self.r1_name)
+		addr = (high_byte_from_reg << 8) | low_byte_from_reg
 
-		state.REG_UINT8[ U8.A ] = state.MEM[addr]
+		state.A = state.MEM[addr]
 
 	def test(self, preop_state: State, postop_state: State):
 		low_byte_from_reg = preop_state.REG_UINT8[self.r2]
@@ -318,14 +340,17 @@ class STAX_Reg(Op):
 		comment = f'\t\t\t; ({U8.to_string(r1)}{U8.to_string(r2)}) := A'
 		super().__init__(code, 'stax', [f'{U8.to_string(r1)}'], [], comment)
 		self.r1 = r1
+		self.r1_name = U8.to_string(r1)
 		self.r2 = r2
+		self.r2_name = U8.to_string(r2)
 
 	def step(self, state: State):
-		low_byte_from_reg = state.REG_UINT8[self.r2]
-		high_byte_from_reg = state.REG_UINT8[self.r1]
-		addr = self.subop_u8_pair_to_u16(high_byte_from_reg, low_byte_from_reg)
+		low_byte_from_reg = getattr(state, self.r2_name)
+		high_byte_from_reg = getattr(state, self.r1_name)
+		addr = (high_byte_from_reg << 8) | low_byte_from_reg
 
-		state.MEM[addr] = state.REG_UINT8[ U8.A ]
+		if state.PAGES[addr >> 8]: state.MEM[addr] = state.A
+		else: state.MAP.write(state.MEM, addr, state.A)
 
 	def test(self, preop_state: State, postop_state: State):
 		low_byte_from_reg = preop_state.REG_UINT8[self.r2]
@@ -343,14 +368,8 @@ class XCHG(Op):
 		super().__init__(code, 'xchg', [], [], comment)
 
 	def step(self, state: State):
-		tmp_high = state.REG_UINT8[ U8.D ]
-		tmp_low = state.REG_UINT8[ U8.E ]
-
-		state.REG_UINT8[ U8.D ] = state.REG_UINT8[ U8.H ]
-		state.REG_UINT8[ U8.E ] = state.REG_UINT8[ U8.L ]
-
-		state.REG_UINT8[ U8.H ] = tmp_high
-		state.REG_UINT8[ U8.L ] = tmp_low
+		state.D, state.H = state.H, state.D
+		state.E, state.L = state.L, state.E
 
 	def test(self, preop_state: State, postop_state: State):
 		H_is_now_D = postop_state.REG_UINT8[U8.H] == preop_state.REG_UINT8[U8.D]
@@ -4,6 +4,8 @@ from emulator.state import State
 from emulator.state import Uint8Registers as U8
 from emulator.state import Uint16Registers as U16
 from emulator.state import FlagsRegisters as F
+from emulator.state import LAZY_ALL, LAZY_LOGIC
+from emulator.flags import HALF_CARRY_SUB
 
 from .abstract import Op
 
@@ -16,12 +18,16 @@ class ANA_Reg(Op):
 		comment_string = f'\t\t; A := {U8.to_string(r)} & A; CY is cleared'
 		super().__init__(code, 'ana', [U8.to_string(r)], [], comment_string)
 		self.r = r
+		self.r_name = U8.to_string(r)
 
 	def step(self, state: State):
-		result = self.subop_and(state.REG_UINT8[U8.A], state.REG_UINT8[self.r])
-		self.subop_setflags_add(result, state)
-		state.FLAGS[F.CY] = False
-		state.REG_UINT8[U8.A] = result
+		A = state.A
+		value = getattr(state, self.r_name)
+		result = A & value
+		state.RESULT = result # result <= 0xFF, so CY is cleared
+		state._AC = ((A | value) & 0x08) != 0 # the 8080 ors bit 3 of the operands into AC
+		state.LAZY = LAZY_LOGIC
+		state.A = result
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -40,11 +46,13 @@ class ANA_Mem(Op):
 		super().__init__(code, 'ana', ['M'], [], comment_string)
 
 	def step(self, state: State):
-		addr = self.subop_addr_from_HL(state)
-		result = self.subop_and(state.REG_UINT8[U8.A], state.MEM[addr])
-		self.subop_setflags_add(result, state)
-		state.FLAGS[F.CY] = False
-		state.REG_UINT8[ U8.A ] = result
+		A = state.A
+		value = state.MEM[ (state.H << 8) | state.L ]
+		result = A & value
+		state.RESULT = result # result <= 0xFF, so CY is cleared
+		state._AC = ((A | value) & 0x08) != 0
+		state.LAZY = LAZY_LOGIC
+		state.A = result
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -62,13 +70,15 @@ class ANI(Op):
 		super().__init__(code, 'ani', ['{0}'], [1], comment_string)
 
 	def step(self, state: State):
-		data_pointer = state.REG_UINT16[U16.PC]
-		result = self.subop_and(state.REG_UINT8[U8.A], state.MEM[ data_pointer ])
-		self.subop_setflags_add(result, state)
-		state.FLAGS[F.CY] = False
-		state.FLAGS[F.AC] = False
-		state.REG_UINT8[ U8.A ] = result
-		state.REG_UINT16[U16.PC] += 0x1
+		A = state.A
+		data_pointer = state.PC
+		value = state.MEM[ data_pointer ]
+		result = A & value
+		state.RESULT = result # result <= 0xFF, so CY is cleared
+		state._AC = ((A | value) & 0x08) != 0
+		state.LAZY = LAZY_LOGIC
+		state.A = result
+		state.PC = (data_pointer + 0x1) & 0xFFFF
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -87,13 +97,16 @@ class XRA_Reg(Op):
 		comment_string = f'\t\t; A := {U8.to_string(r)} ^ A; AC and CY is cleared'
 		super().__init__(code, 'xra', [U8.to_string(r)], [], comment_string)
 		self.r = r
+		self.r_name = U8.to_string(r)
 
 	def step(self, state: State):
-		result = self.subop_xor(state.REG_UINT8[U8.A], state.REG_UINT8[self.r])
-		self.subop_setflags_add(result, state)
-		state.FLAGS[F.CY] = False
-		state.FLAGS[F.AC] = False
-		state.REG_UINT8[U8.A] = result
+		A = state.A
+		value = getattr(state, self.r_name)
+		result = A ^ value
+		state.RESULT = result # result <= 0xFF, so CY is cleared
+		state._AC = False
+		state.LAZY = LAZY_LOGIC
+		state.A = result
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -112,12 +125,13 @@ class XRA_Mem(Op):
 		super().__init__(code, 'xra', ['M'], [], comment_string)
 
 	def step(self, state: State):
-		addr = self.subop_addr_from_HL(state)
-		result = self.subop_xor(state.REG_UINT8[U8.A], state.MEM[addr])
-		self.subop_setflags_add(result, state)
-		state.FLAGS[F.CY] = False
-		state.FLAGS[F.AC] = False
-		state.REG_UINT8[ U8.A ] = result
+		A = state.A
+		value = state.MEM[ (state.H << 8) | state.L ]
+		result = A ^ value
+		state.RESULT = result # result <= 0xFF, so CY is cleared
+		state._AC = False
+		state.LAZY = LAZY_LOGIC
+		state.A = result
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -135,13 +149,15 @@ class XRI(Op):
 		super().__init__(code, 'xri', ['{0}'], [1], comment_string)
 
 	def step(self, state: State):
-		data_pointer = state.REG_UINT16[U16.PC]
-		result = self.subop_xor(state.REG_UINT8[U8.A], state.MEM[ data_pointer ])
-		self.subop_setflags_add(result, state)
-		state.FLAGS[F.CY] = False
-		state.FLAGS[F.AC] = False
-		state.REG_UINT8[ U8.A ] = result
-		state.REG_UINT16[U16.PC] += 0x1
+		A = state.A
+		data_pointer = state.PC
+		value = state.MEM[ data_pointer ]
+		result = A ^ value
+		state.RESULT = result # result <= 0xFF, so CY is cleared
+		state._AC = False
+		state.LAZY = LAZY_LOGIC
+		state.A = result
+		state.PC = (data_pointer + 0x1) & 0xFFFF
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -160,13 +176,16 @@ class ORA_Reg(Op):
 		comment_string = f'\t\t; A := {U8.to_string(r)} | A; AC and CY is cleared'
 		super().__init__(code, 'ora', [U8.to_string(r)], [], comment_string)
 		self.r = r
+		self.r_name = U8.to_string(r)
 
 	def step(self, state: State):
-		result = self.subop_or(state.REG_UINT8[U8.A], state.REG_UINT8[self.r])
-		self.subop_setflags_add(result, state)
-		state.FLAGS[F.CY] = False
-		state.FLAGS[F.AC] = False
-		state.REG_UINT8[U8.A] = result
+		A = state.A
+		value = getattr(state, self.r_name)
+		result = A | value
+		state.RESULT = result # result <= 0xFF, so CY is cleared
+		state._AC = False
+		state.LAZY = LAZY_LOGIC
+		state.A = result
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -185,12 +204,13 @@ class ORA_Mem(Op):
 		super().__init__(code, 'ora', ['M'], [], comment_string)
 
 	def step(self, state: State):
-		addr = self.subop_addr_from_HL(state)
-		result = self.subop_or(state.REG_UINT8[U8.A], state.MEM[addr])
-		self.subop_setflags_add(result, state)
-		state.FLAGS[F.CY] = False
-		state.FLAGS[F.AC] = False
-		state.REG_UINT8[ U8.A ] = result
+		A = state.A
+		value = state.MEM[ (state.H << 8) | state.L ]
+		result = A | value
+		state.RESULT = result # result <= 0xFF, so CY is cleared
+		state._AC = False
+		state.LAZY = LAZY_LOGIC
+		state.A = result
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -208,13 +228,15 @@ class ORI(Op):
 		super().__init__(code, 'ori', ['{0}'], [1], comment_string)
 
 	def step(self, state: State):
-		data_pointer = state.REG_UINT16[U16.PC]
-		result = self.subop_or(state.REG_UINT8[U8.A], state.MEM[ data_pointer ])
-		self.subop_setflags_add(result, state)
-		state.FLAGS[F.CY] = False
-		state.FLAGS[F.AC] = False
-		state.REG_UINT8[ U8.A ] = result
-		state.REG_UINT16[U16.PC] += 0x1
+		A = state.A
+		data_pointer = state.PC
+		value = state.MEM[ data_pointer ]
+		result = A | value
+		state.RESULT = result # result <= 0xFF, so CY is cleared
+		state._AC = False
+		state.LAZY = LAZY_LOGIC
+		state.A = result
+		state.PC = (data_pointer + 0x1) & 0xFFFF
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -235,10 +257,15 @@ class CMP_Reg(Op):
 		comment_string = f'\t\t; {U8.to_string(r)} - A; Z = 1 if A = {U8.to_string(r)}; CY = 1 if A < {U8.to_string(r)}'
 		super().__init__(code, 'cmp', [U8.to_string(r)], [], comment_string)
 		self.r = r
+		self.r_name = U8.to_string(r)
 
 	def step(self, state: State):
-		result = self.subop_sub(state.REG_UINT8[U8.A], state.REG_UINT8[self.r])
-		self.subop_setflags_add(result, state)
+		A = state.A
+		value = getattr(state, self.r_name)
+		result = A - value
+		state.RESULT = result
+		state.AUX = A ^ value ^ HALF_CARRY_SUB
+		state.LAZY = LAZY_ALL
 
 	def test(self, preop_state: State, postop_state: State):		
 		CY_is_set = postop_state.FLAGS[F.CY] == (preop_state.REG_UINT8[U8.A] < preop_state.REG_UINT8[self.r])
@@ -258,9 +285,12 @@ class CMP_Mem(Op):
 		super().__init__(code, 'cmp', ['M'], [], comment_string)
 
 	def step(self, state: State):
-		addr = self.subop_addr_from_HL(state)
-		result = self.subop_sub(state.REG_UINT8[U8.A], state.MEM[addr])
-		self.subop_setflags_add(result, state)
+		A = state.A
+		value = state.MEM[ (state.H << 8) | state.L ]
+		result = A - value
+		state.RESULT = result
+		state.AUX = A ^ value ^ HALF_CARRY_SUB
+		state.LAZY = LAZY_ALL
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -279,10 +309,14 @@ class CPI(Op):
 		super().__init__(code, 'cpi', ['{0}'], [1], comment_string)
 
 	def step(self, state: State):
-		data_pointer = state.REG_UINT16[U16.PC]
-		result = self.subop_sub(state.REG_UINT8[U8.A], state.MEM[ data_pointer ])
-		self.subop_setflags_add(result, state)
-		state.REG_UINT16[U16.PC] += 0x1
+		A = state.A
+		data_pointer = state.PC
+		value = state.MEM[ data_pointer ]
+		result = A - value
+		state.RESULT = result
+		state.AUX = A ^ value ^ HALF_CARRY_SUB
+		state.LAZY = LAZY_ALL
+		state.PC = (data_pointer + 0x1) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		data_pointer = preop_state.REG_UINT16[U16.PC] + 0x1
@@ -302,13 +336,13 @@ class RLC(Op):
 		super().__init__(code, 'rlc', [], [], comment_string)
 
 	def step(self, state: State):
-		value = state.REG_UINT8[U8.A]
+		value = state.A
 		rot_value = (value << 1) & 0xFF
 		new_carry = (value >> 7)
 		new_value = rot_value | new_carry
 
-		state.REG_UINT8[U8.A] = new_value
-		state.FLAGS[F.CY] = new_carry
+		state.A = new_value
+		state.CY = bool(new_carry)
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -330,13 +364,13 @@ class RRC(Op):
 		super().__init__(code, 'rrc', [], [], comment_string)
 
 	def step(self, state: State):
-		value = state.REG_UINT8[U8.A]
+		value = state.A
 
 		new_carry = value & 0x1
 		new_value = (new_carry << 7) | (value >> 1)
 
-		state.REG_UINT8[U8.A] = new_value
-		state.FLAGS[F.CY] = new_carry
+		state.A = new_value
+		state.CY = bool(new_carry)
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -358,15 +392,15 @@ class RAL(Op):
 		super().__init__(code, 'ral', [], [], comment_string)
 
 	def step(self, state: State):
-		value = state.REG_UINT8[U8.A]
-		old_carry = state.FLAGS[F.CY]
+		value = state.A
+		old_carry = int(state.CY)
 
 		rot_value = (value << 1) & 0xFF
 		new_carry = (value >> 7)
 		new_value = rot_value | old_carry
 
-		state.REG_UINT8[U8.A] = new_value
-		state.FLAGS[F.CY] = new_carry
+		state.A = new_value
+		state.CY = bool(new_carry)
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -389,14 +423,14 @@ class RAR(Op):
 		super().__init__(code, 'rar', [], [], comment_string)
 
 	def step(self, state: State):
-		value = state.REG_UINT8[U8.A]
-		old_carry = state.FLAGS[F.CY]
+		value = state.A
+		old_carry = int(state.CY)
 
 		new_carry = value & 0x1
 		new_value = (old_carry << 7) | (value >> 1)
 
-		state.REG_UINT8[U8.A] = new_value
-		state.FLAGS[F.CY] = new_carry
+		state.A = new_value
+		state.CY = bool(new_carry)
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -419,7 +453,7 @@ class CMA(Op):
 		super().__init__(code, 'cma', [], [], comment_string)
 
 	def step(self, state: State):
-		state.REG_UINT8[U8.A] = ~state.REG_UINT8[U8.A] & 0xFF
+		state.A = ~state.A & 0xFF
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -433,7 +467,7 @@ class CMC(Op):
 		super().__init__(code, 'cmc', [], [], comment_string)
 
 	def step(self, state: State):
-		state.FLAGS[F.CY] = not state.FLAGS[F.CY]
+		state.CY = not state.CY
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -447,7 +481,7 @@ class STC(Op):
 		super().__init__(code, 'stc', [], [], comment_string)
 
 	def step(self, state: State):
-		state.FLAGS[F.CY] = True
+		state.CY = True
 
 	def test(self, preop_state: State, postop_state: State):
 		CY_is_True = postop_state.FLAGS[F.CY]
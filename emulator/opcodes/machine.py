@@ -9,8 +9,8 @@ from .abstract import Op
 
 
 class NOP(Op):
-	def __init__(self):
-		super().__init__(0x00, 'nop', [], [], '')
+	def __init__(self, code: bytes = 0x00, name: str = 'nop'):
+		super().__init__(code, name, [], [], '')
 
 	def step(self, state: State): pass
 
@@ -29,13 +29,20 @@ class PUSH_Reg(Op):
 		comment_string = f'\t\t; (SP - 1) = {U8.to_string(rh)}; (SP - 2) = {U8.to_string(rl)}; SP = SP - 2'
 		super().__init__(code, 'push', [f'{U8.to_string(rh)}'], [], comment_string)
 		self.rh = rh
+		self.rh_name = U8.to_string(rh)
 		self.rl = rl
+		self.rl_name = U8.to_string(rl)
 
 	def step(self, state: State):
-		SP = state.REG_UINT16[U16.SP]
-		state.MEM[SP - 0x1] = state.REG_UINT8[self.rh]
-		state.MEM[SP - 0x2] = state.REG_UINT8[self.rl]
-		state.REG_UINT16[U16.SP] -= 0x2
+		SP = state.SP
+		high, low = (SP - 0x1) & 0xFFFF, (SP - 0x2) & 0xFFFF
+		if state.PAGES[high >> 8] and state.PAGES[low >> 8]:
+			state.MEM[high] = getattr(state, self.rh_name)
+			state.MEM[low] = getattr(state, self.rl_name)
+		else:
+			state.MAP.write(state.MEM, high, getattr(state, self.rh_name))
+			state.MAP.write(state.MEM, low, getattr(state, self.rl_name))
+		state.SP = (SP - 0x2) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		SP = preop_state.REG_UINT16[U16.SP]
@@ -55,11 +62,16 @@ class PUSH_PSW(Op):
 		super().__init__(code, 'push', [f'PSW'], [], comment_string)
 
 	def step(self, state: State):
-		SP = state.REG_UINT16[U16.SP]
+		SP = state.SP
 		psw = self.subop_get_processor_status_word(state)
-		state.MEM[SP - 0x1] = state.REG_UINT8[U8.A]
-		state.MEM[SP - 0x2] = psw
-		state.REG_UINT16[U16.SP] -= 0x2
+		high, low = (SP - 0x1) & 0xFFFF, (SP - 0x2) & 0xFFFF
+		if state.PAGES[high >> 8] and state.PAGES[low >> 8]:
+			state.MEM[high] = state.A
+			state.MEM[low] = psw
+		else:
+			state.MAP.write(state.MEM, high, state.A)
+			state.MAP.write(state.MEM, low, psw)
+		state.SP = (SP - 0x2) & 0xFFFF
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -79,13 +91,15 @@ class POP_Reg(Op):
 		comment_string = f'\t\t;  {U8.to_string(rh)} = (SP + 1); {U8.to_string(rl)} = SP; SP = SP + 2'
 		super().__init__(code, 'pop', [f'{U8.to_string(rh)}'], [], comment_string)
 		self.rh = rh
+		self.rh_name = U8.to_string(rh)
 		self.rl = rl
+		self.rl_name = U8.to_string(rl)
 
 	def step(self, state: State):
-		SP = state.REG_UINT16[U16.SP]
-		state.REG_UINT8[self.rh] = state.MEM[SP + 0x1]
-		state.REG_UINT8[self.rl] = state.MEM[SP]
-		state.REG_UINT16[U16.SP] += 0x2
+		SP = state.SP
+		setattr(state, self.rh_name, state.MEM[(SP + 0x1) & 0xFFFF])
+		setattr(state, self.rl_name, state.MEM[SP])
+		state.SP = (SP + 0x2) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		SP = preop_state.REG_UINT16[U16.SP]
@@ -105,13 +119,13 @@ class POP_PSW(Op):
 		super().__init__(code, 'pop', [f'PSW'], [], comment_string)
 
 	def step(self, state: State):
-		SP = state.REG_UINT16[U16.SP]
+		SP = state.SP
 		PSW = state.MEM[ SP ]
-		A = state.MEM[ SP + 0x1 ]
+		A = state.MEM[ (SP + 0x1) & 0xFFFF ]
 
-		state.REG_UINT8[U8.A] = A
+		state.A = A
 		self.subop_set_processor_status_word(PSW, state)
-		state.REG_UINT16[U16.SP] += 0x2
+		state.SP = (SP + 0x2) & 0xFFFF
 
 	def test(self, preop_state: State, postop_state: State):
 		SP = preop_state.REG_UINT16[U16.SP]
@@ -135,14 +149,21 @@ class XTHL(Op):
 		super().__init__(code, 'xthl', [], [], comment_string)
 
 	def step(self, state: State):
-		H = state.REG_UINT8[U8.H]
-		L = state.REG_UINT8[U8.L]
-		SP = state.REG_UINT16[U16.SP]
-
-		state.REG_UINT8[U8.L] = state.MEM[SP]
-		state.REG_UINT8[U8.H] = state.MEM[SP + 0x1]
-		state.MEM[SP] = L
-		state.MEM[SP + 0x1] = H
+		H = state.H
+		L = state.L
+		SP = state.SP
+		SP_plus_1 = (SP + 0x1) & 0xFFFF
+
+		stacked_L = state.MEM[SP]
+		stacked_H = state.MEM[SP_plus_1]
+		if state.PAGES[SP >> 8] and state.PAGES[SP_plus_1 >> 8]:
+			state.MEM[SP] = L
+			state.MEM[SP_plus_1] = H
+		else:
+			state.MAP.write(state.MEM, SP, L)
+			state.MAP.write(state.MEM, SP_plus_1, H)
+		state.L = stacked_L
+		state.H = stacked_H
 
 	def test(self, preop_state: State, postop_state: State):
 		SP = preop_state.REG_UINT16[U16.SP]
@@ -164,8 +185,7 @@ class SPHL(Op):
 		super().__init__(code, 'sphl', [], [], comment_string)
 
 	def step(self, state: State):
-		addr = self.subop_addr_from_HL(state)
-		state.REG_UINT16[U16.SP] = addr
+		state.SP = (state.H << 8) | state.L
 
 
 	def test(self, preop_state: State, postop_state: State):
@@ -182,12 +202,14 @@ class IN_Imm(Op):
 		super().__init__(code, 'in', ['{0}'], [1], comment_string)
 
 	def step(self, state: State):
-		# skip the data byte
-		state.REG_UINT16[U16.PC] += 0x1
+		port = state.MEM[state.PC]
+		state.PC = (state.PC + 0x1) & 0xFFFF
+		state.A = state.IN[port](port)
 
 	def test(self, preop_state: State, postop_state: State):
-		# Note(Nic): input from peripherals is not yet implemented 
-		# on this emulator...
+		# with no port bus installed, every port reads as an open bus.
+		assert postop_state.REG_UINT8[U8.A] == 0xFF, 'A\' =/= 0xFF'
+
 		PC_has_incremented = postop_state.REG_UINT16[U16.PC] == preop_state.REG_UINT16[U16.PC] + 0x2
 
 		assert PC_has_incremented, 'PC\' =/= PC + 2'
@@ -199,12 +221,11 @@ class OUT_Imm(Op):
 		super().__init__(code, 'out', ['{0}'], [1], comment_string)
 
 	def step(self, state: State):
-		# skip the data byte
-		state.REG_UINT16[U16.PC] += 0x1
+		port = state.MEM[state.PC]
+		state.PC = (state.PC + 0x1) & 0xFFFF
+		state.OUT[port](port, state.A)
 
 	def test(self, preop_state: State, postop_state: State):
-		# Note(Nic): input from peripherals is not yet implemented 
-		# on this emulator...
 		PC_has_incremented = postop_state.REG_UINT16[U16.PC] == preop_state.REG_UINT16[U16.PC] + 0x2
 
 		assert PC_has_incremented, 'PC\' =/= PC + 2'
@@ -216,7 +237,7 @@ class DI(Op):
 		super().__init__(code, 'di', [], [], comment_string)
 
 	def step(self, state: State):
-		state.FLAGS[F.DI] = True
+		state.DI = True
 
 	def test(self, preop_state: State, postop_state: State):
 		# Note(Nic): Nothing really to test here, just sets a status flag
@@ -229,7 +250,7 @@ class EI(Op):
 		super().__init__(code, 'ei', [], [], comment_string)
 
 	def step(self, state: State):
-		state.FLAGS[F.DI] = False
+		state.DI = False
 
 	def test(self, preop_state: State, postop_state: State):
 		# Note(Nic): Nothing really to test here, just sets a status flag
@@ -242,10 +263,13 @@ class HLT(Op):
 		super().__init__(code, 'hlt', [], [], comment_string)
 
 	def step(self, state: State):
-		state.FLAGS[F.E] = False
+		# the CPU waits here for an interrupt; the run loop decides
+		# whether one can come.
+		state.HALTED = True
+		state.RUN = False
 
 	def test(self, preop_state: State, postop_state: State):
-		# Note(Nic): Nothing really to test here, just sets a status flag
+		assert postop_state.HALTED
 		assert not postop_state.FLAGS[F.E]
 
 
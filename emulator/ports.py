@@ -0,0 +1,246 @@
+# Port I/O
+# ========
+# IN and OUT address 256 ports, separate from memory. A PortBus maps each
+# port to a read handler, read(port) -> byte, and a write handler,
+# write(port, value). install() puts them on a State as two 256-entry
+# tuples, IN and OUT, so an IN or OUT op is one indexed call whatever
+# is mapped where.
+#
+# Unmapped ports read 0xFF, as a data bus that nothing drives does, and
+# ignore writes. A State with no bus installed has every port unmapped.
+#
+# Devices are plain objects. State.clone() copies the bus, and each
+# device on it with its copy(), so a clone's ports have their own state
+# (InvadersIO's shift register, say) and don't disturb the original's.
+
+from copy import copy
+from types import MethodType
+from collections import deque
+
+
+PORT_COUNT = 0x100
+OPEN_BUS = 0xFF
+
+
+def unmapped_read(port: int):
+	return OPEN_BUS
+
+def unmapped_write(port: int, value: int):
+	pass
+
+
+# State.IN and State.OUT when no bus is installed.
+NO_INPUTS = (unmapped_read,) * PORT_COUNT
+NO_OUTPUTS = (unmapped_write,) * PORT_COUNT
+
+
+class PortBus():
+	def __init__(self):
+		self.reads = list(NO_INPUTS)
+		self.writes = list(NO_OUTPUTS)
+		self.devices = [] # attached devices, in order; see snapshot.py
+
+	def map_in(self, port: int, read):
+		self.reads[port] = read
+
+	def map_out(self, port: int, write):
+		self.writes[port] = write
+
+	def attach(self, device):
+		"""Maps the ports a device's inputs() and outputs() return, port -> handler."""
+		for port, read in device.inputs().items(): self.map_in(port, read)
+		for port, write in device.outputs().items(): self.map_out(port, write)
+		self.devices.append(device)
+		return device
+
+	def install(self, state):
+		state.IN = tuple(self.reads)
+		state.OUT = tuple(self.writes)
+		state.BUS = self
+		return state
+
+	def copy(self):
+		"""Another bus, with a copy() of each device mapped where it is here."""
+		other = PortBus()
+		devices = { id(device): device.copy() for device in self.devices }
+		other.devices = [devices[id(device)] for device in self.devices]
+
+		# handlers that are methods of a device move to its copy.
+		def rebind(handler):
+			owner = getattr(handler, '__self__', None)
+			return MethodType(handler.__func__, devices[id(owner)]) if id(owner) in devices else handler
+
+		other.reads = [rebind(read) for read in self.reads]
+		other.writes = [rebind(write) for write in self.writes]
+
+		# and names for devices, like bus.invaders.
+		for name, value in vars(self).items():
+			if id(value) in devices and name != 'devices': setattr(other, name, devices[id(value)])
+
+		return other
+
+	def __repr__(self):
+		mapped = lambda table, unmapped: [f'{port:#04x}' for port, handler in enumerate(table) if handler is not unmapped]
+		return f'PortBus(in: {", ".join(mapped(self.reads, unmapped_read))}; out: {", ".join(mapped(self.writes, unmapped_write))})'
+
+
+class ScriptedInput():
+	"""
+	Feeds each port a fixed sequence of bytes, one per IN; a port whose
+	script has run out keeps returning its last byte. Writes are recorded
+	per port.
+	"""
+	def __init__(self, script: dict, record: bool = True):
+		self.script = { port: deque(values) for port, values in script.items() }
+		self.last = { port: OPEN_BUS for port in script }
+		self.written = {} # port -> [values]
+		self.record = record
+
+	def read(self, port: int):
+		values = self.script[port]
+		if values: self.last[port] = values.popleft()
+		return self.last[port]
+
+	def write(self, port: int, value: int):
+		self.written.setdefault(port, []).append(value)
+
+	def copy(self):
+		other = copy(self)
+		other.script = { port: deque(values) for port, values in self.script.items() }
+		other.last = dict(self.last)
+		other.written = { port: list(values) for port, values in self.written.items() }
+		return other
+
+	def inputs(self):
+		return { port: self.read for port in self.script }
+
+	def outputs(self):
+		return { port: self.write for port in range(PORT_COUNT) } if self.record else {}
+
+
+# Space Invaders ======
+# Inputs on ports 1 and 2 (port 2 shares its byte with the DIP switches),
+# a 16-bit shift register (write the shift amount to port 2 and data to
+# port 4, read the shifted byte from port 3), sound on ports 3 and 5,
+# and a watchdog on port 6.
+
+BUTTONS = {
+	# name: (port, bit)
+	'coin': (1, 0),
+	'p2_start': (1, 1),
+	'p1_start': (1, 2),
+	'p1_fire': (1, 4),
+	'p1_left': (1, 5),
+	'p1_right': (1, 6),
+	'tilt': (2, 2),
+	'p2_fire': (2, 4),
+	'p2_left': (2, 5),
+	'p2_right': (2, 6),
+}
+
+# sound strobes: (port, bit) -> what it plays, while the bit is set.
+SOUNDS = {
+	(3, 0): 'ufo', # repeats while set
+	(3, 1): 'shot',
+	(3, 2): 'player_death',
+	(3, 3): 'invader_death',
+	(3, 4): 'extra_play',
+	(5, 0): 'fleet_1',
+	(5, 1): 'fleet_2',
+	(5, 2): 'fleet_3',
+	(5, 3): 'fleet_4',
+	(5, 4): 'ufo_hit',
+}
+
+
+class InvadersIO():
+	"""
+	The Space Invaders board's ports. ships (3–6), extra_ship_at (1500 or
+	1000) and coin_info are its DIP switches. on_sound(name) is called
+	whenever a sound bit goes from 0 to 1.
+	"""
+	def __init__(self, ships: int = 3, extra_ship_at: int = 1500, coin_info: bool = True, on_sound=None):
+		if not 3 <= ships <= 6: raise ValueError('the board has 3 to 6 ships')
+		if extra_ship_at not in (1000, 1500): raise ValueError('the extra ship comes at 1000 or 1500')
+
+		self.port1 = 0x08 # bit 3 is always set
+		self.port2 = (ships - 3) | (0x08 if extra_ship_at == 1000 else 0) | (0 if coin_info else 0x80)
+
+		self.shift = 0 # the 16-bit shift register
+		self.offset = 0 # the shift amount, 0-7
+
+		self.sound = { 3: 0, 5: 0 } # last byte written to each sound port
+		self.on_sound = on_sound
+		self.watchdog = 0 # writes seen on port 6
+
+	# inputs ------------------------------
+
+	def press(self, button: str):
+		port, bit = BUTTONS[button]
+		if port == 1: self.port1 |= 1 << bit
+		else: self.port2 |= 1 << bit
+
+	def release(self, button: str):
+		port, bit = BUTTONS[button]
+		if port == 1: self.port1 &= ~(1 << bit) & 0xFF
+		else: self.port2 &= ~(1 << bit) & 0xFF
+
+	def read_port1(self, port: int):
+		return self.port1
+
+	def read_port2(self, port: int):
+		return self.port2
+
+	# shift register ----------------------
+
+	def read_shift(self, port: int):
+		return (self.shift >> (8 - self.offset)) & 0xFF
+
+	def write_offset(self, port: int, value: int):
+		self.offset = value & 0x07
+
+	def write_shift(self, port: int, value: int):
+		self.shift = (value << 8) | (self.shift >> 8)
+
+	# sound and watchdog ------------------
+
+	def write_sound(self, port: int, value: int):
+		started = value & ~self.sound[port]
+		self.sound[port] = value
+
+		if started and self.on_sound:
+			for bit in range(8):
+				if started & (1 << bit) and (port, bit) in SOUNDS: self.on_sound(SOUNDS[port, bit])
+
+	def write_watchdog(self, port: int, value: int):
+		self.watchdog += 1
+
+	def playing(self):
+		"""Names of the sounds whose bits are set."""
+		return [name for (port, bit), name in SOUNDS.items() if self.sound[port] & (1 << bit)]
+
+	def copy(self):
+		other = copy(self)
+		other.sound = dict(self.sound)
+		return other
+
+	def save(self):
+		return { 'port1': self.port1, 'port2': self.port2, 'shift': self.shift, 'offset': self.offset, 'sound': [self.sound[3], self.sound[5]] }
+
+	def load(self, saved: dict):
+		self.port1, self.port2 = saved['port1'], saved['port2']
+		self.shift, self.offset = saved['shift'], saved['offset']
+		self.sound = { 3: saved['sound'][0], 5: saved['sound'][1] }
+
+	def inputs(self):
+		return { 1: self.read_port1, 2: self.read_port2, 3: self.read_shift }
+
+	def outputs(self):
+		return { 2: self.write_offset, 3: self.write_sound, 4: self.write_shift, 5: self.write_sound, 6: self.write_watchdog }
+
+
+def invaders_bus(**switches):
+	"""A PortBus with InvadersIO(**switches) attached; the device is bus.invaders."""
+	bus = PortBus()
+	bus.invaders = bus.attach(InvadersIO(**switches))
+	return bus
@@ -0,0 +1,185 @@
+# ROM Images
+# ==========
+# Loads ROM images without reading them into python objects first. A
+# binary file is mmapped read-only and its segment is a memoryview onto
+# the mapping, so the only copy is the one into a State's memory, and
+# processes that open the same file share its pages through the OS page
+# cache.
+#
+# An image is one or more segments, each placed at its own base: a plain
+# binary, a split set like Space Invaders' invaders.h/g/f/e, or an Intel
+# HEX file. Opened images, and their checksums, are cached per file and
+# reused until the file changes on disk.
+
+import os
+import mmap
+import hashlib
+from functools import cached_property
+
+from .state import State
+
+
+# Space Invaders as it ships on the board: four 2K chips.
+INVADERS_SEGMENTS = (
+	('invaders.h', 0x0000),
+	('invaders.g', 0x0800),
+	('invaders.f', 0x1000),
+	('invaders.e', 0x1800),
+)
+
+HEX_EXTENSIONS = ('.hex', '.ihx')
+
+
+class Segment():
+	"""len(data) bytes placed at base; data is read-only."""
+	def __init__(self, base: int, data, name: str = None):
+		if base < 0 or base + len(data) > State.MEMSIZE:
+			raise ValueError(f'segment {name or ""} of {len(data)} bytes at {base:#06x} does not fit in memory')
+
+		self.base = base
+		self.data = memoryview(data).toreadonly()
+		self.name = name
+
+	@property
+	def end(self):
+		return self.base + len(self.data)
+
+	def __len__(self):
+		return len(self.data)
+
+	def __repr__(self):
+		return f'Segment({self.name or "?"} at {self.base:#06x}–{self.end - 1:#06x})'
+
+
+class RomImage():
+	def __init__(self, segments: list):
+		self.segments = segments
+
+	def load_into(self, MEM):
+		"""Copies every segment into MEM, in order; later segments win where they overlap."""
+		for segment in self.segments:
+			MEM[segment.base:segment.end] = segment.data
+
+	def to_state(self):
+		state = State()
+		self.load_into(state.MEM)
+		return state
+
+	def pages(self, size: int = 0x100):
+		"""Indices of the size-byte pages the image covers."""
+		return sorted({ page for segment in self.segments for page in range(segment.base // size, (segment.end + size - 1) // size) })
+
+	@cached_property
+	def sha256(self):
+		digest = hashlib.sha256()
+		for segment in self.segments:
+			digest.update(segment.base.to_bytes(2, 'little'))
+			digest.update(segment.data)
+
+		return digest.hexdigest()
+
+	def __len__(self):
+		return sum(len(segment) for segment in self.segments)
+
+	def __repr__(self):
+		return f'RomImage({", ".join(map(repr, self.segments))})'
+
+
+# Opening ======
+
+CACHE = {} # (kind, path, base) -> (file identity, RomImage)
+
+
+def identity(path: str):
+	status = os.stat(path)
+	return status.st_size, status.st_mtime_ns, status.st_ino
+
+
+def cached(kind: str, path: str, base: int, open_image):
+	key = (kind, os.path.realpath(path), base)
+	current = identity(path)
+
+	entry = CACHE.get(key)
+	if entry is None or entry[0] != current:
+		entry = CACHE[key] = (current, open_image())
+
+	return entry[1]
+
+
+def map_file(path: str):
+	with open(path, 'rb') as file:
+		# mmap refuses empty files; there's nothing to share in those anyway.
+		if os.fstat(file.fileno()).st_size == 0: return b''
+		return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def open_rom(path: str, base: int = 0):
+	"""A raw binary, mapped at base."""
+	return cached('bin', path, base, lambda: RomImage([Segment(base, map_file(path), path)]))
+
+
+def open_segments(pairs, directory: str = ''):
+	"""An image made of raw binaries: pairs of (path, base)."""
+	return RomImage([
+		segment
+		for path, base in pairs
+		for segment in open_rom(os.path.join(directory, path), base).segments
+	])
+
+
+def open_intel_hex(path: str):
+	return cached('hex', path, 0, lambda: parse_intel_hex(path))
+
+
+def open_image(path: str, base: int = 0):
+	"""Intel HEX by extension, a split image for a directory of them, or a raw binary."""
+	if os.path.isdir(path):
+		return open_segments(INVADERS_SEGMENTS, path)
+	if path.lower().endswith(HEX_EXTENSIONS):
+		return open_intel_hex(path)
+
+	return open_rom(path, base)
+
+
+# Intel HEX ======
+# :LLAAAATT<data>CC — length, address, record type, data, checksum. Only
+# data (00), end of file (01) and the two address extensions (02, 04)
+# are meaningful here; start address records (03, 05) are skipped.
+
+def parse_intel_hex(path: str):
+	segments = []
+	data = bytearray()
+	start = None
+	upper = 0
+
+	def flush():
+		if data: segments.append(Segment(start, bytes(data), path))
+
+	with open(path) as file:
+		for number, line in enumerate(file, 1):
+			line = line.strip()
+			if not line: continue
+			if not line.startswith(':'): raise ValueError(f'{path}:{number}: not an Intel HEX record')
+
+			record = bytes.fromhex(line[1:])
+			if len(record) < 5 or len(record) != 5 + record[0]: raise ValueError(f'{path}:{number}: bad record length')
+			if sum(record) & 0xFF: raise ValueError(f'{path}:{number}: bad checksum')
+
+			kind, payload = record[3], record[4:-1]
+			address = upper + ((record[1] << 8) | record[2])
+
+			if kind == 0x00:
+				if start is None or address != start + len(data):
+					flush()
+					data = bytearray()
+					start = address
+				data += payload
+			elif kind == 0x01:
+				break
+			elif kind == 0x02:
+				upper = int.from_bytes(payload, 'big') << 4
+			elif kind == 0x04:
+				upper = int.from_bytes(payload, 'big') << 16
+
+	flush()
+	return RomImage(segments)
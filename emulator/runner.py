@@ -0,0 +1,275 @@
+# Headless Runner
+# ===============
+# Runs a program at full speed, with no display and no input, until it
+# halts, hits a breakpoint or a watchpoint, writes to trapped ROM, or
+# uses up its step or cycle budget.
+# Meant for unattended ROM regressions.
+#
+# A state with a scheduler installed (emulator/scheduler.py) has its
+# events serviced between chunks; chunks end at the next deadline. A
+# halted CPU with interrupts enabled waits for one: the cycle count jumps
+# straight to each deadline in turn, so time spent halted costs nothing.
+#
+# Idle loops get the same treatment. At the end of a chunk, the next few
+# instructions are run one at a time to see whether they are a short
+# loop that writes nothing, does no I/O, and comes back round with every
+# register and flag as it was. Such a loop can't change anything until an
+# event does, so the run credits the steps and cycles of as many whole
+# turns as fit before the deadline, and carries on from there. Idle loops
+# are only looked for when there's a deadline to skip to, and not while
+# breakpoints or watchpoints are set.
+
+from time import perf_counter
+from dataclasses import dataclass
+
+from .state import State, initialize_state_from_rom
+from .step import OPS, DISPATCH_TABLE, EI_CODE
+from .opcodes import MOV_Mem_Reg, MVI_Mem_Imm, STA, SHLD, STAX_Reg, INR_Mem, DCR_Mem
+from .opcodes import PUSH_Reg, PUSH_PSW, XTHL, CCOND_Imm, RST, IN_Imm, OUT_Imm, EI, DI, HLT
+from .cycles import CYCLES, CLOCK_HZ, MAX_OP_CYCLES
+from .memory import WriteProtectionError
+from .watch import Watchpoints, WatchHit
+from .breakpoints import Breakpoints, Breakpoint
+
+
+CHUNK = 4096 # instructions between budget checks
+
+IDLE_LENGTH = 16 # the longest loop, in instructions, that counts as idle
+IDLE_CHUNK = 128 # instructions between looks for an idle loop
+
+# ops that write memory, touch a device, or change how interrupts are
+# taken; a loop with any of these in it isn't idle.
+NOT_IDLE = (
+	MOV_Mem_Reg, MVI_Mem_Imm, STA, SHLD, STAX_Reg, INR_Mem, DCR_Mem,
+	PUSH_Reg, PUSH_PSW, XTHL, CCOND_Imm, RST,
+	IN_Imm, OUT_Imm, EI, DI, HLT,
+)
+IDLE_SAFE = bytes(not isinstance(op, NOT_IDLE) for op in OPS)
+
+
+class StopReason():
+	HALTED = 'halted'
+	BREAKPOINT = 'breakpoint'
+	WATCHPOINT = 'watchpoint'
+	BUDGET = 'budget'
+	WRITE_PROTECTED = 'write-protected'
+
+
+@dataclass
+class RunResult():
+	reason : str # one of the StopReason values
+	pc : int # address of the next instruction, or of the failing one
+	steps : int # instructions retired
+	cycles : int # clock states used by the retired instructions
+	elapsed : float # wall-clock seconds
+	opcode : int = None # set when reason is StopReason.WRITE_PROTECTED
+	address : int = None # the address written, for StopReason.WRITE_PROTECTED
+	watchpoint : WatchHit = None # set when reason is StopReason.WATCHPOINT
+	breakpoint : Breakpoint = None # set when reason is StopReason.BREAKPOINT, unless it was an until_pc address
+	idle_cycles : int = 0 # of cycles, those skipped while halted or in an idle loop
+	state : State = None
+
+	@property
+	def instructions_per_second(self):
+		return self.steps / self.elapsed if self.elapsed > 0 else 0.0
+
+	@property
+	def effective_mhz(self):
+		return self.cycles / self.elapsed / 1e6 if self.elapsed > 0 else 0.0
+
+	def __str__(self):
+		reason = self.reason
+		if self.opcode is not None: reason += f' (opcode {self.opcode:#04x})'
+		if self.address is not None: reason += f' writing {self.address:#06x}'
+		if self.watchpoint is not None: reason += f' ({self.watchpoint})'
+		if self.breakpoint is not None: reason += f' ({self.breakpoint})'
+
+		return (
+			f'stopped: {reason} at {self.pc:#06x}\n'
+			f'retired: {self.steps} instructions, {self.cycles} cycles'
+			f'{f" ({self.idle_cycles} idle, skipped)" if self.idle_cycles else ""}\n'
+			f'elapsed: {self.elapsed:.3f}s\n'
+			f'speed:   {self.instructions_per_second:,.0f} instr/s, '
+			f'{self.effective_mhz:.2f} MHz ({self.effective_mhz * 1e6 / CLOCK_HZ:.2f}x real time)'
+		)
+
+
+def run(rom: bytes, max_steps: int = None, max_cycles: int = None, until_pc=None, base_pointer: int = 0):
+	"""
+	Loads rom at base_pointer and runs it from address 0. until_pc is an
+	address or a collection of addresses; the run stops when PC reaches one.
+	"""
+	state = initialize_state_from_rom(rom, base_pointer)
+	return run_state(state, max_steps, max_cycles, until_pc)
+
+
+def registers(state: State):
+	return (state.A, state.B, state.C, state.D, state.E, state.H, state.L, state.SP, state.Z, state.S, state.P, state.CY, state.AC)
+
+
+def run_state(state: State, max_steps: int = None, max_cycles: int = None, until_pc=None, watchpoints: Watchpoints = None, breakpoints: Breakpoints = None, skip_idle: bool = True):
+	"""
+	Runs state in place; see run(). watchpoints, if given, must be on
+	state. breakpoints adds conditional breakpoints to the until_pc ones.
+	skip_idle=False runs idle loops out instead of skipping them.
+	"""
+	if until_pc is None: until = frozenset()
+	elif isinstance(until_pc, int): until = frozenset((until_pc,))
+	else: until = frozenset(until_pc)
+
+	# the inner loop only stops at these; conditions are tested after.
+	stops = until | breakpoints.pcs if breakpoints else until
+	anywhere = bool(breakpoints and breakpoints.anywhere)
+	skip_idle = skip_idle and state.EVENTS is not None and not (stops or anywhere or watchpoints)
+
+	step_limit = float('inf') if max_steps is None else max_steps
+	cycle_limit = float('inf') if max_cycles is None else max_cycles
+
+	MEM = state.MEM
+	events = state.EVENTS
+	dispatch = watchpoints.dispatch if watchpoints else DISPATCH_TABLE
+	cycles = CYCLES
+
+	steps = 0
+	start_cycles = state.CYCLES
+	reason = StopReason.HALTED
+	opcode = None
+	address = None
+	hit = None
+	stopped_at = None
+	idle_cycles = 0
+	busy = set() # PCs found not idle since the last event
+
+	if watchpoints: watchpoints.hits = []
+	state.RUN = True
+	start = perf_counter()
+
+	try:
+		while state.RUN:
+			if state.HALTED:
+				limit = start_cycles + cycle_limit
+				while state.HALTED and events is not None and not state.DI and events.deadline <= limit:
+					if events.deadline > state.CYCLES:
+						idle_cycles += events.deadline - state.CYCLES
+						state.CYCLES = events.deadline
+					events.run_due(state)
+
+				if state.HALTED:
+					# nothing left that could wake it, or not within the budget.
+					if events is not None and not state.DI and events.deadline < float('inf'):
+						if limit > state.CYCLES:
+							idle_cycles += limit - state.CYCLES
+							state.CYCLES = limit
+						reason = StopReason.BUDGET
+					break
+
+			# run in chunks that can't overshoot either budget, so the inner
+			# loop only has to watch for halts and breakpoints.
+			remaining_cycles = cycle_limit - (state.CYCLES - start_cycles)
+			chunk = min(step_limit - steps, (remaining_cycles + MAX_OP_CYCLES - 1) // MAX_OP_CYCLES, 1 if anywhere else IDLE_CHUNK if skip_idle else CHUNK)
+			if chunk <= 0:
+				reason = StopReason.BUDGET
+				break
+
+			# and end at the next event.
+			if events is not None: chunk = max(1, min(chunk, (events.deadline - state.CYCLES + MAX_OP_CYCLES - 1) // MAX_OP_CYCLES))
+
+			used = 0
+			for count in range(1, chunk + 1):
+				PC = state.PC
+				opcode = MEM[PC]
+				state.PC = (PC + 0x01) & 0xFFFF
+				dispatch[opcode](state)
+				used += cycles[opcode]
+
+				if not state.RUN or state.PC in stops: break
+
+			steps += count
+			state.CYCLES += used
+
+			if events is not None and state.RUN and state.CYCLES >= events.deadline and opcode != EI_CODE:
+				events.run_due(state)
+				busy.clear()
+
+			if watchpoints and watchpoints.hits:
+				hit = watchpoints.take_hit(PC)
+				reason = StopReason.WATCHPOINT
+				break
+
+			if state.RUN and (state.PC in stops or anywhere):
+				if state.PC in until:
+					reason = StopReason.BREAKPOINT
+					break
+
+				stopped_at = breakpoints.check(state)
+				if stopped_at:
+					reason = StopReason.BREAKPOINT
+					break
+
+			# halted: wait for an interrupt at the top of the loop.
+			if state.HALTED and not state.RUN: state.RUN = True
+
+			# look for an idle loop starting here, if there's time to skip.
+			remaining_cycles = cycle_limit - (state.CYCLES - start_cycles)
+			if (
+				skip_idle and state.RUN and not state.HALTED and state.PC not in busy
+				and events.deadline - state.CYCLES > 2 * IDLE_LENGTH * MAX_OP_CYCLES
+				and step_limit - steps >= IDLE_LENGTH and remaining_cycles >= IDLE_LENGTH * MAX_OP_CYCLES
+			):
+				start_pc = state.PC
+				before = registers(state)
+				probe_cycles = state.CYCLES
+				ran = 0
+				used = 0
+				for count in range(1, IDLE_LENGTH + 1):
+					PC = state.PC
+					opcode = MEM[PC]
+					if not IDLE_SAFE[opcode]: break
+					state.PC = (PC + 0x01) & 0xFFFF
+					dispatch[opcode](state)
+					used += cycles[opcode]
+					ran = count
+
+					if state.PC == start_pc: break
+
+				steps += ran
+				state.CYCLES += used
+
+				if ran and state.PC == start_pc and registers(state) == before:
+					# every turn is the same turn; skip the ones before the deadline.
+					period = state.CYCLES - probe_cycles
+					turns = min(
+						(min(events.deadline, start_cycles + cycle_limit) - state.CYCLES) // period,
+						(step_limit - steps) // ran,
+					)
+					if turns > 0:
+						steps += turns * ran
+						state.CYCLES += turns * period
+						idle_cycles += turns * period
+				else:
+					busy.add(start_pc)
+
+	except WriteProtectionError as error:
+		# leave the state pointing at the store the memory map refused.
+		steps += count - 1
+		state.CYCLES += used
+		state.PC = PC
+		reason = StopReason.WRITE_PROTECTED
+		address = error.addr
+
+	elapsed = perf_counter() - start
+	state.RUN = False
+
+	return RunResult(
+		reason=reason,
+		pc=state.PC,
+		steps=steps,
+		cycles=state.CYCLES - start_cycles,
+		elapsed=elapsed,
+		opcode=opcode if reason == StopReason.WRITE_PROTECTED else None,
+		address=address,
+		watchpoint=hit,
+		breakpoint=stopped_at,
+		idle_cycles=idle_cycles,
+		state=state,
+	)
@@ -0,0 +1,201 @@
+# Event Scheduler
+# ===============
+# Devices that act on time, rather than when the program touches them,
+# post events keyed by the cycle count they're due at: video interrupts,
+# timers, sound. Events sit in a heap, so the run loop only needs the
+# earliest deadline. It sizes its chunks so they end at that deadline,
+# and services the scheduler there and nowhere else. Nothing is checked
+# per instruction, and a state with no scheduler runs as it always did.
+# step(), run() and run_cycles() in emulator/step.py do the same, and
+# the block compiler drops to one instruction per block near a deadline.
+#
+# Events fire at the first instruction boundary at or after their cycle,
+# at most one instruction late. An event posted during a chunk (from an
+# OUT handler, say) is seen when that chunk ends.
+#
+# Interrupts are acknowledged the way the 8080 does: the interrupting
+# device puts an RST on the data bus, which pushes PC and jumps, and
+# interrupts are disabled until the handler enables them again. A request
+# made while interrupts are disabled is dropped.
+#
+# State.clone() copies the scheduler: the clone gets its own heap, with
+# the same events pending, and its own copy of each device on it, so
+# the two states keep their own time.
+
+from copy import copy
+from types import MethodType
+from heapq import heappush, heappop
+
+from .step import OPS
+from .cycles import CYCLES, CLOCK_HZ
+
+
+class Scheduler():
+	def __init__(self):
+		self.heap = [] # [cycle, sequence, callback]
+		self.sequence = 0 # ties fire in the order they were posted
+		self.deadline = float('inf') # the cycle the next event is due at
+		self.state = None
+		self.devices = [] # devices that post events here; see snapshot.py
+
+	def install(self, state):
+		state.EVENTS = self
+		self.state = state
+		return state
+
+	def at(self, cycle: int, callback):
+		"""
+		Calls callback(state, cycle) once state.CYCLES reaches cycle.
+		Returns a handle for cancel().
+		"""
+		self.sequence += 1
+		event = [cycle, self.sequence, callback]
+		heappush(self.heap, event)
+		self.deadline = self.heap[0][0]
+		return event
+
+	def after(self, delay: int, callback):
+		"""at(), delay cycles from now."""
+		return self.at(self.state.CYCLES + delay, callback)
+
+	def every(self, period: int, callback, start: int = None):
+		"""Calls callback(state, cycle) every period cycles, first at start (default: one period from now)."""
+		# posted on state's scheduler, not self, so a clone's copy repeats on the clone.
+		def repeat(state, cycle):
+			state.EVENTS.at(cycle + period, repeat)
+			callback(state, cycle)
+
+		return self.at(self.state.CYCLES + period if start is None else start, repeat)
+
+	def cancel(self, event):
+		event[2] = None # dropped when it comes due, or now if it's next
+		heap = self.heap
+		while heap and heap[0][2] is None: heappop(heap)
+		self.deadline = heap[0][0] if heap else float('inf')
+
+	def clear(self):
+		self.heap = []
+		self.deadline = float('inf')
+
+	def run_due(self, state):
+		"""Fires every event due by state.CYCLES, in order."""
+		heap = self.heap
+		while heap and heap[0][0] <= state.CYCLES:
+			cycle, _, callback = heappop(heap)
+			if callback is not None: callback(state, cycle)
+
+		self.deadline = heap[0][0] if heap else float('inf')
+
+	def copy(self, state):
+		"""
+		A scheduler for state, a clone of this one's, with the same events
+		pending. Each device is copied with its copy(events, copied), where
+		copied(event) is the copy of one of this scheduler's events, and
+		callbacks that are methods of a device are rebound to its copy.
+		Other callbacks are shared.
+		"""
+		other = Scheduler()
+		other.sequence = self.sequence
+		other.deadline = self.deadline
+		other.install(state)
+
+		events = { id(event): list(event) for event in self.heap } # in heap order, so still a heap
+		copied = lambda event: events[id(event)]
+		devices = { id(device): device.copy(other, copied) for device in self.devices }
+		other.devices = [devices[id(device)] for device in self.devices]
+
+		for event in events.values():
+			owner = getattr(event[2], '__self__', None)
+			if id(owner) in devices: event[2] = MethodType(event[2].__func__, devices[id(owner)])
+		other.heap = list(events.values())
+
+		# and names for devices, like events.video.
+		for name, value in vars(self).items():
+			if id(value) in devices and name != 'devices': setattr(other, name, devices[id(value)])
+
+		return other
+
+	def __len__(self):
+		return sum(1 for event in self.heap if event[2] is not None)
+
+
+def interrupt(state, vector: int):
+	"""
+	Acknowledges an interrupt with RST vector (0-7), if interrupts are
+	enabled: pushes PC and jumps to vector * 8, as the RST op does, and
+	disables interrupts. Wakes a halted CPU. Returns whether it was taken.
+	"""
+	if state.DI: return False
+
+	code = 0xC7 | (vector << 3)
+	state.DI = True
+	state.HALTED = False
+	OPS[code].step(state)
+	state.CYCLES += CYCLES[code]
+	return True
+
+
+# Space Invaders ======
+# The video hardware interrupts twice a frame, at 60 frames a second:
+# RST 1 when the beam reaches the middle of the screen, and RST 2 at
+# vblank. The game draws the half of the screen the beam isn't on.
+
+FRAME_CYCLES = CLOCK_HZ // 60
+MID_SCREEN = 1
+VBLANK = 2
+
+
+class InvadersVideo():
+	"""
+	Frames start at cycle 0 and every FRAME_CYCLES after, so the
+	interrupts keep their phase across a save and load.
+	"""
+	def __init__(self, events: Scheduler):
+		self.events = events
+		self.frames = 0
+		self.missed = 0 # interrupts that came while interrupts were disabled
+		self.pending = [] # the next mid-screen and vblank events
+		self.schedule()
+
+	def schedule(self):
+		"""Posts the next interrupt of each kind after the current cycle."""
+		for event in self.pending: self.events.cancel(event)
+
+		cycles = self.events.state.CYCLES
+		frame = cycles - cycles % FRAME_CYCLES
+		mid = frame + FRAME_CYCLES // 2
+		if mid <= cycles: mid += FRAME_CYCLES
+
+		self.pending = [self.events.at(mid, self.mid_screen), self.events.at(frame + FRAME_CYCLES, self.vblank)]
+
+	def mid_screen(self, state, cycle):
+		self.pending[0] = self.events.at(cycle + FRAME_CYCLES, self.mid_screen)
+		if not interrupt(state, MID_SCREEN): self.missed += 1
+
+	def vblank(self, state, cycle):
+		self.pending[1] = self.events.at(cycle + FRAME_CYCLES, self.vblank)
+		self.frames += 1
+		if not interrupt(state, VBLANK): self.missed += 1
+
+	def copy(self, events: Scheduler, copied):
+		other = copy(self)
+		other.events = events
+		other.pending = [copied(event) for event in self.pending]
+		return other
+
+	def save(self):
+		return { 'frames': self.frames, 'missed': self.missed }
+
+	def load(self, saved: dict):
+		self.frames = saved['frames']
+		self.missed = saved['missed']
+		self.schedule()
+
+
+def invaders_events(state):
+	"""Installs a Scheduler on state with the Space Invaders interrupts on it; the video is events.video."""
+	events = Scheduler()
+	events.install(state)
+	events.video = InvadersVideo(events)
+	events.devices.append(events.video)
+	return events
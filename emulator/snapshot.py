@@ -0,0 +1,183 @@
+# Save States
+# ===========
+# A State on disk: a fixed 64-byte header, then the 64K memory image,
+# then the state of any devices, as JSON.
+#
+#     0  magic 'I8080SAV'      24  flags (Z S P CY AC DI HALTED bits)
+#     8  version               26  cycles
+#    10  compression           34  length of the memory image on disk
+#    12  A B C D E H L         38  length of the device state
+#    20  SP, PC                42  reserved
+#
+# Memory sits at a fixed offset, so an uncompressed file needs no
+# parsing: load_state reads it straight into the state's bytearray with
+# readinto, and open_snapshot maps it read-only, for looking at without
+# loading. Archives can be compressed with zlib or lzma instead.
+#
+# Device state is whatever the devices on the state's port bus and
+# scheduler return from save(); loading hands it back to the devices
+# of the state being loaded into, which must be set up the same way.
+# Memory maps and the devices themselves aren't saved; they're part of
+# how a machine is built, not of where it is.
+
+import os
+import json
+import mmap
+import zlib
+import lzma
+import struct
+
+from .state import State
+from .memory import as_buffer
+
+
+MAGIC = b'I8080SAV'
+VERSION = 1
+
+NONE = 'none'
+ZLIB = 'zlib'
+LZMA = 'lzma'
+COMPRESSIONS = (NONE, ZLIB, LZMA) # by their number in the header
+
+HEADER = struct.Struct('<8sHBx7BxHHHQII22x')
+FLAG_BITS = ('Z', 'S', 'P', 'CY', 'AC', 'DI', 'HALTED')
+
+
+class SnapshotError(ValueError):
+	pass
+
+
+def devices_of(state: State):
+	"""The devices whose state is saved: the port bus's, then the scheduler's."""
+	devices = []
+	if state.BUS is not None: devices += state.BUS.devices
+	if state.EVENTS is not None: devices += state.EVENTS.devices
+	return [device for device in devices if hasattr(device, 'save')]
+
+
+def save_state(state: State, path: str, compression: str = NONE):
+	if compression not in COMPRESSIONS: raise ValueError(f'compression must be one of {", ".join(COMPRESSIONS)}')
+
+	memory = as_buffer(state.MEM)
+	if compression == ZLIB: memory = zlib.compress(memory, 6)
+	elif compression == LZMA: memory = lzma.compress(memory)
+
+	devices = json.dumps([{ 'type': type(device).__name__, 'state': device.save() } for device in devices_of(state)]).encode()
+	flags = sum(1 << bit for bit, name in enumerate(FLAG_BITS) if getattr(state, name))
+
+	header = HEADER.pack(
+		MAGIC, VERSION, COMPRESSIONS.index(compression),
+		state.A, state.B, state.C, state.D, state.E, state.H, state.L,
+		state.SP, state.PC, flags, state.CYCLES,
+		len(memory), len(devices),
+	)
+
+	with open(path, 'wb') as file:
+		file.write(header)
+		file.write(memory)
+		file.write(devices)
+
+
+def read_header(file, path: str):
+	data = file.read(HEADER.size)
+	if len(data) < HEADER.size: raise SnapshotError(f'{path}: too short for a save state')
+
+	fields = HEADER.unpack(data)
+	if fields[0] != MAGIC: raise SnapshotError(f'{path}: not a save state')
+	if fields[1] != VERSION: raise SnapshotError(f'{path}: save state version {fields[1]}; this reads version {VERSION}')
+	if fields[2] >= len(COMPRESSIONS): raise SnapshotError(f'{path}: unknown compression {fields[2]}')
+
+	return fields
+
+
+def restore_registers(state: State, fields):
+	_, _, _, A, B, C, D, E, H, L, SP, PC, flags, cycles, _, _ = fields
+	state.A, state.B, state.C, state.D, state.E, state.H, state.L = A, B, C, D, E, H, L
+	state.SP, state.PC = SP, PC
+	state.CYCLES = cycles
+
+	state.LAZY = 0
+	state._Z, state._S, state._P, state._CY, state._AC, state.DI, state.HALTED = (
+		(flags >> bit) & 1 == 1 for bit in range(len(FLAG_BITS))
+	)
+	state.RUN = False
+
+
+def restore_devices(state: State, data: bytes, path: str):
+	saved = json.loads(data) if data else []
+	devices = devices_of(state)
+	if not devices: return # a bare state; nothing to restore into
+
+	if [entry['type'] for entry in saved] != [type(device).__name__ for device in devices]:
+		raise SnapshotError(f'{path}: saved devices {[entry["type"] for entry in saved]} do not match the state\'s')
+
+	for device, entry in zip(devices, saved):
+		device.load(entry['state'])
+
+
+def load_state(path: str, state: State = None):
+	"""
+	Loads a save state into state, which keeps its memory map and devices,
+	or into a new State. Returns the state.
+	"""
+	state = state if state is not None else State()
+	if type(state.MEM) is not bytearray and state.MEM.homes is None: state.MEM = bytearray(State.MEMSIZE) # to readinto
+	memory = state.MEM if type(state.MEM) is bytearray else bytearray(State.MEMSIZE) # mirrors keep their pages
+
+	with open(path, 'rb') as file:
+		fields = read_header(file, path)
+		compression, memory_length, devices_length = COMPRESSIONS[fields[2]], fields[14], fields[15]
+
+		if compression == NONE:
+			if memory_length != State.MEMSIZE or file.readinto(memory) != State.MEMSIZE:
+				raise SnapshotError(f'{path}: truncated memory image')
+		else:
+			data = file.read(memory_length)
+			memory = zlib.decompress(data) if compression == ZLIB else lzma.decompress(data)
+			if len(memory) != State.MEMSIZE: raise SnapshotError(f'{path}: memory image is {len(memory)} bytes')
+
+		if memory is not state.MEM: state.MEM[:] = memory
+
+		restore_registers(state, fields)
+		restore_devices(state, file.read(devices_length), path)
+
+	return state
+
+
+class Snapshot():
+	"""
+	An uncompressed save state mapped read-only: the header's fields, and
+	memory as a memoryview onto the file.
+	"""
+	def __init__(self, path: str):
+		with open(path, 'rb') as file:
+			self.fields = read_header(file, path)
+			if COMPRESSIONS[self.fields[2]] != NONE: raise SnapshotError(f'{path}: compressed save states can\'t be mapped; use load_state')
+			if os.fstat(file.fileno()).st_size < HEADER.size + State.MEMSIZE: raise SnapshotError(f'{path}: truncated memory image')
+
+			self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+		self.path = path
+		self.memory = memoryview(self.map)[HEADER.size:HEADER.size + State.MEMSIZE]
+
+	@property
+	def pc(self):
+		return self.fields[11]
+
+	@property
+	def cycles(self):
+		return self.fields[13]
+
+	def to_state(self, state: State = None):
+		"""The same as load_state, from the mapping."""
+		state = state if state is not None else State()
+		state.MEM[:] = self.memory
+		restore_registers(state, self.fields)
+
+		start = HEADER.size + State.MEMSIZE
+		restore_devices(state, self.map[start:start + self.fields[15]], self.path)
+		return state
+
+
+def open_snapshot(path: str):
+	return Snapshot(path)
@@ -1,6 +1,9 @@
-import numpy as np
 from dataclasses import dataclass
 
+from .flags import ZSP, PARITY, PSW_Z, PSW_S, PSW_P
+from .memory import ALL_RAM, PagedMemory
+from .ports import NO_INPUTS, NO_OUTPUTS
+
 @dataclass
 class Uint8Registers():
 	A : int = 0
@@ -53,15 +56,72 @@ class FlagsRegisters():
 
 
 
-@dataclass
+# slot names backing each register group, in index order.
+U8_NAMES = ('A', 'B', 'C', 'D', 'E', 'H', 'L')
+U16_NAMES = ('SP', 'PC')
+FLAG_NAMES = ('Z', 'S', 'P', 'CY', 'AC', 'RUN', 'DI')
+
+# pending-flag bits in State.LAZY.
+LAZY_ZSP = 0x1 # Z, S and P are worked out from RESULT
+LAZY_CY = 0x2 # CY is worked out from RESULT
+LAZY_AC = 0x4 # AC is worked out from RESULT and AUX
+LAZY_ALL = LAZY_ZSP | LAZY_CY | LAZY_AC
+LAZY_LOGIC = LAZY_ZSP | LAZY_CY # logical ops set AC themselves
+LAZY_INCREMENT = LAZY_ZSP | LAZY_AC # inr and dcr leave CY alone
+
+
+class RegisterView():
+	"""
+	Index-addressable window onto a group of State slots. The ops work on
+	the slots directly; this exists so the editor panels and the op tests
+	can keep addressing registers as REG_UINT8[U8.A], FLAGS[F.CY], etc.
+	"""
+	__slots__ = ('state', 'names', 'cast')
+
+	def __init__(self, state, names: tuple, cast):
+		self.state = state
+		self.names = names
+		self.cast = cast
+
+	def __getitem__(self, reg: int):
+		return getattr(self.state, self.names[reg])
+
+	def __setitem__(self, reg: int, value):
+		setattr(self.state, self.names[reg], self.cast(value))
+
+	def __len__(self):
+		return len(self.names)
+
+	def __iter__(self):
+		return (getattr(self.state, name) for name in self.names)
+
+	def __eq__(self, other):
+		return list(self) == list(other)
+
+	def __repr__(self):
+		return f'{list(self)}'
+
+
+def cast_u8(value): return int(value) & 0xFF
+def cast_u16(value): return int(value) & 0xFFFF
+
+
 class State:
 	MEMSIZE = 2 ** 16 # 65536 = 64k bytes
 
 	# register file ---------------------
+	# plain python ints; no numpy scalars on the hot path.
 
-	REG_UINT8 : np.array = np.zeros(Uint8Registers.MAX_REG).astype(np.uint8)
-	REG_UINT16 : np.array = np.zeros(Uint16Registers.MAX_REG).astype(np.uint16)
-	FLAGS : np.array = np.zeros(FlagsRegisters.MAX_REG).astype(bool)
+	__slots__ = U8_NAMES + U16_NAMES \
+		+ ('_Z', '_S', '_P', '_CY', '_AC', 'RUN', 'DI', 'HALTED') \
+		+ ('RESULT', 'AUX', 'LAZY', 'CYCLES', 'MEM', 'PAGES', 'MAP', 'IN', 'OUT', 'BUS', 'EVENTS')
+
+	# lazy flags ------------------------
+	# ALU ops don't work out Z, S, P, CY and AC. They store their result
+	# in RESULT (and the half-carry record in AUX, see emulator/flags.py)
+	# and mark those flags pending in LAZY; reading a pending flag works it
+	# out from them. Most flags are overwritten before anything reads
+	# them, so most are never worked out at all.
 
 
 	# memory layout ---------------------
@@ -70,67 +130,219 @@ class State:
 	# 0x2000 – 0x23FF: STACK 
 	# 0x2400 – 0x3FFF: HEAP
 	# -----------------------------------
-
-	MEM : np.array = np.zeros(MEMSIZE).astype(np.uint8) # 8KB mem
+	# flat RAM unless a MemoryMap is installed; see emulator/memory.py.
+	# Ops that store check PAGES[addr >> 8] and hand anything but plain
+	# RAM to MAP.write. A map with mirrors makes MEM a PagedMemory whose
+	# mirror pages are the pages they mirror. Once a state has been
+	# cloned, MEM is a PagedMemory shared copy-on-write with the clone;
+	# flatten() makes it a bytearray again, if it has no mirrors.
+
+	# ports -----------------------------
+	# IN and OUT are 256-entry tables of handlers, installed by a PortBus
+	# (BUS); see emulator/ports.py.
+
+	# events ----------------------------
+	# EVENTS is the Scheduler that devices post timed events to, such as
+	# interrupts, or None; see emulator/scheduler.py.
+
+	def __init__(self):
+		self.A = self.B = self.C = self.D = self.E = self.H = self.L = 0
+		self.SP = self.PC = 0
+		self._Z = self._S = self._P = self._CY = self._AC = self.RUN = self.DI = False
+		self.HALTED = False # after hlt, until an interrupt
+		self.RESULT = 0
+		self.AUX = 0
+		self.LAZY = 0
+
+		# clock states elapsed since reset. Not part of the machine's
+		# visible state, so __eq__ ignores it.
+		self.CYCLES = 0
+
+		self.MEM = bytearray(State.MEMSIZE)
+		self.PAGES = ALL_RAM
+		self.MAP = None
+
+		self.IN = NO_INPUTS
+		self.OUT = NO_OUTPUTS
+		self.BUS = None
+		self.EVENTS = None
+
+
+	@property
+	def REG_UINT8(self):
+		return RegisterView(self, U8_NAMES, cast_u8)
+
+	@REG_UINT8.setter
+	def REG_UINT8(self, values):
+		for name, value in zip(U8_NAMES, values): setattr(self, name, cast_u8(value))
+
+	@property
+	def REG_UINT16(self):
+		return RegisterView(self, U16_NAMES, cast_u16)
+
+	@REG_UINT16.setter
+	def REG_UINT16(self, values):
+		for name, value in zip(U16_NAMES, values): setattr(self, name, cast_u16(value))
+
+	@property
+	def FLAGS(self):
+		return RegisterView(self, FLAG_NAMES, bool)
+
+	@FLAGS.setter
+	def FLAGS(self, values):
+		for name, value in zip(FLAG_NAMES, values): setattr(self, name, bool(value))
+
+
+	@property
+	def Z(self):
+		if self.LAZY & LAZY_ZSP: return (self.RESULT & 0xFF) == 0
+		return self._Z
+
+	@Z.setter
+	def Z(self, value):
+		if self.LAZY & LAZY_ZSP: self.resolve_flags()
+		self._Z = value
+
+	@property
+	def S(self):
+		if self.LAZY & LAZY_ZSP: return (self.RESULT & 0x80) != 0
+		return self._S
+
+	@S.setter
+	def S(self, value):
+		if self.LAZY & LAZY_ZSP: self.resolve_flags()
+		self._S = value
+
+	@property
+	def P(self):
+		if self.LAZY & LAZY_ZSP: return PARITY[self.RESULT & 0xFF]
+		return self._P
+
+	@P.setter
+	def P(self, value):
+		if self.LAZY & LAZY_ZSP: self.resolve_flags()
+		self._P = value
+
+	@property
+	def CY(self):
+		if self.LAZY & LAZY_CY: return self.RESULT > 0xFF or self.RESULT < 0x00
+		return self._CY
+
+	@CY.setter
+	def CY(self, value):
+		# a pending carry is simply overwritten; nothing else depends on it.
+		self.LAZY &= ~LAZY_CY
+		self._CY = value
+
+	@property
+	def AC(self):
+		if self.LAZY & LAZY_AC: return ((self.AUX ^ self.RESULT) & 0x10) != 0
+		return self._AC
+
+	@AC.setter
+	def AC(self, value):
+		self.LAZY &= ~LAZY_AC
+		self._AC = value
+
+	def resolve_flags(self):
+		"""Works out any pending flags, and stores them."""
+		if self.LAZY & LAZY_ZSP:
+			zsp = ZSP[self.RESULT & 0xFF]
+			self._Z = (zsp & PSW_Z) != 0
+			self._S = (zsp & PSW_S) != 0
+			self._P = (zsp & PSW_P) != 0
+		if self.LAZY & LAZY_CY:
+			self._CY = self.CY
+		if self.LAZY & LAZY_AC:
+			self._AC = self.AC
+
+		self.LAZY = 0
 
 
 	def processor_status_word(self):
-		PSW = int(self.FLAGS[FlagsRegisters.CY]) \
+		PSW = int(self.CY) \
 			| 2 \
-			| (int(self.FLAGS[FlagsRegisters.P]) << 2) \
-			| (int(self.FLAGS[FlagsRegisters.AC]) << 4) \
-			| (int(self.FLAGS[FlagsRegisters.Z]) << 6) \
-			| (int(self.FLAGS[FlagsRegisters.S]) << 7) \
+			| (int(self.P) << 2) \
+			| (int(self.AC) << 4) \
+			| (int(self.Z) << 6) \
+			| (int(self.S) << 7) \
 
 		return PSW
 
 
 	def clone(self):
-		new_state = State()
-		new_state.REG_UINT8 = self.REG_UINT8.copy()
-		new_state.REG_UINT16 = self.REG_UINT16.copy()
-		new_state.FLAGS = self.FLAGS.copy()
+		"""
+		A copy of the state. Memory is shared page by page, and each side
+		copies a page when it first writes to it, so a clone costs a page
+		table plus the pages written since. The first clone of a state
+		pages its memory too. The port bus and the scheduler are copied,
+		devices and pending events with them, so the clone runs on its own
+		time; the memory map is configuration, and is shared.
+		"""
+		if type(self.MEM) is bytearray: self.MEM = PagedMemory(self.MEM)
+
+		new_state = State.__new__(State)
+		copy_slots(self, new_state)
 		new_state.MEM = self.MEM.copy()
+		if self.BUS is not None: self.BUS.copy().install(new_state)
+		if self.EVENTS is not None: self.EVENTS.copy(new_state)
 
 		return new_state
 
+	def flatten(self):
+		"""
+		Gives the state flat memory of its own, for the fastest reads.
+		Memory with mirrors stays paged, as the mirrors are its pages.
+		"""
+		if type(self.MEM) is not bytearray and self.MEM.homes is None: self.MEM = bytearray().join(self.MEM.pages)
+		return self
+
 
-	def __eq__(self, other_state):
-		uint8_reg_equal = np.all(self.REG_UINT8 == other.REG_UINT8)
-		uint16_reg_equal = np.all(self.REG_UINT16 == other.REG_UINT16)
-		flags_reg_equal = np.all(self.FLAGS == other.FLAGS)
-		mem_equal = np.all(self.MEM == other.MEM)
+	def __eq__(self, other):
+		uint8_reg_equal = self.REG_UINT8 == other.REG_UINT8
+		uint16_reg_equal = self.REG_UINT16 == other.REG_UINT16
+		flags_reg_equal = self.FLAGS == other.FLAGS
+		mem_equal = self.MEM == other.MEM
 
 		return uint8_reg_equal and uint16_reg_equal and flags_reg_equal and mem_equal
 
 	def __repr__(self):
-		rep  = f'\nA: {hex(self.REG_UINT8[Uint8Registers.A])}\n'
-		rep += f'B: {hex(self.REG_UINT8[Uint8Registers.B])}\tC:{hex(self.REG_UINT8[Uint8Registers.C])}\n'
-		rep += f'D: {hex(self.REG_UINT8[Uint8Registers.D])}\tE:{hex(self.REG_UINT8[Uint8Registers.E])}\n'
-		rep += f'H: {hex(self.REG_UINT8[Uint8Registers.H])}\tL:{hex(self.REG_UINT8[Uint8Registers.L])}\n\n'
+		rep  = f'\nA: {hex(self.A)}\n'
+		rep += f'B: {hex(self.B)}\tC:{hex(self.C)}\n'
+		rep += f'D: {hex(self.D)}\tE:{hex(self.E)}\n'
+		rep += f'H: {hex(self.H)}\tL:{hex(self.L)}\n\n'
 
-		rep += f'SP: {hex(self.REG_UINT16[Uint16Registers.SP])}\nPC: {hex(self.REG_UINT16[Uint16Registers.PC])}\n\n'
+		rep += f'SP: {hex(self.SP)}\nPC: {hex(self.PC)}\n\n'
 
-		rep += f'Z: {int(self.FLAGS[FlagsRegisters.Z])}, '
-		rep += f'S: {int(self.FLAGS[FlagsRegisters.S])}, '
-		rep += f'P: {int(self.FLAGS[FlagsRegisters.P])}, '
-		rep += f'CY: {int(self.FLAGS[FlagsRegisters.CY])}, '
-		rep += f'AC: {int(self.FLAGS[FlagsRegisters.AC])}, '
-		rep += f'DI: {int(self.FLAGS[FlagsRegisters.DI])}, '
-		rep += f'E: {int(self.FLAGS[FlagsRegisters.E])}\n'
+		rep += f'Z: {int(self.Z)}, '
+		rep += f'S: {int(self.S)}, '
+		rep += f'P: {int(self.P)}, '
+		rep += f'CY: {int(self.CY)}, '
+		rep += f'AC: {int(self.AC)}, '
+		rep += f'DI: {int(self.DI)}, '
+		rep += f'E: {int(self.RUN)}\n'
 
-		rep += f'PSW: {int(self.FLAGS[FlagsRegisters.S])}'
-		rep += f'{int(self.FLAGS[FlagsRegisters.Z])}0{int(self.FLAGS[FlagsRegisters.AC])}0'
-		rep += f'{int(self.FLAGS[FlagsRegisters.P])}1{int(self.FLAGS[FlagsRegisters.CY])}\n'
+		rep += f'PSW: {int(self.S)}'
+		rep += f'{int(self.Z)}0{int(self.AC)}0'
+		rep += f'{int(self.P)}1{int(self.CY)}\n'
 
 		return rep
 
 
+# copies every slot of one State to another, unrolled; a loop of getattr
+# and setattr was most of what a clone cost.
+def build_copy_slots():
+	source = 'def copy_slots(state, new_state):\n' + ''.join(f'\tnew_state.{name} = state.{name}\n' for name in State.__slots__)
+	namespace = {}
+	exec(compile(source, '<copy_slots>', 'exec'), namespace)
+	return namespace['copy_slots']
+
+copy_slots = build_copy_slots()
+
 
 def initialize_state_from_rom(data: bytes, base_pointer: int = 0):
 	
 	state = State()
-	ROM = np.frombuffer(data, dtype=np.uint8)
-	state.MEM[base_pointer:ROM.shape[0]] = ROM
+	state.MEM[base_pointer:base_pointer + len(data)] = data
 
-	return state
\ No newline at end of file
+	return state
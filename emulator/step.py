@@ -4,24 +4,121 @@ from .state import Uint8Registers as U8
 from .state import FlagsRegisters as F
 
 from .opcodes import OPCODE_TABLE
-from .opcodes.abstract import UnimplementedOp
+from .cycles import CYCLES, MAX_OP_CYCLES
 
 
-def decode_op(state: State):
-	pc = state.REG_UINT16[ U16.PC ]
-	opcode = state.MEM[pc]
+HLT_CODE = 0x76 # the loops below stop, or idle, once the CPU halts
+EI_CODE = 0xFB # interrupts aren't taken until the op after ei has run
+
+
+# dense, opcode-indexed tables, built once at import. Every one of the
+# 256 slots is filled (OPCODE_TABLE includes the undocumented aliases),
+# so decoding is a single tuple index with no miss path.
+OPS = tuple(OPCODE_TABLE[code] for code in range(256))
+DISPATCH_TABLE = tuple(op.step for op in OPS)
 
-	try:
-		return OPCODE_TABLE[opcode]
 
-	except KeyError:
-		return UnimplementedOp()
+def decode_op(state: State):
+	return OPS[ state.MEM[state.PC] ]
 
 
 def step(state: State):
+	# a halted CPU fetches nothing until an interrupt wakes it.
+	if state.HALTED: return
+
 	# fetch & decode
-	op = decode_op(state)
-	state.REG_UINT16[ U16.PC ] += 0x01
+	PC = state.PC
+	opcode = state.MEM[PC]
+	state.PC = (PC + 0x01) & 0xFFFF
 
 	# execute & writeback
-	op.step(state)	
\ No newline at end of file
+	DISPATCH_TABLE[opcode](state)
+	state.CYCLES += CYCLES[opcode]
+
+	# and any events that came due; see emulator/scheduler.py.
+	events = state.EVENTS
+	if events is not None and state.CYCLES >= events.deadline and opcode != EI_CODE: events.run_due(state)
+
+
+# The loops below service state.EVENTS the way runner.run_state does:
+# they run in chunks that end at the scheduler's next deadline, and fire
+# what's due between chunks.
+
+def run(state: State, n: int):
+	"""
+	Executes n instructions back to back, or up to and including a HLT,
+	and returns how many it executed. Equivalent to calling step n times.
+	"""
+	MEM = state.MEM
+	dispatch = DISPATCH_TABLE
+	cycles = CYCLES
+	events = state.EVENTS
+	executed = 0
+
+	while executed < n and not state.HALTED:
+		chunk = n - executed
+		if events is not None: chunk = max(1, min(chunk, (events.deadline - state.CYCLES + MAX_OP_CYCLES - 1) // MAX_OP_CYCLES))
+		used = 0
+
+		for count in range(1, chunk + 1):
+			PC = state.PC
+			opcode = MEM[PC]
+			state.PC = (PC + 0x01) & 0xFFFF
+			dispatch[opcode](state)
+			used += cycles[opcode]
+
+			if opcode == HLT_CODE: break
+
+		executed += count
+		state.CYCLES += used
+		if events is not None and state.CYCLES >= events.deadline and opcode != EI_CODE: events.run_due(state)
+
+		if opcode == HLT_CODE: break
+
+	return executed
+
+
+def run_cycles(state: State, n: int):
+	"""
+	Executes instructions until at least n clock cycles have elapsed, and
+	returns the number used. The last instruction may run past n; callers
+	keeping a fixed rate should carry the overshoot into the next budget.
+	A halted CPU waits, skipping straight to each event that could wake
+	it; if none comes, it idles out the rest of the budget.
+	"""
+	MEM = state.MEM
+	dispatch = DISPATCH_TABLE
+	cycles = CYCLES
+	events = state.EVENTS
+	start = state.CYCLES
+	end = start + n
+
+	while state.CYCLES < end:
+		if state.HALTED:
+			if events is None or state.DI or events.deadline >= end:
+				state.CYCLES = end # nothing can wake it in time
+				break
+
+			state.CYCLES = max(state.CYCLES, events.deadline)
+			events.run_due(state)
+			continue
+
+		# no op takes more than MAX_OP_CYCLES, so a chunk of this many
+		# can't pass the budget, or the next event, before its last instruction.
+		limit = end if events is None else min(end, events.deadline)
+		chunk = max(1, (limit - state.CYCLES + MAX_OP_CYCLES - 1) // MAX_OP_CYCLES)
+		used = 0
+
+		for _ in range(chunk):
+			PC = state.PC
+			opcode = MEM[PC]
+			state.PC = (PC + 0x01) & 0xFFFF
+			dispatch[opcode](state)
+			used += cycles[opcode]
+
+			if opcode == HLT_CODE: break
+
+		state.CYCLES += used
+		if events is not None and state.CYCLES >= events.deadline and opcode != EI_CODE: events.run_due(state)
+
+	return state.CYCLES - start
@@ -1,107 +1,529 @@
-import numpy as np
+# Trace
+# =====
+# A recording of a run, one diff per instruction, that can be stepped
+# forwards and backwards.
+#
+# Memory writes are logged as they happen rather than found afterwards:
+# a WriteLog stands in front of the traced state's memory map, the way
+# Watchpoints do, with every page taken off the FAST table, so each store
+# reports its address and the byte it replaced. A step's diff is built
+# from that log and the registers before and after, in time proportional
+# to what the instruction changed, not to the size of memory.
+#
+# Diffs are kept in columns (TraceStore): typed arrays of register and
+# memory change records, and an index of where each step's records end,
+# so a step costs the records it needs, about 25 bytes, and no objects.
+#
+# For runs too long to keep, RingTrace keeps only the last steps, in
+# buffers allocated up front. Steps falling out of the window are folded
+# into a base snapshot of the state at the window's edge.
+#
+# Every so many steps the trace also keeps a keyframe: the registers and
+# the whole of memory, as a PagedMemory that shares every page not
+# written since the last keyframe with that one. seek(k) finds the
+# nearest keyframe by bisection, restores it, and replays or reverts the
+# diffs from there, so a seek costs the same however long the trace is.
+
+from array import array
+from bisect import bisect_right
+from itertools import compress
+from operator import attrgetter, ne
+from struct import Struct
 
-from .state import State, initialize_state_from_rom
-from .state import Uint16Registers as U16
-from .state import Uint8Registers as U8
-from .state import FlagsRegisters as F
+import numpy as np
 
+from .state import State, U8_NAMES, U16_NAMES
 from .step import step
+from .memory import PAGE_COUNT, PAGE_SIZE, PagedMemory, as_buffer
+
+
+# everything a diff records besides memory, in order.
+REGISTER_NAMES = U8_NAMES + U16_NAMES + ('Z', 'S', 'P', 'CY', 'AC', 'RUN', 'DI', 'HALTED')
+registers_of = attrgetter(*REGISTER_NAMES)
+REGISTER_INDEXES = range(len(REGISTER_NAMES))
+CASTS = (int,) * len(U8_NAMES + U16_NAMES) + (bool,) * (len(REGISTER_NAMES) - len(U8_NAMES + U16_NAMES))
+
+NO_FAST_PAGES = bytes(PAGE_COUNT)
+
+KEYFRAME_INTERVAL = 4096 # steps between keyframes
+
+RING_STEPS = 100000 # steps a RingTrace keeps by default
+RING_STEP_BYTES = 32 # bytes of records it sets aside for each, by default
 
 
 class StateDiff():
-	def __init__(self, state: State, state_prime: State):
-		D_REG_UINT8 = state.REG_UINT8 - state_prime.REG_UINT8
-		self.delta_REG_UINT8_IDS = np.where(D_REG_UINT8 != 0)[0]
-		self.delta_REG_UINT8_VALUES = D_REG_UINT8[self.delta_REG_UINT8_IDS]
-		
-		D_REG_UINT16 = state.REG_UINT16 - state_prime.REG_UINT16
-		self.delta_REG_UINT16_IDS = np.where(D_REG_UINT16 != 0)[0]
-		self.delta_REG_UINT16_VALUES = D_REG_UINT16[self.delta_REG_UINT16_IDS]
-
-		D_FLAGS = state.FLAGS ^ state_prime.FLAGS
-		self.delta_FLAGS_IDS = np.where(D_FLAGS != 0)[0]
-		self.delta_FLAGS_VALUES = D_FLAGS[self.delta_FLAGS_IDS]
-
-		D_MEM = state.MEM - state_prime.MEM
-		self.delta_MEM_ADDRS = np.where(D_MEM != 0)[0]
-		self.delta_MEM_DATA = D_MEM[self.delta_MEM_ADDRS]
+	"""
+	What one stretch of a run changed: (name, before, after) for each
+	register and flag, (address, before, after) for each byte of memory
+	written, in the order they were written, and the cycles it took.
+	"""
+	__slots__ = ('registers', 'memory', 'cycles')
+
+	def __init__(self, registers: tuple, memory: tuple, cycles: int):
+		self.registers = registers
+		self.memory = memory
+		self.cycles = cycles
+
+	@staticmethod
+	def between(state: State, state_prime: State):
+		"""The diff taking state to state_prime, found by comparing all of memory."""
+		before, after = registers_of(state), registers_of(state_prime)
+		registers = tuple((name, old, new) for name, old, new in zip(REGISTER_NAMES, before, after) if old != new)
+
+		old = np.frombuffer(as_buffer(state.MEM), dtype=np.uint8)
+		new = np.frombuffer(as_buffer(state_prime.MEM), dtype=np.uint8)
+		addrs = np.flatnonzero(old != new)
+		memory = tuple(zip(addrs.tolist(), old[addrs].tolist(), new[addrs].tolist()))
+
+		return StateDiff(registers, memory, state_prime.CYCLES - state.CYCLES)
 
 	def apply(self, state: State):
-		state.REG_UINT8[self.delta_REG_UINT8_IDS] += self.delta_REG_UINT8_VALUES
-		state.REG_UINT16[self.delta_REG_UINT16_IDS] += self.delta_REG_UINT16_VALUES
-		state.FLAGS[self.delta_FLAGS_IDS] ^= self.delta_FLAGS_VALUES
-		state.MEM[self.delta_MEM_ADDRS] += self.delta_MEM_DATA
+		"""Moves state forwards over the diff."""
+		for name, old, new in self.registers: setattr(state, name, new)
+
+		MEM = state.MEM
+		for addr, old, new in self.memory: MEM[addr] = new
 
+		state.CYCLES += self.cycles
 		return state
 
+	def revert(self, state: State):
+		"""Moves state backwards over the diff."""
+		for name, old, new in self.registers: setattr(state, name, old)
 
-	def __repr__(self):
-		rep = '--- 8-bit Registers --- \n'
+		MEM = state.MEM
+		for addr, old, new in reversed(self.memory): MEM[addr] = old
 
-		for i in range(self.delta_REG_UINT8_IDS.shape[0]):
-			rep += f'Δ{U8.to_string(self.delta_REG_UINT8_IDS[i])}: {hex(self.delta_REG_UINT8_VALUES[i])}\n'
+		state.CYCLES -= self.cycles
+		return state
 
-		rep += '--- 16-bit Registers --- \n'
+	def __repr__(self):
+		rep = '--- Registers --- \n'
 
-		for i in range(self.delta_REG_UINT16_IDS.shape[0]):
-			rep += f'Δ{U16.to_string(self.delta_REG_UINT16_IDS[i])}: {hex(self.delta_REG_UINT16_VALUES[i])}\n'
+		for name, old, new in self.registers:
+			rep += f'{name}: {hex(old)} -> {hex(new)}\n'
 
 		rep += '--- Memory --- \n'
 
-		for i in range(self.delta_MEM_ADDRS.shape[0]):
-			rep += f'Δ{hex(self.delta_MEM_ADDRS[i])}: {hex(self.delta_MEM_DATA[i])}\n'
+		for addr, old, new in self.memory:
+			rep += f'{hex(addr)}: {hex(old)} -> {hex(new)}\n'
 
 		return rep
 
 
-class Trace():
-	# do this in a way tha minimizes GC
-	# on the state objects. Ideally two state 
-	# objects that are never deleted, just ping-ponged between?
-	def __init__(self, initial_state: State):
-		self.current_state_pointer = 0
-		next_state = initial_state.clone()
-		step(next_state)
+class TraceStore():
+	"""
+	The diffs of a trace, in columns: typed arrays that grow as steps are
+	appended. Step i's register changes are records register_end[i - 1]
+	to register_end[i] of the register columns, and its memory writes
+	the same of the memory columns. store[i] is step i as a StateDiff.
+	"""
+	def __init__(self):
+		self.cycles = array('H')
+		self.register_end = array('Q')
+		self.memory_end = array('Q')
+
+		self.register_ids = array('B') # index in REGISTER_NAMES
+		self.register_old = array('H')
+		self.register_new = array('H')
+
+		self.memory_addrs = array('H')
+		self.memory_old = array('B')
+		self.memory_new = array('B')
+
+	@staticmethod
+	def from_columns(columns: dict):
+		"""A store over existing columns, name -> array or memoryview, such as a trace file's."""
+		store = TraceStore.__new__(TraceStore)
+		for name, column in columns.items(): setattr(store, name, column)
+		return store
+
+	def append(self, before: tuple, after: tuple, memory: tuple, cycles: int):
+		"""Records a step from the registers before and after it, and its (address, old, new) writes."""
+		ids, olds, news = self.register_ids, self.register_old, self.register_new
+		for index in compress(REGISTER_INDEXES, map(ne, before, after)):
+			ids.append(index)
+			olds.append(before[index])
+			news.append(after[index])
+
+		if memory:
+			addrs, olds, news = self.memory_addrs, self.memory_old, self.memory_new
+			for addr, old, new in memory:
+				addrs.append(addr)
+				olds.append(old)
+				news.append(new)
+
+		self.register_end.append(len(ids))
+		self.memory_end.append(len(self.memory_addrs))
+		self.cycles.append(cycles)
+
+	def records(self, step: int):
+		"""The ranges of step's register and memory records."""
+		if step == 0: return 0, self.register_end[0], 0, self.memory_end[0]
+		return self.register_end[step - 1], self.register_end[step], self.memory_end[step - 1], self.memory_end[step]
+
+	def apply(self, step: int, state: State):
+		"""Moves state forwards over step."""
+		r0, r1, m0, m1 = self.records(step)
+
+		ids, news = self.register_ids, self.register_new
+		for k in range(r0, r1): setattr(state, REGISTER_NAMES[ids[k]], CASTS[ids[k]](news[k]))
+
+		MEM, addrs, news = state.MEM, self.memory_addrs, self.memory_new
+		for k in range(m0, m1): MEM[addrs[k]] = news[k]
+
+		state.CYCLES += self.cycles[step]
+
+	def revert(self, step: int, state: State):
+		"""Moves state backwards over step."""
+		r0, r1, m0, m1 = self.records(step)
+
+		ids, olds = self.register_ids, self.register_old
+		for k in range(r0, r1): setattr(state, REGISTER_NAMES[ids[k]], CASTS[ids[k]](olds[k]))
+
+		MEM, addrs, olds = state.MEM, self.memory_addrs, self.memory_old
+		for k in range(m1 - 1, m0 - 1, -1): MEM[addrs[k]] = olds[k]
+
+		state.CYCLES -= self.cycles[step]
+
+	def __getitem__(self, step: int):
+		if step < 0: step += len(self)
+		if not 0 <= step < len(self): raise IndexError(f'no step {step}')
+
+		r0, r1, m0, m1 = self.records(step)
+		registers = tuple(
+			(REGISTER_NAMES[index], CASTS[index](old), CASTS[index](new))
+			for index, old, new in zip(self.register_ids[r0:r1], self.register_old[r0:r1], self.register_new[r0:r1])
+		)
+		memory = tuple(zip(self.memory_addrs[m0:m1], self.memory_old[m0:m1], self.memory_new[m0:m1]))
+		return StateDiff(registers, memory, self.cycles[step])
+
+	def __len__(self):
+		return len(self.cycles)
+
+	def nbytes(self):
+		"""The bytes the columns hold."""
+		columns = (self.cycles, self.register_end, self.memory_end, self.register_ids, self.register_old,
+			self.register_new, self.memory_addrs, self.memory_old, self.memory_new)
+		return sum(column.itemsize * len(column) for column in columns)
+
+
+class WriteLog():
+	"""
+	Logs every store to one state's memory as (address, old byte). Set
+	any memory map before creating this; it stands in front of the map
+	until detach().
+	"""
+	def __init__(self, state: State):
+		self.state = state
+		self.inner = state.MAP
+		self.inner_pages = state.PAGES
+		self.entries = []
+
+		state.MAP = self
+		state.PAGES = NO_FAST_PAGES
+
+	def write(self, MEM, addr: int, value: int):
+		entries = self.entries
+		if self.inner is None:
+			entries.append((addr, MEM[addr]))
+			MEM[addr] = value
+			return
+
+		# a store through a mirror lands on the page it mirrors.
+		target = self.inner.resolve(addr)
+		entries.append((target, MEM[target]))
+		self.inner.write(MEM, addr, value)
+
+	def resolve(self, addr: int):
+		return addr if self.inner is None else self.inner.resolve(addr)
+
+	def take(self):
+		"""The (address, old, new) of each byte written since the last call, in order."""
+		if not self.entries: return ()
+
+		MEM = self.state.MEM
+		memory = tuple((addr, old, MEM[addr]) for addr, old in self.entries)
+		self.entries = []
+		return memory
+
+	def detach(self):
+		self.state.MAP = self.inner
+		self.state.PAGES = self.inner_pages
+
 
-		self.states = [initial_state, next_state]
-		self.diffs = [StateDiff(self.states[0], self.states[1])]
+class Trace():
+	"""
+	Steps one state, recording a diff for each instruction in a
+	TraceStore, so that it can be stepped back and forth over, and sought
+	to any step. The
+	state's memory map is wrapped in a WriteLog for as long as the trace
+	records it.
+
+	A keyframe is kept every keyframe_interval steps, and also, if
+	keyframe_bytes is given, as soon as the steps since the last one have
+	written that many bytes. Recorded steps also go to writer, if it's
+	given: a TraceWriter (emulator/tracefile.py) on initial_state.
+	"""
+	def __init__(self, initial_state: State, keyframe_interval: int = KEYFRAME_INTERVAL, keyframe_bytes: int = None, writer=None):
+		self.state = initial_state.flatten() # stepped from here on; flat memory reads fastest
+		self.log = WriteLog(initial_state)
+		self.diffs = TraceStore()
+		self.position = 0 # the step the state is at; diffs[:position] are behind it
+		self.writer = writer
+
+		self.keyframe_interval = keyframe_interval
+		self.keyframe_bytes = keyframe_bytes
+		self.keyframe_steps = [] # the step each keyframe is at, ascending
+		self.keyframes = [] # (registers, cycles, memory)
+		self.dirty = set() # pages written since the last keyframe
+		self.written = 0 # bytes written since the last keyframe
+		self.keyframe()
+
+	def keyframe(self):
+		"""Keeps the state as it is now, at the end of the trace."""
+		state = self.state
+		if self.keyframes:
+			memory = self.keyframes[-1][2].copy()
+			for page in self.dirty: memory.pages[page] = state.MEM[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+		else:
+			memory = PagedMemory(state.MEM)
+
+		self.keyframe_steps.append(self.position)
+		self.keyframes.append((registers_of(state), state.CYCLES, memory))
+		self.dirty = set()
+		self.written = 0
+
+	def restore(self, index: int):
+		"""Puts the state back as it was at keyframe index."""
+		state = self.state
+		registers, cycles, memory = self.keyframes[index]
+
+		state.MEM[:] = memory.tobytes()
+		for name, value in zip(REGISTER_NAMES, registers): setattr(state, name, value)
+		state.CYCLES = cycles
+		self.position = self.keyframe_steps[index]
 
 	def step_forward(self):
-		self.current_state_pointer = (self.current_state_pointer + 1) % 2 # = len(self.states)
-		next_state_pointer = (self.current_state_pointer + 1) % 2 # = len(self.states)
+		state = self.state
+		if self.position < len(self.diffs): # been here before; replay it
+			self.diffs.apply(self.position, state)
+			self.position += 1
+			return
+
+		if state.HALTED: return # no step to take until an interrupt
+
+		before = registers_of(state)
+		cycles = state.CYCLES
 
-		# this double stepping approach allows us to ping-pong 
-		# back and forth between two state objects without ever
-		# having to do new allocations. All the allocations are 
-		# in the StateDiffs, but the state objects themselves
-		# (which are much larger), are never reallocated beyond init.
-		
-		# we step twice because the other saved state already has 
-		# already stepped to the next state.
-		step( self.states[next_state_pointer] ) 
-		step( self.states[next_state_pointer] )
+		step(state)
 
-		# then we get the diff between the current state and the next state
-		self.diffs.append(StateDiff(self.states[self.current_state_pointer], self.states[next_state_pointer]))
+		memory = self.log.take()
+		after = registers_of(state)
+		self.diffs.append(before, after, memory, state.CYCLES - cycles)
+		if self.writer is not None: self.writer.append(before, after, memory, state.CYCLES - cycles)
+		self.position += 1
 
-		# and we're done.
+		if memory:
+			self.written += len(memory)
+			dirty = self.dirty
+			for addr, old, new in memory: dirty.add(addr >> 8)
+
+		if self.position - self.keyframe_steps[-1] >= self.keyframe_interval \
+			or (self.keyframe_bytes is not None and self.written >= self.keyframe_bytes):
+			self.keyframe()
 
 	def step_backward(self):
-		if len(self.diffs) < 2: return # can't step back if you haven't stepped yet.
+		if not self.position: return # can't step back if you haven't stepped yet.
+		self.position -= 1
+		self.diffs.revert(self.position, self.state)
 
-		prev_state_pointer = (self.current_state_pointer + 1) % 2 # = len(self.states)
-		
-		diff_one = self.diffs.pop()
-		diff_two = self.diffs[-1] # the second diff is relevant still for the next backward op.
+	def seek(self, target: int):
+		"""
+		Moves the state to step target, from wherever is nearest: where it
+		is, or the keyframe either side of target. Steps past the end of the
+		trace are run and recorded, up to a HLT.
+		"""
+		if target < 0: raise ValueError(f'no step {target}')
 
-		diff_one.apply(self.states[prev_state_pointer])
-		diff_two.apply(self.states[prev_state_pointer])
+		end = min(target, len(self.diffs))
+		index = bisect_right(self.keyframe_steps, end) - 1
+		starts = [(abs(end - self.position), None), (end - self.keyframe_steps[index], index)]
+		if index + 1 < len(self.keyframe_steps): starts.append((self.keyframe_steps[index + 1] - end, index + 1))
 
-		self.current_state_pointer = prev_state_pointer
+		distance, nearest = min(starts, key=lambda start: start[0])
+		if nearest is not None and distance < abs(end - self.position): self.restore(nearest)
 
+		while self.position > end: self.step_backward()
+		while self.position < target and not (self.position == len(self.diffs) and self.state.HALTED): self.step_forward()
 
 	def current_state(self):
-		return self.states[self.current_state_pointer]
+		return self.state
+
+	def close(self):
+		"""Finishes the trace file, if one is being written."""
+		if self.writer is not None: self.writer.close()
+
+
+# a RingTrace step, packed: a header, then its register records, then its memory records.
+RING_STEP = Struct('<HBH') # cycles, register records, memory records
+RING_REGISTER = Struct('<BHH') # index in REGISTER_NAMES, old, new
+RING_WRITE = Struct('<HBB') # address, old, new
+
+
+class RingTrace():
+	"""
+	A trace of the last window_steps steps, and of no more of them than
+	fit in window_bytes of records (RING_STEP_BYTES a step by default).
+	Steps are packed into a byte ring, and the oldest are folded into a
+	base snapshot as new ones need the room, so step_backward and seek
+	reach back as far as the window does. Its buffers are all allocated
+	here, so its memory stays fixed however long it records; recording a
+	step still builds a few short-lived tuples and lists on the way to
+	packing them. Recorded steps also go to writer, if it's given, as they
+	do from Trace.
+	"""
+	def __init__(self, initial_state: State, window_steps: int = RING_STEPS, window_bytes: int = None, writer=None):
+		self.state = initial_state.flatten() # stepped from here on; flat memory reads fastest
+		self.log = WriteLog(initial_state)
+		self.writer = writer
+
+		self.window_steps = window_steps
+		self.data = bytearray(window_bytes if window_bytes is not None else window_steps * RING_STEP_BYTES)
+		self.offsets = array('I', bytes(4 * window_steps)) # where step k is packed, at k % window_steps
+		self.head = 0 # where the next step is packed
+
+		self.start = 0 # the oldest step kept; the base is the state there
+		self.end = 0 # steps recorded
+		self.position = 0 # the step the state is at, from start to end
+
+		self.base_registers = list(registers_of(self.state))
+		self.base_cycles = self.state.CYCLES
+		self.base_memory = bytearray(self.state.MEM)
+
+	def fits(self, size: int):
+		"""Where a packed step of size bytes can go without overwriting a kept one; None if nowhere."""
+		if self.start == self.end: return 0 if size <= len(self.data) else None
+
+		head, tail = self.head, self.offsets[self.start % self.window_steps]
+		if head > tail: # kept steps lie in [tail, head); room after head, or before tail
+			if head + size <= len(self.data): return head
+			return 0 if size <= tail else None
+		return head if head + size <= tail else None # they wrap; room between head and tail
+
+	def fold(self):
+		"""Drops the oldest step out of the window, into the base."""
+		data, offset = self.data, self.offsets[self.start % self.window_steps]
+		cycles, registers, writes = RING_STEP.unpack_from(data, offset)
+		offset += RING_STEP.size
+
+		base = self.base_registers
+		for _ in range(registers):
+			index, old, new = RING_REGISTER.unpack_from(data, offset)
+			base[index] = CASTS[index](new)
+			offset += RING_REGISTER.size
+
+		memory = self.base_memory
+		for _ in range(writes):
+			addr, old, new = RING_WRITE.unpack_from(data, offset)
+			memory[addr] = new
+			offset += RING_WRITE.size
+
+		self.base_cycles += cycles
+		self.start += 1
+
+	def walk(self, step: int, forwards: bool):
+		"""Moves the state over a kept step, forwards or backwards."""
+		state, data = self.state, self.data
+		offset = self.offsets[step % self.window_steps]
+		cycles, registers, writes = RING_STEP.unpack_from(data, offset)
+		offset += RING_STEP.size
+
+		for _ in range(registers):
+			index, old, new = RING_REGISTER.unpack_from(data, offset)
+			setattr(state, REGISTER_NAMES[index], CASTS[index](new if forwards else old))
+			offset += RING_REGISTER.size
+
+		MEM = state.MEM
+		if forwards:
+			for _ in range(writes):
+				addr, old, new = RING_WRITE.unpack_from(data, offset)
+				MEM[addr] = new
+				offset += RING_WRITE.size
+		else:
+			# undone last first, so the earliest old byte of an address wins.
+			for k in range(writes - 1, -1, -1):
+				addr, old, new = RING_WRITE.unpack_from(data, offset + k * RING_WRITE.size)
+				MEM[addr] = old
+
+		state.CYCLES += cycles if forwards else -cycles
 
+	def step_forward(self):
+		if self.position < self.end: # been here before; replay it
+			self.walk(self.position, True)
+			self.position += 1
+			return
+
+		state = self.state
+		if state.HALTED: return # no step to take until an interrupt
+
+		before = registers_of(state)
+		cycles = state.CYCLES
+
+		step(state)
+
+		after = registers_of(state)
+		memory = self.log.take()
+		if self.writer is not None: self.writer.append(before, after, memory, state.CYCLES - cycles)
+
+		changed = list(compress(REGISTER_INDEXES, map(ne, before, after)))
+		size = RING_STEP.size + len(changed) * RING_REGISTER.size + len(memory) * RING_WRITE.size
+
+		if self.end - self.start == self.window_steps: self.fold()
+		offset = self.fits(size)
+		while offset is None:
+			if self.start == self.end: raise ValueError(f'a step of {size} bytes does not fit in a window of {len(self.data)}')
+			self.fold()
+			offset = self.fits(size)
+
+		data = self.data
+		self.offsets[self.end % self.window_steps] = offset
+		RING_STEP.pack_into(data, offset, state.CYCLES - cycles, len(changed), len(memory))
+		offset += RING_STEP.size
+		for index in changed:
+			RING_REGISTER.pack_into(data, offset, index, before[index], after[index])
+			offset += RING_REGISTER.size
+		for addr, old, new in memory:
+			RING_WRITE.pack_into(data, offset, addr, old, new)
+			offset += RING_WRITE.size
+
+		self.head = offset
+		self.end += 1
+		self.position = self.end
 
+	def step_backward(self):
+		if self.position == self.start: return # the edge of the window
+		self.position -= 1
+		self.walk(self.position, False)
+
+	def restore(self):
+		"""Puts the state back at the window's edge, from the base."""
+		state = self.state
+		state.MEM[:] = self.base_memory
+		for name, value in zip(REGISTER_NAMES, self.base_registers): setattr(state, name, value)
+		state.CYCLES = self.base_cycles
+		self.position = self.start
+
+	def seek(self, target: int):
+		"""Moves the state to step target, from where it is or the base; past the end, it records the steps up to a HLT."""
+		if target < self.start: raise ValueError(f'step {target} is before the window, which starts at {self.start}')
+
+		if target - self.start < abs(target - self.position): self.restore()
+		while self.position > target: self.step_backward()
+		while self.position < target and not (self.position == self.end and self.state.HALTED): self.step_forward()
+
+	def current_state(self):
+		return self.state
 
+	def close(self):
+		if self.writer is not None: self.writer.close()
@@ -0,0 +1,310 @@
+# Trace Files
+# ===========
+# A trace on disk, written as it's recorded and read back through mmap,
+# so a trace outlives the editor and can grow larger than memory.
+#
+#     header    magic 'I8080TRC', version, compression, steps per chunk
+#     chunk     header, then body: keyframe, memory, columns
+#     ...
+#     index     (offset, length, first step, steps) for each chunk
+#     trailer   offset of the index, chunk count, magic 'I8080END'
+#
+# A chunk's body is the state at its first step (a keyframe: registers,
+# cycles, and all 64K of memory) and the TraceStore columns of its steps
+# (emulator/trace.py). Bodies can be compressed with zlib, chunk by
+# chunk. Chunks are only ever appended, and each one's header gives its
+# length, so a file whose writer never got as far as the index can still
+# be read, by walking the chunks.
+#
+# Reading maps the file. Seeking bisects the index for the chunk, restores
+# the keyframe there or at the next chunk, and replays or reverts at most
+# half a chunk of steps. Only the chunk being looked at is decoded, and an
+# uncompressed one isn't even copied: its columns are memoryviews onto
+# the mapping.
+
+import mmap
+import zlib
+import struct
+from array import array
+from bisect import bisect_right
+
+from .state import State
+from .memory import as_buffer
+from .trace import TraceStore, WriteLog, REGISTER_NAMES, CASTS, registers_of
+from .step import step
+
+
+MAGIC = b'I8080TRC'
+CHUNK_MAGIC = b'CHNK'
+END_MAGIC = b'I8080END'
+VERSION = 1
+
+NONE = 'none'
+ZLIB = 'zlib'
+COMPRESSIONS = (NONE, ZLIB) # by their number in the header
+
+CHUNK_STEPS = 16384 # steps per chunk
+
+FILE_HEADER = struct.Struct('<8sHBxI16x') # magic, version, compression, chunk steps
+CHUNK_HEADER = struct.Struct('<4sBxxxQQQIII4x') # magic, compressed, stored length, length, first step, steps, register records, memory records
+KEYFRAME = struct.Struct(f'<{len(REGISTER_NAMES)}H6xQ') # registers, cycles
+INDEX_ENTRY = struct.Struct('<QQQI4x') # offset, length, first step, steps
+TRAILER = struct.Struct('<QI4x8s') # index offset, chunk count, magic
+
+MEMORY_SIZE = State.MEMSIZE
+
+# the TraceStore columns, as they're laid out in a chunk: widest first,
+# so every column starts aligned. Each one is as long as the chunk's steps,
+# register records, or memory records.
+COLUMNS = (
+	('register_end', 'I', 'steps'),
+	('memory_end', 'I', 'steps'),
+	('cycles', 'H', 'steps'),
+	('register_old', 'H', 'registers'),
+	('register_new', 'H', 'registers'),
+	('memory_addrs', 'H', 'memory'),
+	('register_ids', 'B', 'registers'),
+	('memory_old', 'B', 'memory'),
+	('memory_new', 'B', 'memory'),
+)
+
+
+class TraceFileError(ValueError):
+	pass
+
+
+class TraceWriter():
+	"""
+	Appends steps to a trace file, a chunk at a time. state is the state
+	being recorded, as it is before the first step appended; steps are
+	appended as they're taken, as Trace appends them to its TraceStore.
+	"""
+	def __init__(self, path: str, state: State, compression: str = NONE, chunk_steps: int = CHUNK_STEPS):
+		if compression not in COMPRESSIONS: raise ValueError(f'compression must be one of {", ".join(COMPRESSIONS)}')
+
+		self.file = open(path, 'wb')
+		self.state = state
+		self.compression = compression
+		self.chunk_steps = chunk_steps
+		self.index = [] # (offset, length, first step, steps)
+		self.steps = 0 # steps in the chunks written so far
+
+		self.file.write(FILE_HEADER.pack(MAGIC, VERSION, COMPRESSIONS.index(compression), chunk_steps))
+		self.start_chunk()
+
+	def start_chunk(self):
+		state = self.state
+		self.store = TraceStore()
+		self.keyframe = KEYFRAME.pack(*registers_of(state), state.CYCLES) + bytes(as_buffer(state.MEM))
+
+	def append(self, before: tuple, after: tuple, memory: tuple, cycles: int):
+		self.store.append(before, after, memory, cycles)
+		if len(self.store) >= self.chunk_steps: self.flush()
+
+	def flush(self):
+		"""Writes the steps appended since the last chunk as a chunk, if there are any."""
+		store = self.store
+		if not len(store): return
+
+		columns = [getattr(store, name) for name, _, _ in COLUMNS]
+		body = self.keyframe + b''.join(
+			(column if column.typecode == typecode else array(typecode, column)).tobytes()
+			for column, (_, typecode, _) in zip(columns, COLUMNS)
+		)
+
+		length = len(body)
+		compressed = self.compression == ZLIB
+		if compressed: body = zlib.compress(body, 6)
+
+		header = CHUNK_HEADER.pack(CHUNK_MAGIC, compressed, len(body), length, self.steps, len(store), len(store.register_ids), len(store.memory_addrs))
+		padding = bytes(-(len(header) + len(body)) % 8) # keeps every chunk aligned
+
+		offset = self.file.tell()
+		self.file.write(header)
+		self.file.write(body)
+		self.file.write(padding)
+		self.file.flush() # a chunk is whole on disk before the next is started
+
+		self.index.append((offset, len(header) + len(body) + len(padding), self.steps, len(store)))
+		self.steps += len(store)
+		self.start_chunk()
+
+	def close(self):
+		"""Writes the last chunk, the index and the trailer."""
+		if self.file.closed: return
+		self.flush()
+
+		index_offset = self.file.tell()
+		for entry in self.index: self.file.write(INDEX_ENTRY.pack(*entry))
+		self.file.write(TRAILER.pack(index_offset, len(self.index), END_MAGIC))
+		self.file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exception):
+		self.close()
+
+
+class TraceFile():
+	"""A trace file, mapped read-only. len() is its number of steps."""
+	def __init__(self, path: str):
+		with open(path, 'rb') as file:
+			try:
+				self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+			except ValueError: # an empty file can't be mapped
+				raise TraceFileError(f'{path}: too short for a trace file') from None
+
+		self.path = path
+		if len(self.map) < FILE_HEADER.size: raise TraceFileError(f'{path}: too short for a trace file')
+
+		magic, version, compression, self.chunk_steps = FILE_HEADER.unpack_from(self.map)
+		if magic != MAGIC: raise TraceFileError(f'{path}: not a trace file')
+		if version != VERSION: raise TraceFileError(f'{path}: trace file version {version}; this reads version {VERSION}')
+		if compression >= len(COMPRESSIONS): raise TraceFileError(f'{path}: unknown compression {compression}')
+		self.compression = COMPRESSIONS[compression]
+
+		self.index = self.read_index()
+		if self.index is None: self.index = self.walk_chunks()
+		self.first_steps = [first for _, _, first, _ in self.index]
+		self.cached = None # (chunk number, decoded chunk)
+
+	def read_index(self):
+		"""The index the writer left at the end, or None if it didn't get that far."""
+		if len(self.map) < FILE_HEADER.size + TRAILER.size: return None
+
+		index_offset, count, magic = TRAILER.unpack_from(self.map, len(self.map) - TRAILER.size)
+		if magic != END_MAGIC or index_offset + count * INDEX_ENTRY.size != len(self.map) - TRAILER.size: return None
+
+		return [INDEX_ENTRY.unpack_from(self.map, index_offset + i * INDEX_ENTRY.size) for i in range(count)]
+
+	def walk_chunks(self):
+		"""The index, found by reading every whole chunk's header in turn."""
+		index = []
+		offset = FILE_HEADER.size
+		while offset + CHUNK_HEADER.size <= len(self.map):
+			magic, _, stored, _, first, steps, _, _ = CHUNK_HEADER.unpack_from(self.map, offset)
+			length = CHUNK_HEADER.size + stored
+			length += -length % 8
+			if magic != CHUNK_MAGIC or offset + length > len(self.map): break
+
+			index.append((offset, length, first, steps))
+			offset += length
+
+		return index
+
+	def chunk(self, number: int):
+		"""Chunk number, decoded: (registers, cycles, memory, TraceStore)."""
+		if self.cached is not None and self.cached[0] == number: return self.cached[1]
+
+		offset = self.index[number][0]
+		_, compressed, stored, length, _, steps, registers, memory = CHUNK_HEADER.unpack_from(self.map, offset)
+
+		body = memoryview(self.map)[offset + CHUNK_HEADER.size:offset + CHUNK_HEADER.size + stored]
+		if compressed:
+			body = memoryview(zlib.decompress(body))
+			if len(body) != length: raise TraceFileError(f'{self.path}: chunk {number} is {len(body)} bytes, not {length}')
+
+		keyframe = KEYFRAME.unpack_from(body)
+		start = KEYFRAME.size + MEMORY_SIZE
+		lengths = { 'steps': steps, 'registers': registers, 'memory': memory }
+		columns = {}
+		for name, typecode, count in COLUMNS:
+			end = start + lengths[count] * array(typecode).itemsize
+			columns[name] = body[start:end].cast(typecode)
+			start = end
+
+		decoded = (keyframe[:-1], keyframe[-1], body[KEYFRAME.size:KEYFRAME.size + MEMORY_SIZE], TraceStore.from_columns(columns))
+		self.cached = (number, decoded)
+		return decoded
+
+	def locate(self, step: int):
+		"""The number of the chunk holding step; the last chunk for the step after the end."""
+		return max(bisect_right(self.first_steps, step) - 1, 0)
+
+	def replay(self, state: State = None):
+		return Replay(self, state)
+
+	def close(self):
+		self.cached = None
+		self.map.close()
+
+	def __len__(self):
+		if not self.index: return 0
+		_, _, first, steps = self.index[-1]
+		return first + steps
+
+
+class Replay():
+	"""
+	Steps a state back and forth over a trace file, and seeks in it, as
+	Trace does over a trace in memory. The state starts at step 0.
+	"""
+	def __init__(self, trace_file: TraceFile, state: State = None):
+		self.file = trace_file
+		self.state = (state if state is not None else State()).flatten()
+		self.position = 0
+		if trace_file.index: self.restore(0)
+
+	def restore(self, number: int):
+		"""Puts the state as it was at the start of chunk number."""
+		state = self.state
+		registers, cycles, memory, _ = self.file.chunk(number)
+
+		state.MEM[:] = memory
+		for name, cast, value in zip(REGISTER_NAMES, CASTS, registers): setattr(state, name, cast(value))
+		state.CYCLES = cycles
+		self.position = self.file.first_steps[number]
+
+	def step_forward(self):
+		if self.position >= len(self.file): return # the end of the recording
+
+		number = self.file.locate(self.position)
+		self.file.chunk(number)[3].apply(self.position - self.file.first_steps[number], self.state)
+		self.position += 1
+
+	def step_backward(self):
+		if not self.position: return
+
+		self.position -= 1
+		number = self.file.locate(self.position)
+		self.file.chunk(number)[3].revert(self.position - self.file.first_steps[number], self.state)
+
+	def seek(self, target: int):
+		"""Moves the state to step target, from where it is or a chunk's keyframe, whichever is nearer."""
+		if not 0 <= target <= len(self.file): raise ValueError(f'no step {target}; the trace has {len(self.file)}')
+
+		number = self.file.locate(target)
+		first, steps = self.file.first_steps[number], self.file.index[number][3]
+		starts = [(abs(target - self.position), None), (target - first, number)]
+		if number + 1 < len(self.file.index): starts.append((first + steps - target, number + 1))
+
+		distance, nearest = min(starts, key=lambda start: start[0])
+		if nearest is not None and distance < abs(target - self.position): self.restore(nearest)
+
+		while self.position > target: self.step_backward()
+		while self.position < target: self.step_forward()
+
+	def current_state(self):
+		return self.state
+
+	def close(self):
+		self.file.close()
+
+
+def record(state: State, path: str, steps: int, compression: str = NONE, chunk_steps: int = CHUNK_STEPS):
+	"""
+	Runs state for steps instructions, or until it halts, writing each to a
+	trace file at path, without keeping them.
+	"""
+	log = WriteLog(state)
+	with TraceWriter(path, state, compression, chunk_steps) as writer:
+		for _ in range(steps):
+			if state.HALTED: break
+			before = registers_of(state)
+			cycles = state.CYCLES
+			step(state)
+			writer.append(before, registers_of(state), log.take(), state.CYCLES - cycles)
+
+	log.detach()
+	return state
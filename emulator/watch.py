@@ -0,0 +1,199 @@
+# Watchpoints
+# ===========
+# Stop a run when something reads or writes a watched range of memory.
+#
+# Writes are caught through the memory map (emulator/memory.py): each
+# watched page is taken off the state's FAST table, so stores to it go
+# to Watchpoints.write, while stores anywhere else still cost the one
+# PAGES lookup they always did. Reads don't go through the map, so read
+# watchpoints swap in a second dispatch table in which the ops that read
+# memory check a READ page bitmap first; with no read watchpoints set,
+# the run loop keeps the plain table. No watchpoints, no cost.
+#
+# A hit doesn't interrupt the op: it finishes, then RUN drops and the
+# run loop stops, reporting the hit. Addresses are watched together with
+# every mirror of them, so a store through a mirror still hits.
+
+from dataclasses import dataclass
+
+from .opcodes import *
+from .step import OPS, DISPATCH_TABLE
+from .memory import PAGE_COUNT
+
+
+READ = 'read'
+WRITE = 'write'
+
+
+@dataclass
+class WatchHit():
+	kind : str # READ or WRITE
+	address : int # as the op addressed it
+	old : int # the byte before the access
+	new : int # the byte after it; the same as old for reads
+	pc : int = None # the op's address; filled in by the run loop
+
+	def __str__(self):
+		pc = f' at {self.pc:#06x}' if self.pc is not None else ''
+		return f'{self.kind} of {self.address:#06x}{pc}: {self.old:#04x} -> {self.new:#04x}'
+
+
+# the addresses each memory-reading op reads, worked out before it runs
+# (PC is already past the opcode). Instruction fetches aren't included;
+# breakpoints cover those.
+
+def read_hl(op, state):
+	return ((state.H << 8) | state.L,)
+
+def read_pair(op, state):
+	return ((getattr(state, op.r1_name) << 8) | getattr(state, op.r2_name),)
+
+def read_imm16(op, state):
+	PC = state.PC
+	return ((state.MEM[(PC + 0x1) & 0xFFFF] << 8) | state.MEM[PC],)
+
+def read_imm16_pair(op, state):
+	addr, = read_imm16(op, state)
+	return (addr, (addr + 0x1) & 0xFFFF)
+
+def read_stack(op, state):
+	return (state.SP, (state.SP + 0x1) & 0xFFFF)
+
+def read_stack_if_taken(op, state):
+	return read_stack(op, state) if op.predicate(state) else ()
+
+
+READS = {
+	MOV_Reg_Mem: read_hl,
+	ADD_Mem: read_hl,
+	ADC_Mem: read_hl,
+	SUB_Mem: read_hl,
+	SBB_Mem: read_hl,
+	ANA_Mem: read_hl,
+	XRA_Mem: read_hl,
+	ORA_Mem: read_hl,
+	CMP_Mem: read_hl,
+	INR_Mem: read_hl,
+	DCR_Mem: read_hl,
+	LDAX_Reg: read_pair,
+	LDA: read_imm16,
+	LHLD: read_imm16_pair,
+	POP_Reg: read_stack,
+	POP_PSW: read_stack,
+	XTHL: read_stack,
+	RCOND: read_stack_if_taken,
+}
+
+
+class Watchpoints():
+	"""
+	Watchpoints on one state. Set any memory map before creating this;
+	it stands in front of the state's map until detach().
+	"""
+	def __init__(self, state):
+		self.state = state
+		self.inner = state.MAP # the map stores go through once watched
+		self.inner_pages = state.PAGES
+		self.ranges = [] # (start, end, kind), end exclusive
+		self.READ = bytearray(PAGE_COUNT)
+		self.WRITE = bytearray(PAGE_COUNT)
+		self.hits = []
+		self.read_dispatch = None
+
+		state.MAP = self
+
+	def add(self, start: int, end: int = None, read: bool = False, write: bool = True):
+		"""Watches [start, end); end defaults to start + 1."""
+		end = start + 1 if end is None else end
+		if not 0 <= start < end <= 0x10000: raise ValueError(f'{start:#06x}–{end:#06x} is not a range of memory')
+
+		if read: self.ranges.append((start, end, READ))
+		if write: self.ranges.append((start, end, WRITE))
+		self.update()
+
+	def remove(self, start: int, end: int = None):
+		end = start + 1 if end is None else end
+		self.ranges = [watched for watched in self.ranges if watched[:2] != (start, end)]
+		self.update()
+
+	def clear(self):
+		self.ranges = []
+		self.update()
+
+	def detach(self):
+		self.clear()
+		self.state.MAP = self.inner
+
+	def aliases(self, addr: int):
+		if self.inner is None: return (addr,)
+		return tuple(base | (addr & 0xFF) for base in self.inner.aliases[addr >> 8])
+
+	def resolve(self, addr: int):
+		return addr if self.inner is None else self.inner.resolve(addr)
+
+	def update(self):
+		self.READ[:] = bytes(PAGE_COUNT)
+		self.WRITE[:] = bytes(PAGE_COUNT)
+		for start, end, kind in self.ranges:
+			bitmap = self.READ if kind == READ else self.WRITE
+			for page in range(start >> 8, ((end - 1) >> 8) + 1):
+				for alias in self.aliases(page << 8):
+					bitmap[alias >> 8] = 1
+
+		state = self.state
+		if any(self.WRITE):
+			state.PAGES = bytes(fast and not watched for fast, watched in zip(self.inner_pages, self.WRITE))
+		else:
+			state.PAGES = self.inner_pages
+
+		self.read_dispatch = self.build_read_dispatch() if any(self.READ) else None
+
+	@property
+	def dispatch(self):
+		"""The dispatch table a run loop should use."""
+		return self.read_dispatch or DISPATCH_TABLE
+
+	def watched(self, addr: int, kind: str):
+		return any(start <= alias < end for alias in self.aliases(addr) for start, end, watched_kind in self.ranges if watched_kind == kind)
+
+	def hit(self, kind: str, addr: int, old: int, new: int):
+		self.hits.append(WatchHit(kind, addr, old, new))
+		self.state.RUN = False
+
+	def write(self, MEM, addr: int, value: int):
+		"""Stores to unwatched pages never get here, unless the inner map wants them."""
+		target = self.resolve(addr)
+		old = MEM[target]
+		if self.inner is None: MEM[addr] = value
+		else: self.inner.write(MEM, addr, value)
+
+		if self.WRITE[addr >> 8] and self.watched(addr, WRITE):
+			self.hit(WRITE, addr, old, MEM[target])
+
+	def build_read_dispatch(self):
+		READ_PAGES = self.READ
+		table = list(DISPATCH_TABLE)
+
+		for code, op in enumerate(OPS):
+			addresses = READS.get(type(op))
+			if addresses is None: continue
+
+			def watched_step(state, op=op, step=table[code], addresses=addresses):
+				for addr in addresses(op, state):
+					if READ_PAGES[addr >> 8] and self.watched(addr, READ):
+						value = state.MEM[self.resolve(addr)]
+						self.hit(READ, addr, value, value)
+				step(state)
+
+			table[code] = watched_step
+
+		return tuple(table)
+
+	def take_hit(self, pc: int):
+		"""The first hit since the last call, with pc filled in; None if there wasn't one."""
+		if not self.hits: return None
+
+		hit = self.hits[0]
+		hit.pc = pc
+		self.hits = []
+		return hit
@@ -1,18 +1,116 @@
-from sys import argv
+from sys import stdout
+from argparse import ArgumentParser
 from disassembler import disassemble
-from emulator import emulate_from_rom
+from emulator import run_state, StopReason
+from emulator.rom import open_image
+from emulator.memory import invaders_map, IGNORE, TRAP
+from emulator.ports import invaders_bus
+from emulator.scheduler import invaders_events
+from emulator.snapshot import save_state, load_state, COMPRESSIONS, NONE
+from emulator.watch import Watchpoints
+from emulator.breakpoints import Breakpoints, ConditionError
+from emulator.farm import farm, read_jobs, write_results
+from emulator import tracefile
 
-# Run as: python -m main
+# Run as: python -m main run path/to/rom
+#     or: python -m main farm jobs.jsonl --out results.jsonl
+#     or: python -m main trace path/to/rom --steps 1000000 --out run.trace
+#     or: python -m main disassemble path/to/rom
 
 
+def address(string):
+	return int(string, 0)
 
 
+def address_range(string):
+	"""'0x20f0' or '0x2400-0x4000' (end exclusive), as (start, end)."""
+	start, _, end = string.partition('-')
+	return int(start, 0), int(end, 0) if end else int(start, 0) + 1
 
-filepath = argv[1] # just get the second arg and assume its an 8080 binary c:
-file = open(filepath, 'rb')
 
-emulate_from_rom(file.read())
+parser = ArgumentParser(prog='python -m main')
+commands = parser.add_subparsers(dest='command', required=True)
 
-# disassemble(file)
+run_parser = commands.add_parser('run', help='run a rom headless, at full speed, and report why it stopped')
+run_parser.add_argument('rom', help='a binary, an Intel HEX file (.hex), or a directory holding invaders.h/g/f/e')
+run_parser.add_argument('--max-steps', type=int, default=None, help='stop after this many instructions')
+run_parser.add_argument('--max-cycles', type=int, default=None, help='stop after this many clock cycles')
+run_parser.add_argument('--until-pc', type=address, action='append', default=None, help='stop when PC reaches this address (repeatable)')
+run_parser.add_argument('--break', dest='breaks', metavar='CONDITION', action='append', default=[], help="stop when a condition holds, e.g. 'pc == 0x1a5f and A > 0x20' (repeatable)")
+run_parser.add_argument('--base', type=address, default=0, help='load address of the rom')
+run_parser.add_argument('--memory', choices=['flat', 'invaders'], default='flat', help='memory map: 64K of RAM, or Space Invaders ROM/RAM/mirrors')
+run_parser.add_argument('--ports', choices=['none', 'invaders'], default='none', help='port devices: none (every port reads 0xff), or the Space Invaders board')
+run_parser.add_argument('--interrupts', choices=['none', 'invaders'], default='none', help='timed interrupts: none, or Space Invaders\' rst 1 at mid-screen and rst 2 at vblank, 60 times a second')
+run_parser.add_argument('--no-skip-idle', dest='skip_idle', action='store_false', help='run idle loops out instead of skipping to the next interrupt')
+run_parser.add_argument('--watch-write', type=address_range, action='append', default=[], help='stop when this address or start-end range is written (repeatable)')
+run_parser.add_argument('--watch-read', type=address_range, action='append', default=[], help='stop when this address or start-end range is read (repeatable)')
+run_parser.add_argument('--trap-rom-writes', action='store_true', help='stop on writes to ROM instead of ignoring them')
+run_parser.add_argument('--load-state', default=None, help='start from this save state, made with the same --memory, --ports and --interrupts')
+run_parser.add_argument('--save-state', default=None, help='save the state here when the run stops')
+run_parser.add_argument('--compress', choices=COMPRESSIONS, default=NONE, help='compression for --save-state')
 
-file.close()
\ No newline at end of file
+farm_parser = commands.add_parser('farm', help='run a JSONL file of jobs across worker processes')
+farm_parser.add_argument('jobs', help='one JSON job per line; see emulator/farm.py')
+farm_parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+farm_parser.add_argument('--out', default=None, help='write JSONL results here instead of stdout')
+
+trace_parser = commands.add_parser('trace', help='run a rom one step at a time, recording every step to a trace file')
+trace_parser.add_argument('rom', help='a binary, an Intel HEX file (.hex), or a directory holding invaders.h/g/f/e')
+trace_parser.add_argument('--steps', type=int, required=True, help='instructions to run and record')
+trace_parser.add_argument('--out', required=True, help='the trace file to write; browse it with python -m edit --replay')
+trace_parser.add_argument('--base', type=address, default=0, help='load address of the rom')
+trace_parser.add_argument('--memory', choices=['flat', 'invaders'], default='flat', help='memory map: 64K of RAM, or Space Invaders ROM/RAM/mirrors')
+trace_parser.add_argument('--ports', choices=['none', 'invaders'], default='none', help='port devices: none (every port reads 0xff), or the Space Invaders board')
+trace_parser.add_argument('--compress', choices=tracefile.COMPRESSIONS, default=tracefile.NONE, help='compression for each chunk of the trace')
+
+disassemble_parser = commands.add_parser('disassemble', help='print a disassembly of a rom')
+disassemble_parser.add_argument('rom')
+
+args = parser.parse_args()
+
+if args.command == 'run':
+	state = open_image(args.rom, args.base).to_state()
+	if args.memory == 'invaders': invaders_map(TRAP if args.trap_rom_writes else IGNORE).install(state)
+	if args.ports == 'invaders': invaders_bus().install(state)
+	if args.interrupts == 'invaders': invaders_events(state)
+	if args.load_state: load_state(args.load_state, state)
+
+	watchpoints = None
+	if args.watch_write or args.watch_read:
+		watchpoints = Watchpoints(state)
+		for start, end in args.watch_write: watchpoints.add(start, end, write=True)
+		for start, end in args.watch_read: watchpoints.add(start, end, read=True, write=False)
+
+	breakpoints = Breakpoints()
+	for condition in args.breaks:
+		try: breakpoints.add(condition)
+		except ConditionError as error: parser.error(str(error))
+
+	result = run_state(state, args.max_steps, args.max_cycles, args.until_pc, watchpoints, breakpoints, args.skip_idle)
+
+	print(result)
+	if args.save_state: save_state(state, args.save_state, args.compress)
+
+	# budget exhaustion and breakpoints are expected outcomes; anything
+	# the program couldn't finish is a failure for scripts.
+	exit(1 if result.reason == StopReason.WRITE_PROTECTED else 0)
+
+elif args.command == 'farm':
+	with open(args.jobs) as file:
+		jobs = read_jobs(file)
+
+	out = open(args.out, 'w') if args.out else stdout
+	write_results(farm(jobs, args.workers), out)
+	if args.out: out.close()
+
+elif args.command == 'trace':
+	state = open_image(args.rom, args.base).to_state()
+	if args.memory == 'invaders': invaders_map().install(state)
+	if args.ports == 'invaders': invaders_bus().install(state)
+
+	tracefile.record(state, args.out, args.steps, args.compress)
+	print(f'recorded {args.steps:,} steps to {args.out}')
+
+elif args.command == 'disassemble':
+	with open(args.rom, 'rb') as file:
+		disassemble(file)
@@ -0,0 +1,114 @@
+import pytest
+import numpy as np
+
+from emulator.state import State, initialize_state_from_rom, U8_NAMES, FLAG_NAMES
+from emulator.step import step, run
+from emulator.runner import run_state
+from emulator.batch import BatchState, step as batch_step, run as batch_run, run_until_halt
+
+from test.test_ops_base import get_initial_state
+
+
+def random_state(code: int):
+	state = get_initial_state()
+	for name in U8_NAMES: setattr(state, name, np.random.randint(0, 256))
+	for name in FLAG_NAMES: setattr(state, name, bool(np.random.randint(0, 2)))
+	state.SP = np.random.randint(0, 0x10000)
+	state.PC = np.random.randint(0, 0x10000)
+	state.MEM[state.PC] = code
+
+	return state
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_every_opcode_matches_step(seed):
+	# one machine per opcode, all in one batch, so every group runs at once.
+	np.random.seed(seed)
+	states = [random_state(code) for code in range(256)]
+	batch = BatchState.from_states(states)
+
+	batch_step(batch)
+	for code, state in enumerate(states):
+		step(state)
+		batched_state = batch.to_state(code)
+
+		assert batched_state == state, f'opcode {code:#04x}'
+		assert batched_state.CYCLES == state.CYCLES, f'opcode {code:#04x}'
+		assert batched_state.HALTED == state.HALTED, f'opcode {code:#04x}'
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_code_matches_run(seed):
+	# random memory is random code: machines split and regroup every step.
+	states = []
+	for index in range(16):
+		np.random.seed(seed * 16 + index)
+		states.append(get_initial_state(flags=index % 2 == 0))
+
+	batch = BatchState.from_states(states)
+	batch_run(batch, 500)
+
+	for index, state in enumerate(states):
+		run(state, 500)
+		assert batch.to_state(index) == state
+		assert batch.to_state(index).CYCLES == state.CYCLES
+
+
+def test_step_only_touches_rows():
+	np.random.seed(0)
+	states = [random_state(0x3C) for _ in range(4)] # inr a
+	batch = BatchState.from_states(states)
+
+	batch_step(batch, np.array([1, 3]))
+	step(states[1])
+	step(states[3])
+
+	assert batch.to_states() == states
+
+
+def test_run_until_halt():
+	rom = bytes([
+		0x04,             # 0x00 inr b
+		0xC2, 0x00, 0x00, # 0x01 jnz 0x0000
+		0x76,             # 0x04 hlt
+	])
+	batch = BatchState.from_rom(rom, 4)
+	batch.B[:] = [0x00, 0x80, 0xFE, 0xFF]
+	steps = run_until_halt(batch, 10_000)
+
+	for index, B in enumerate([0x00, 0x80, 0xFE, 0xFF]):
+		state = initialize_state_from_rom(rom)
+		state.B = B
+		result = run_state(state)
+
+		assert steps[index] == result.steps
+		assert batch.to_state(index) == state
+		assert batch.CYCLES[index] == result.cycles
+		assert batch.HALTED[index] and state.HALTED
+
+
+def test_halted_machines_stay_put():
+	# hlt, then inr a three times: as in step, nothing after the hlt runs.
+	np.random.seed(2)
+	states = [random_state(0x76), random_state(0x3C)] # hlt, inr a
+	batch = BatchState.from_states(states)
+
+	batch_run(batch, 4)
+	for state in states:
+		for _ in range(4): step(state)
+
+	assert batch.HALTED.tolist() == [True, False]
+	assert batch.to_states() == states
+	assert [state.HALTED for state in batch.to_states()] == [True, False]
+	assert run_until_halt(batch, 10)[0] == 0
+
+
+def test_state_round_trip():
+	np.random.seed(1)
+	states = [random_state(code) for code in range(8)]
+	for state in states: state.CYCLES = np.random.randint(0, 1000)
+	batch = BatchState.from_states(states)
+
+	assert len(batch) == 8
+	assert batch.to_states() == states
+	assert [state.CYCLES for state in batch.to_states()] == [state.CYCLES for state in states]
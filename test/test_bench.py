@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from bench.results import save_results, load_results, compare_results, BASELINE
+from bench.suite import run_suite, op_key, bench_program, PROGRAMS
+
+from emulator.opcodes import OPCODE_LIST
+
+
+def test_op_keys_are_unique():
+	assert len(set(map(op_key, OPCODE_LIST))) == len(OPCODE_LIST)
+
+
+def test_compare_flags_regressions():
+	baseline = { 'a': 100.0, 'b': 100.0, 'c': 100.0, 'only_in_baseline': 1.0 }
+	current = { 'a': 125.0, 'b': 105.0, 'c': 50.0, 'only_in_current': 1.0 }
+
+	rows = compare_results(baseline, current, threshold=0.10)
+	verdicts = { name: verdict for name, _, _, _, verdict in rows }
+
+	assert verdicts == { 'a': 'regression', 'b': '', 'c': 'improvement' }
+
+
+def test_results_round_trip(tmp_path):
+	path = tmp_path / 'results.json'
+	results = run_suite(only=['programs'], scale=0.001)
+	save_results(path, results)
+
+	assert load_results(path) == results
+	assert 'meta' in json.loads(path.read_text())
+	assert all(ns > 0 for ns in results.values())
+
+
+@pytest.mark.parametrize('program', list(PROGRAMS))
+def test_compiled_beats_interpreter(program):
+	results = bench_program('program', PROGRAMS[program], 20_000)
+	assert results['program/compiled'] < results['program/interpreter']
+
+
+def test_baseline_covers_the_suite():
+	baseline = load_results(BASELINE)
+	results = run_suite(only=['ops', 'trace', 'programs'], scale=0.001)
+
+	assert baseline.keys() == results.keys()
@@ -0,0 +1,118 @@
+import pytest
+
+from emulator.state import initialize_state_from_rom
+from emulator.runner import run_state, StopReason
+from emulator.breakpoints import Breakpoints, ConditionError, compile_condition
+
+
+# a counts up from 0 until it wraps, storing each value at 0x20f0; then halt.
+PROGRAM = bytes([
+	0x3E, 0x00,       # 0x00 mvi a, 0
+	0x3C,             # 0x02 inr a
+	0x32, 0xF0, 0x20, # 0x03 sta 0x20f0
+	0xC2, 0x02, 0x00, # 0x06 jnz 0x0002
+	0x76,             # 0x09 hlt
+])
+
+
+def test_compile_condition():
+	state = initialize_state_from_rom(PROGRAM)
+	state.A, state.H, state.L = 0x21, 0x20, 0xF0
+	state.MEM[0x20F0] = 1
+	state.PC = 0x1A5F
+
+	assert compile_condition('pc == 0x1A5F and A > 0x20 and mem[0x20F0] == 1')(state)
+	assert compile_condition('M == 1 and HL == 0x20f0 and a == 0x21')(state)
+	assert not compile_condition('pc == 0x1A5F and A > 0x21')(state)
+
+
+@pytest.mark.parametrize('condition', [
+	'A >',
+	'X == 1',
+	'__import__("os")',
+	'state.A == 1',
+	'A == "1"',
+	'[A for A in mem]',
+])
+def test_bad_conditions(condition):
+	with pytest.raises(ConditionError):
+		Breakpoints().add(condition)
+
+
+def test_where_breakpoints_hang():
+	breakpoints = Breakpoints()
+	plain = breakpoints.add(0x1A5F)
+	address = breakpoints.add('0x0100')
+	pinned = breakpoints.add('A > 0x20 and 0x0200 == pc')
+	anywhere = breakpoints.add('A > 0x20 or pc == 0x0300')
+
+	assert (plain.pc, plain.test) == (0x1A5F, None)
+	assert (address.pc, address.test) == (0x0100, None)
+	assert pinned.pc == 0x0200 and pinned.test is not None
+	assert anywhere.pc is None
+	assert breakpoints.pcs == {0x1A5F, 0x0100, 0x0200}
+	assert breakpoints.anywhere == [anywhere]
+
+	breakpoints.remove(plain.number)
+	assert breakpoints.pcs == {0x0100, 0x0200}
+
+	# removing one that isn't there, or is already gone, is an error.
+	with pytest.raises(ValueError): breakpoints.remove(99)
+	with pytest.raises(ValueError): breakpoints.remove(plain.number)
+	assert len(breakpoints.all) == 3
+
+
+def test_pc_breakpoint():
+	state = initialize_state_from_rom(PROGRAM)
+	breakpoints = Breakpoints()
+	breakpoint = breakpoints.add(0x0006)
+	result = run_state(state, breakpoints=breakpoints)
+
+	assert result.reason == StopReason.BREAKPOINT
+	assert result.breakpoint is breakpoint
+	assert result.pc == 0x0006
+	assert state.A == 1
+	assert breakpoint.hits == 1
+
+
+def test_conditional_breakpoint():
+	state = initialize_state_from_rom(PROGRAM)
+	breakpoints = Breakpoints()
+	breakpoints.add('pc == 0x0006 and A > 0x20 and mem[0x20F0] == 0x21')
+	result = run_state(state, breakpoints=breakpoints)
+
+	assert result.reason == StopReason.BREAKPOINT
+	assert result.pc == 0x0006
+	assert state.A == 0x21
+	assert result.steps == 1 + 3 * 0x21 - 1
+
+
+def test_condition_that_never_holds():
+	state = initialize_state_from_rom(PROGRAM)
+	breakpoints = Breakpoints()
+	breakpoint = breakpoints.add('pc == 0x0006 and CY')
+
+	assert run_state(state, breakpoints=breakpoints).reason == StopReason.HALTED
+	assert breakpoint.hits == 0
+
+
+def test_condition_anywhere():
+	state = initialize_state_from_rom(PROGRAM)
+	breakpoints = Breakpoints()
+	breakpoints.add('mem[0x20F0] == 0x10')
+	result = run_state(state, breakpoints=breakpoints)
+
+	assert result.reason == StopReason.BREAKPOINT
+	assert result.pc == 0x0006 # right after the store
+	assert state.A == 0x10
+
+
+def test_many_breakpoints_and_until_pc():
+	state = initialize_state_from_rom(PROGRAM)
+	breakpoints = Breakpoints()
+	for pc in range(0x1000, 0x1400): breakpoints.add(f'pc == {pc} and A == 1')
+	result = run_state(state, until_pc=0x0009, breakpoints=breakpoints)
+
+	assert result.reason == StopReason.BREAKPOINT
+	assert result.breakpoint is None
+	assert result.pc == 0x0009
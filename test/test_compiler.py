@@ -0,0 +1,132 @@
+import pytest
+import numpy as np
+
+from emulator.state import State, initialize_state_from_rom
+
+from emulator.step import step, run
+from emulator.compiler import BlockEngine, MAX_BLOCK_LENGTH
+
+from test.test_ops_base import get_initial_state
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_engine_matches_interpreter(seed):
+	# random memory is random code: every op, lots of stores into code pages.
+	np.random.seed(seed)
+	interpreted_state = get_initial_state()
+	compiled_state = interpreted_state.clone()
+
+	run(interpreted_state, 2000)
+	BlockEngine(compiled_state).run(2000)
+
+	assert interpreted_state == compiled_state
+	assert interpreted_state.CYCLES == compiled_state.CYCLES
+
+
+@pytest.mark.parametrize('n', [1, 2, 3, MAX_BLOCK_LENGTH - 1, MAX_BLOCK_LENGTH + 1, 500])
+def test_engine_runs_exact_counts(n):
+	# a block cut short by the budget must stop exactly at n instructions.
+	interpreted_state = get_initial_state()
+	compiled_state = interpreted_state.clone()
+
+	engine = BlockEngine(compiled_state)
+	engine.run(n)
+	run(interpreted_state, n)
+	assert interpreted_state == compiled_state
+	assert interpreted_state.CYCLES == compiled_state.CYCLES
+
+	# and pick up from there.
+	engine.run(n)
+	run(interpreted_state, n)
+	assert interpreted_state == compiled_state
+	assert interpreted_state.CYCLES == compiled_state.CYCLES
+
+
+def test_self_modifying_code():
+	rom = bytes([
+		0x3E, 0x00,       # 0x00 mvi a, 0
+		0x3C,             # 0x02 inr a
+		0x32, 0x0A, 0x00, # 0x03 sta 0x000A   ; rewrite the immediate below
+		0x00,             # 0x06 nop
+		0x00,             # 0x07 nop
+		0x00,             # 0x08 nop
+		0x06, 0x00,       # 0x09 mvi b, <patched>
+		0xC3, 0x02, 0x00, # 0x0B jmp 0x0002
+	])
+
+	interpreted_state = initialize_state_from_rom(rom)
+	compiled_state = interpreted_state.clone()
+
+	run(interpreted_state, 300)
+	BlockEngine(compiled_state).run(300)
+
+	assert compiled_state.B == interpreted_state.B != 0
+	assert interpreted_state == compiled_state
+
+
+def test_blocks_are_cached_and_invalidated():
+	rom = bytes([0x04, 0x05, 0xC3, 0x00, 0x00]) # inr b; dcr b; jmp 0
+	state = initialize_state_from_rom(rom)
+	engine = BlockEngine(state)
+
+	engine.run(30)
+	assert list(engine.blocks) == [0x0000]
+
+	engine.invalidate(0x0001)
+	assert len(engine.blocks) == 0
+	assert engine.CODE[0x00] == 0
+
+
+def test_blocks_pick_up_pending_flags():
+	# the interpreter leaves flags pending; a compiled block has to see them.
+	rom = bytes([
+		0x80,             # 0x00 add b       ; 0x10 + 0xF0: zero, with a carry
+		0xCA, 0x08, 0x00, # 0x01 jz 0x0008
+		0x3E, 0x01,       # 0x04 mvi a, 1
+		0x76,             # 0x06 hlt
+		0x00,             # 0x07 nop
+		0x3E, 0x02,       # 0x08 mvi a, 2
+		0xD2, 0x04, 0x00, # 0x0A jnc 0x0004
+		0x37,             # 0x0D stc
+		0x76,             # 0x0E hlt
+	])
+	state = initialize_state_from_rom(rom)
+	state.A, state.B = 0x10, 0xF0
+
+	step(state)
+	assert state.LAZY
+	BlockEngine(state).run(3)
+	assert state.A == 0x02 and state.PC == 0x0D
+	assert state.Z and state.CY and not state.LAZY
+
+
+def test_blocks_link_their_successors():
+	rom = bytes([
+		0x0E, 0x03,       # 0x00 mvi c, 3
+		0x0D,             # 0x02 dcr c
+		0xC2, 0x02, 0x00, # 0x03 jnz 0x0002
+		0xC3, 0x00, 0x00, # 0x06 jmp 0x0000
+	])
+	engine = BlockEngine(initialize_state_from_rom(rom))
+	engine.run(20)
+
+	loop = engine.blocks[0x0002]
+	assert { loop.next_pc, loop.other_pc } == { 0x0002, 0x0006 }
+	assert loop.next is engine.blocks[loop.next_pc] and loop.other is engine.blocks[loop.other_pc]
+
+	# dropping a block drops every link, so none lead to stale code.
+	engine.invalidate(0x0006)
+	assert loop.next is None and loop.other is None
+	engine.run(20)
+	assert engine.blocks[0x0000].next is engine.blocks[0x0002]
+
+
+def test_engine_stops_at_hlt():
+	state = get_initial_state()
+	state.MEM[0x0:0x4] = bytes([0x76, 0x3C, 0x3C, 0x3C]) # hlt; inr a; inr a; inr a
+	state.A = 0
+	engine = BlockEngine(state)
+
+	assert engine.run(20) == 1
+	assert state.HALTED and state.PC == 0x1 and state.A == 0
+	assert engine.run(20) == 0
@@ -0,0 +1,122 @@
+import io
+import json
+import hashlib
+
+import pytest
+
+from emulator.state import initialize_state_from_rom
+from emulator.runner import run_state, StopReason
+from emulator.farm import Job, farm, read_jobs, write_results
+
+
+# b counts up to 0 and wraps; then the program halts.
+COUNTDOWN = bytes([
+	0x06, 0x00,       # 0x00 mvi b, 0
+	0x04,             # 0x02 inr b
+	0xC2, 0x02, 0x00, # 0x03 jnz 0x0002
+	0x76,             # 0x06 hlt
+])
+
+
+@pytest.fixture
+def rom(tmp_path):
+	path = tmp_path / 'countdown.bin'
+	path.write_bytes(COUNTDOWN)
+	return str(path)
+
+
+def expected(rom_bytes, base=0, registers={}, **budget):
+	state = initialize_state_from_rom(rom_bytes, base)
+	for name, value in registers.items(): setattr(state, name, value)
+	result = run_state(state, budget.get('max_steps'), budget.get('max_cycles'), budget.get('until_pc'))
+	return result, state
+
+
+def test_farm_matches_run_state(rom):
+	jobs = [
+		{ 'rom': rom },
+		{ 'rom': rom, 'id': 'from-b5', 'registers': { 'PC': 0x02, 'B': 0xF0 } },
+		{ 'rom': rom, 'max_steps': 10 },
+		{ 'rom': rom, 'max_cycles': 100 },
+		{ 'rom': rom, 'until_pc': [0x06] },
+	]
+
+	results = { result['id']: result for result in farm(jobs, workers=2) }
+	assert set(results) == { '0', 'from-b5', '2', '3', '4' }
+
+	for job_id, job in zip(['0', 'from-b5', '2', '3', '4'], jobs):
+		budget = { key: job[key] for key in ('max_steps', 'max_cycles', 'until_pc') if key in job }
+		run_result, state = expected(COUNTDOWN, registers=job.get('registers', {}), **budget)
+		result = results[job_id]
+
+		assert result['reason'] == run_result.reason
+		assert result['pc'] == run_result.pc
+		assert result['steps'] == run_result.steps
+		assert result['cycles'] == run_result.cycles
+		assert result['registers']['B'] == state.B
+		assert result['flags']['Z'] == int(state.Z)
+		assert result['memory_sha256'] == hashlib.sha256(state.MEM).hexdigest()
+
+	assert results['0']['reason'] == StopReason.HALTED
+	assert results['2']['reason'] == StopReason.BUDGET
+	assert results['4']['reason'] == StopReason.BREAKPOINT
+
+
+def test_farm_reports_broken_jobs(rom):
+	jobs = [{ 'rom': rom }, { 'rom': rom, 'registers': { 'PC': 'nowhere' } }]
+	results = { result['id']: result for result in farm(jobs, workers=1) }
+
+	assert results['0']['reason'] == StopReason.HALTED
+	assert results['1']['reason'] == 'error'
+
+
+def test_unknown_register():
+	with pytest.raises(ValueError):
+		Job.from_dict({ 'rom': 'x', 'registers': { 'Q': 1 } })
+
+
+def test_bad_jobs_are_named():
+	# a job without an id is named by its position, even when it's invalid.
+	with pytest.raises(ValueError, match='job 3: needs a rom'):
+		list(farm([{ 'rom': 'x' }] * 3 + [{}], workers=1))
+	with pytest.raises(ValueError, match='job 1: no such registers: Q'):
+		read_jobs(io.StringIO('{ "rom": "x" }\n\n{ "rom": "x", "registers": { "Q": 1 } }\n'))
+	with pytest.raises(ValueError, match='job boot: needs a rom'):
+		Job.from_dict({ 'id': 'boot' }, 0)
+
+
+def test_jsonl_round_trip(rom):
+	lines = io.StringIO('\n'.join(json.dumps(job) for job in [{ 'rom': rom }, { 'rom': rom, 'registers': { 'B': 0x80 }, 'max_steps': 10_000 }]) + '\n\n')
+	jobs = read_jobs(lines)
+	assert jobs[1] == Job(rom=rom, id='1', registers={ 'B': 0x80 }, max_steps=10_000)
+
+	out = io.StringIO()
+	write_results(farm(jobs, workers=2), out)
+	results = [json.loads(line) for line in out.getvalue().splitlines()]
+
+	assert sorted(result['id'] for result in results) == ['0', '1']
+	assert all(result['reason'] == StopReason.HALTED for result in results)
+
+
+# echoes three bytes from port 1 to port 2, then halts.
+ECHO = bytes([
+	0xDB, 0x01, # 0x00 in 1
+	0xD3, 0x02, # 0x02 out 2
+	0xDB, 0x01, # 0x04 in 1
+	0xD3, 0x02, # 0x06 out 2
+	0xDB, 0x01, # 0x08 in 1
+	0xD3, 0x02, # 0x0A out 2
+	0x76,       # 0x0C hlt
+])
+
+
+def test_scripted_io(tmp_path):
+	path = tmp_path / 'echo.bin'
+	path.write_bytes(ECHO)
+	jobs = [{ 'rom': str(path), 'id': 'echo', 'io': { '0x01': [7, 9] } }, { 'rom': str(path), 'id': 'open' }]
+	results = { result['id']: result for result in farm(jobs, workers=1) }
+
+	assert results['echo']['output'] == { '2': [7, 9, 9] } # a script that runs out repeats its last byte
+	assert results['echo']['registers']['A'] == 9
+	assert results['open']['output'] is None
+	assert results['open']['registers']['A'] == 0xFF
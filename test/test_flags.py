@@ -0,0 +1,122 @@
+import pytest
+
+from emulator.state import LAZY_ZSP, LAZY_CY, LAZY_AC, LAZY_ALL
+from emulator.flags import ZSP, PARITY, PSW_Z, PSW_S, PSW_P
+from emulator.step import step
+
+from test.test_ops_base import get_initial_state
+
+
+def run_program(program, **registers):
+	state = get_initial_state()
+	state.PC = 0x0
+	state.SP = 0x2400
+	state.MEM[0x0:len(program)] = bytes(program)
+	for name, value in registers.items(): setattr(state, name, value)
+
+	for _ in range(len(program)): step(state)
+	return state
+
+
+def test_alu_flags_are_pending():
+	state = run_program([0x80], A=0xF0, B=0x20) # add b
+
+	assert state.LAZY == LAZY_ALL
+	assert state.CY and not state.Z and not state.S
+
+
+def test_inr_keeps_pending_carry():
+	# the carry out of add must survive inr replacing the recorded result.
+	state = run_program([0x80, 0x0C, 0x00], A=0xF0, B=0x20, C=0xFF) # add b; inr c; nop
+
+	assert state.CY
+	assert state.Z
+	assert state.LAZY == LAZY_ZSP | LAZY_AC
+
+
+def test_setting_one_flag_keeps_the_others():
+	state = run_program([0x80], A=0x7F, B=0x01) # add b: 0x80
+	state.Z = True
+
+	assert state.Z and state.S and not state.CY
+	assert state.LAZY == 0
+
+
+def test_pop_psw_overrides_pending_flags():
+	state = get_initial_state()
+	state.PC, state.SP = 0x0, 0x2400
+	state.MEM[0x0:0x2] = bytes([0x80, 0xF1]) # add b; pop psw
+	state.MEM[0x2400:0x2402] = bytes([0b01000001, 0x12]) # Z and CY set
+	state.A, state.B = 0x01, 0x01
+
+	step(state)
+	step(state)
+
+	assert state.A == 0x12
+	assert state.Z and state.CY and not state.S
+	assert state.LAZY == 0
+
+
+def test_clone_keeps_pending_flags():
+	state = run_program([0x90], A=0x00, B=0x01) # sub b: borrow
+	clone = state.clone()
+
+	assert clone.LAZY == state.LAZY
+	assert clone.CY and clone.S
+	assert clone == state
+
+
+def test_flag_tables():
+	for value in range(256):
+		bits = bin(value).count('1')
+		assert PARITY[value] == (bits % 2 == 0)
+		assert bool(ZSP[value] & PSW_P) == PARITY[value]
+		assert bool(ZSP[value] & PSW_Z) == (value == 0)
+		assert bool(ZSP[value] & PSW_S) == (value >= 0x80)
+
+
+@pytest.mark.parametrize('program, registers, P', [
+	([0x80], dict(A=0x01, B=0x02), True), # add: 0x03 has two bits set
+	([0x80], dict(A=0x01, B=0x01), False), # add: 0x02 is even, but has one bit set
+	([0xA0], dict(A=0xFF, B=0x07), False), # ana: 0x07
+])
+def test_parity_counts_bits(program, registers, P):
+	assert run_program(program, **registers).P == P
+
+
+@pytest.mark.parametrize('program, registers, AC', [
+	([0x80], dict(A=0x0F, B=0x01), True), # add: carry out of bit 3
+	([0x80], dict(A=0x07, B=0x01), False),
+	([0x88], dict(A=0x0E, B=0x01, CY=True), True), # adc
+	([0x90], dict(A=0x10, B=0x01), False), # sub: borrow into bit 4
+	([0x90], dict(A=0x11, B=0x01), True),
+	([0x04], dict(B=0x0F), True), # inr
+	([0x05], dict(B=0x10), False), # dcr
+	([0x05], dict(B=0x11), True),
+	([0xA0], dict(A=0x08, B=0x00), True), # ana: or of bit 3
+	([0xA8], dict(A=0x0F, B=0x01, AC=True), False), # xra clears AC
+])
+def test_half_carry(program, registers, AC):
+	assert run_program(program, **registers).AC == AC
+
+
+def bcd(value):
+	return ((value // 10) << 4) | (value % 10)
+
+
+def test_daa_adds_decimal():
+	# every pair of two-digit decimal numbers: add, then daa.
+	for a in range(100):
+		for b in range(100):
+			state = run_program([0x80, 0x27], A=bcd(a), B=bcd(b)) # add b; daa
+
+			assert state.A == bcd((a + b) % 100), f'{a} + {b}'
+			assert state.CY == (a + b >= 100), f'{a} + {b}'
+
+
+def test_daa_intel_example():
+	# from the 8080 manual: A = 0x9B becomes 0x01, with both carries set.
+	state = run_program([0x27], A=0x9B, CY=False, AC=False)
+
+	assert state.A == 0x01
+	assert state.CY and state.AC
@@ -0,0 +1,254 @@
+import pytest
+import numpy as np
+
+from emulator.state import State, initialize_state_from_rom
+from emulator.step import step, run
+from emulator.runner import run_state, StopReason
+from emulator.compiler import BlockEngine
+from emulator.memory import MemoryMap, WriteProtectionError, invaders_map, ALL_RAM, RAM, ROM, MIRROR, TRAP, PagedMemory
+
+from test.test_ops_base import get_initial_state
+
+
+def invaders_state(rom: bytes, rom_writes='ignore'):
+	return invaders_map(rom_writes).install(initialize_state_from_rom(rom))
+
+
+def test_flat_by_default():
+	state = State()
+	assert state.PAGES is ALL_RAM
+	assert state.MAP is None
+
+
+def test_invaders_layout():
+	memory = invaders_map()
+
+	assert memory.regions() == [
+		(0x0000, 0x2000, ROM, 0x0000),
+		(0x2000, 0x4000, RAM, 0x2000),
+		(0x4000, 0x6000, MIRROR, 0x2000),
+		(0x6000, 0x8000, MIRROR, 0x2000),
+		(0x8000, 0xA000, MIRROR, 0x2000),
+		(0xA000, 0xC000, MIRROR, 0x2000),
+		(0xC000, 0xE000, MIRROR, 0x2000),
+		(0xE000, 0x10000, MIRROR, 0x2000),
+	]
+	# the RAM and its mirrors are FAST: a mirror page is the RAM page itself.
+	assert [page for page in range(0x100) if memory.FAST[page]] == list(range(0x20, 0x100))
+	assert memory.mirrored and memory.resolve(0xE123) == 0x2123
+
+
+@pytest.mark.parametrize('engine', ['interpreter', 'compiled'])
+def test_ram_writes_reach_mirrors(engine):
+	state = invaders_state(bytes([
+		0x3E, 0x5A,       # mvi a, 0x5a
+		0x32, 0x05, 0x20, # sta 0x2005
+		0x21, 0x05, 0xE0, # lxi h, 0xe005
+		0x46,             # mov b, m
+		0x3A, 0x05, 0x60, # lda 0x6005
+	]))
+	if engine == 'interpreter': run(state, 5)
+	else: BlockEngine(state).run(5)
+
+	assert state.MEM[0x2005] == 0x5A
+	assert state.B == state.A == 0x5A # read through mirrors
+	for base in range(0x2000, 0x10000, 0x2000):
+		assert state.MEM[base + 0x05] == 0x5A
+
+
+def test_mirror_writes_reach_ram():
+	state = invaders_state(bytes([
+		0x21, 0x10, 0x43, # lxi h, 0x4310
+		0x36, 0xA5,       # mvi m, 0xa5
+	]))
+	run(state, 2)
+
+	assert state.MEM[0x2310] == state.MEM[0xE310] == 0xA5
+
+
+def test_install_links_mirrors():
+	state = State()
+	state.MEM[0x2100] = 0x42
+	state.MEM[0x4100] = 0x99 # dropped: a mirror shows its target
+	invaders_map().install(state)
+
+	assert isinstance(state.MEM, PagedMemory)
+	assert state.MEM.pages[0x41] is state.MEM.pages[0xC1] is state.MEM.pages[0x21]
+	assert state.MEM[0x4100] == state.MEM[0xC100] == 0x42
+	assert state.MEM.aliases(0x61) == tuple(range(0x21, 0x100, 0x20))
+
+	# mirrored memory stays paged; its mirrors are its pages.
+	assert state.flatten().MEM.pages[0x41] is state.MEM.pages[0x21]
+
+
+# puts code in RAM, then calls it through a mirror, rewrites it through
+# the RAM, and calls it again.
+CALL_THROUGH_MIRROR = bytes([
+	0x3E, 0x3C,       # 0x00 mvi a, 0x3c (inr a)
+	0x32, 0x00, 0x20, # 0x02 sta 0x2000
+	0x3E, 0xC9,       # 0x05 mvi a, 0xc9 (ret)
+	0x32, 0x01, 0x20, # 0x07 sta 0x2001
+	0x31, 0x00, 0x24, # 0x0A lxi sp, 0x2400
+	0x3E, 0x00,       # 0x0D mvi a, 0
+	0xCD, 0x00, 0x60, # 0x0F call 0x6000
+	0x47,             # 0x12 mov b, a
+	0x3E, 0x04,       # 0x13 mvi a, 0x04 (inr b)
+	0x32, 0x00, 0x20, # 0x15 sta 0x2000
+	0xCD, 0x00, 0x60, # 0x18 call 0x6000
+	0x76,             # 0x1B hlt
+])
+
+
+@pytest.mark.parametrize('engine', ['interpreter', 'compiled'])
+def test_code_runs_through_mirrors(engine):
+	state = invaders_state(CALL_THROUGH_MIRROR)
+	if engine == 'interpreter': run_state(state)
+	else: BlockEngine(state).run(100)
+
+	assert state.HALTED
+	assert (state.A, state.B) == (0x04, 0x02)
+
+
+def test_rom_writes_ignored():
+	rom = bytes([
+		0x3E, 0x5A,       # mvi a, 0x5a
+		0x32, 0x00, 0x00, # sta 0x0000
+		0x31, 0x01, 0x00, # lxi sp, 0x0001
+		0xF5,             # push psw
+	])
+	state = invaders_state(rom)
+	run(state, 4)
+
+	# the push straddles the top of memory: A goes to ROM at 0x0000 and
+	# is dropped, the flags land in the mirror at 0xFFFF and so in RAM.
+	assert state.MEM[:len(rom)] == rom
+	assert state.SP == 0xFFFF
+	assert state.MEM[0xFFFF] == state.MEM[0x3FFF] == state.processor_status_word()
+
+
+def test_rom_writes_trapped():
+	rom = bytes([
+		0x3E, 0x5A,       # 0x00 mvi a, 0x5a
+		0x32, 0x00, 0x10, # 0x02 sta 0x1000
+	])
+	state = invaders_state(rom, TRAP)
+	with pytest.raises(WriteProtectionError):
+		run(state, 2)
+
+	state = invaders_state(rom, TRAP)
+	result = run_state(state)
+
+	assert result.reason == StopReason.WRITE_PROTECTED
+	assert result.pc == 0x0002
+	assert result.steps == 1
+	assert result.opcode == 0x32
+	assert result.address == 0x1000
+	assert state.MEM[0x1000] == 0x00
+
+
+def test_device_writes():
+	writes = []
+	memory = MemoryMap()
+	memory.map_device(0x4000, 0x4100, lambda addr, value: writes.append((addr, value)))
+	memory.map_mirror(0x5000, 0x5200, 0x4000, 0x100)
+
+	state = memory.install(initialize_state_from_rom(bytes([
+		0x3E, 0x07,       # mvi a, 7
+		0x32, 0x02, 0x40, # sta 0x4002
+		0x32, 0x03, 0x51, # sta 0x5103
+	])))
+	run(state, 3)
+
+	assert writes == [(0x4002, 0x07), (0x4003, 0x07)]
+
+
+def test_map_validation():
+	memory = MemoryMap()
+	with pytest.raises(ValueError): memory.map_rom(0x0010, 0x0100)
+	with pytest.raises(ValueError): memory.map_ram(0x0000, 0x10100)
+	with pytest.raises(ValueError): memory.map_mirror(0x4000, 0x4300, 0x2000, 0x200)
+	with pytest.raises(ValueError): MemoryMap('sometimes')
+
+	memory.map_mirror(0x4000, 0x5000, 0x2000)
+	with pytest.raises(ValueError): memory.map_mirror(0x6000, 0x7000, 0x4000)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_engine_matches_interpreter_with_map(seed):
+	# random code, with most stores landing on ROM or mirrors.
+	np.random.seed(seed)
+	interpreted_state = invaders_map().install(get_initial_state())
+	compiled_state = interpreted_state.clone()
+
+	run(interpreted_state, 2000)
+	BlockEngine(compiled_state).run(2000)
+
+	assert interpreted_state == compiled_state
+	assert interpreted_state.CYCLES == compiled_state.CYCLES
+
+
+def test_clone_shares_pages():
+	state = get_initial_state()
+	memory = bytes(state.MEM)
+	clone = state.clone()
+
+	assert isinstance(state.MEM, PagedMemory) and isinstance(clone.MEM, PagedMemory)
+	assert all(page is other for page, other in zip(state.MEM.pages, clone.MEM.pages))
+	assert clone == state and clone.MEM.owned() == 0
+
+	clone.MEM[0x2345] = state.MEM[0x2345] ^ 0xFF
+	state.MEM[0x0010] = state.MEM[0x0010] ^ 0xFF
+	assert clone.MEM.owned() == 1 and state.MEM.owned() == 1
+	assert state.MEM[0x2345] == memory[0x2345] and clone.MEM[0x0010] == memory[0x0010]
+
+	# a clone of a clone shares with both; writes stay where they're made.
+	grandchild = clone.clone()
+	grandchild.MEM[0x2346] = 0x99
+	assert clone.MEM[0x2346] == memory[0x2346]
+	assert grandchild.MEM[0x2345] == clone.MEM[0x2345]
+
+
+def test_paged_slices():
+	memory = PagedMemory(bytes(range(256)) * 256)
+	other = memory.copy()
+
+	other[0x00F0:0x0210] = bytes(0x120)
+	assert other[0x00EF:0x0211] == bytearray([0xEF]) + bytes(0x120) + bytearray([0x10])
+	assert memory[0x00F0:0x0210] == (bytes(range(256)) * 3)[0xF0:0x210]
+	assert other.owned() == 3 # the pages the slice touched
+
+	with pytest.raises(ValueError): other[0:4] = bytes(3)
+	assert bytes(other) == other.tobytes() and len(other) == State.MEMSIZE
+	assert memory != other and memory == bytes(range(256)) * 256
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_clone_runs_like_a_copy(seed):
+	np.random.seed(seed)
+	state = get_initial_state()
+	copy = get_initial_state()
+	copy.MEM[:] = state.MEM
+
+	clone = state.clone()
+	run(clone, 2000)
+	run(copy, 2000)
+	assert clone == copy
+	assert bytes(state.MEM) != bytes(clone.MEM) or state.PC != clone.PC
+
+	engine = BlockEngine(state.clone())
+	engine.run(2000)
+	assert engine.state == copy
+	assert engine.state.flatten().MEM == copy.MEM and type(engine.state.MEM) is bytearray
+
+
+def test_clone_with_map():
+	state = invaders_state(bytes([0x3E, 0x42, 0x32, 0x00, 0x20, 0x76])) # mvi a, 0x42; sta 0x2000; hlt
+	clone = state.clone()
+	run_state(clone, max_steps=10)
+
+	assert clone.MEM[0x2000] == clone.MEM[0x4000] == 0x42
+	assert state.MEM[0x2000] == state.MEM[0x4000] == 0
+
+	# the page the clone copied is still one page under all its mirrors.
+	assert clone.MEM.pages[0x20] is clone.MEM.pages[0xE0] is not state.MEM.pages[0x20]
+	assert state.MEM.pages[0x20] is state.MEM.pages[0xE0]
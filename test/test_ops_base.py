@@ -8,7 +8,7 @@ from emulator.state import FlagsRegisters as F
 
 from emulator.opcodes import OPCODE_LIST
 
-from emulator.step import step
+from emulator.step import step, HLT_CODE
 
 
 def get_initial_state(flags=False):
@@ -27,7 +27,11 @@ def get_initial_state(flags=False):
 
 	if flags: state.FLAGS = np.ones_like(state.FLAGS, dtype=bool)
 
-	state.MEM = np.random.randint(0, 256, size=len(state.MEM), dtype=np.uint8)
+	# random programs should run their full length, rather than stop at the
+	# first hlt; so hlts become nops. tests of hlt write their own.
+	memory = np.random.randint(0, 256, size=len(state.MEM), dtype=np.uint8)
+	memory[memory == HLT_CODE] = 0x00
+	state.MEM[:] = memory.tobytes()
 
 	return state
 
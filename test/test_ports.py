@@ -0,0 +1,119 @@
+import pytest
+
+from emulator.state import initialize_state_from_rom
+from emulator.step import run
+from emulator.compiler import BlockEngine
+from emulator.runner import run_state, StopReason
+from emulator.ports import PortBus, ScriptedInput, InvadersIO, invaders_bus, OPEN_BUS, SOUNDS
+
+
+# the shift register as Space Invaders drives it: two bytes in, an
+# offset, and the shifted byte back out.
+SHIFT = bytes([
+	0x3E, 0xAB, # 0x00 mvi a, 0xab
+	0xD3, 0x04, # 0x02 out 4
+	0x3E, 0xCD, # 0x04 mvi a, 0xcd
+	0xD3, 0x04, # 0x06 out 4
+	0x3E, 0x03, # 0x08 mvi a, 3
+	0xD3, 0x02, # 0x0A out 2
+	0xDB, 0x03, # 0x0C in 3
+	0x47,       # 0x0E mov b, a
+	0xDB, 0x01, # 0x0F in 1
+	0x4F,       # 0x11 mov c, a
+	0xDB, 0x07, # 0x12 in 7
+	0x76,       # 0x14 hlt
+])
+
+
+def test_unmapped_ports():
+	state = initialize_state_from_rom(bytes([0xDB, 0x10, 0xD3, 0x10, 0x76]))
+	assert run_state(state).reason == StopReason.HALTED
+	assert state.A == OPEN_BUS
+
+
+def test_bus_dispatch():
+	written = []
+	bus = PortBus()
+	bus.map_in(0x10, lambda port: port + 1)
+	bus.map_out(0x10, lambda port, value: written.append((port, value)))
+
+	state = bus.install(initialize_state_from_rom(bytes([0xDB, 0x10, 0xD3, 0x10, 0x76])))
+	run_state(state)
+
+	assert state.A == 0x11
+	assert written == [(0x10, 0x11)]
+	assert state.BUS is bus and len(state.IN) == len(state.OUT) == 0x100
+
+
+@pytest.mark.parametrize('engine', ['interpreter', 'compiler'])
+def test_invaders_shift_register(engine):
+	bus = invaders_bus()
+	state = bus.install(initialize_state_from_rom(SHIFT))
+	bus.invaders.press('coin')
+
+	if engine == 'interpreter': run(state, 11)
+	else: BlockEngine(state).run(11)
+
+	assert state.B == (0xCDAB >> 5) & 0xFF
+	assert state.C == 0x09 # coin, and bit 3, which is always set
+	assert state.A == OPEN_BUS
+
+
+def test_clone_copies_devices():
+	bus = invaders_bus()
+	state = bus.install(initialize_state_from_rom(SHIFT))
+	run(state, 2) # mvi a, 0xab; out 4
+
+	# a byte shifted in on the original doesn't reach the clone's register.
+	clone = state.clone()
+	state.OUT[4](4, 0x12)
+	run(clone, 9)
+
+	assert clone.B == (0xCDAB >> 5) & 0xFF
+	assert bus.invaders.shift == 0x12AB
+	assert clone.BUS is not bus and clone.BUS.invaders is not bus.invaders
+	assert clone.OUT[4].__self__ is clone.BUS.invaders
+
+
+@pytest.mark.parametrize('offset', range(8))
+def test_shift_offsets(offset):
+	device = InvadersIO()
+	device.write_shift(4, 0x12)
+	device.write_shift(4, 0x34)
+	device.write_offset(2, offset | 0xF8)
+
+	assert device.read_shift(3) == ((0x3412 << offset) >> 8) & 0xFF
+
+
+def test_buttons_and_switches():
+	device = InvadersIO(ships=5, extra_ship_at=1000, coin_info=False)
+	assert device.read_port2(2) == 0x02 | 0x08 | 0x80
+
+	device.press('p2_fire')
+	device.press('p1_left')
+	assert device.read_port2(2) & 0x10 and device.read_port1(1) & 0x20
+
+	device.release('p1_left')
+	assert device.read_port1(1) == 0x08
+
+	with pytest.raises(ValueError): InvadersIO(ships=7)
+
+
+def test_sound_strobes():
+	started = []
+	device = InvadersIO(on_sound=started.append)
+
+	device.write_sound(3, 0x02)
+	device.write_sound(3, 0x03) # shot is still on; only the ufo starts
+	device.write_sound(5, 0x11)
+
+	assert started == ['shot', 'ufo', 'fleet_1', 'ufo_hit']
+	assert set(device.playing()) == { 'ufo', 'shot', 'fleet_1', 'ufo_hit' }
+
+
+def test_scripted_input():
+	script = ScriptedInput({ 1: [1, 2] })
+	assert [script.read(1) for _ in range(3)] == [1, 2, 2]
+
+	script.write(5, 0x40)
+	assert script.written == { 5: [0x40] }
@@ -0,0 +1,101 @@
+import os
+import pytest
+
+from emulator.state import initialize_state_from_rom
+from emulator.rom import open_rom, open_segments, open_image, open_intel_hex, Segment, INVADERS_SEGMENTS
+
+
+def hex_record(address: int, kind: int, payload: bytes = b''):
+	record = bytes([len(payload), address >> 8, address & 0xFF, kind]) + payload
+	return ':' + (record + bytes([-sum(record) & 0xFF])).hex().upper()
+
+
+def test_raw_rom_at_base(tmp_path):
+	path = tmp_path / 'rom.bin'
+	path.write_bytes(bytes(range(1, 17)))
+
+	state = open_rom(str(path), 0x0100).to_state()
+	assert state.MEM == initialize_state_from_rom(bytes(range(1, 17)), 0x0100).MEM
+	assert state.MEM[0x00FF] == 0 and state.MEM[0x0100] == 1 and state.MEM[0x010F] == 16
+
+
+def test_segments_are_read_only(tmp_path):
+	path = tmp_path / 'rom.bin'
+	path.write_bytes(b'\x01\x02')
+	segment = open_rom(str(path)).segments[0]
+
+	with pytest.raises(TypeError):
+		segment.data[0] = 0xFF
+
+
+def test_split_image(tmp_path):
+	for index, (name, base) in enumerate(INVADERS_SEGMENTS):
+		(tmp_path / name).write_bytes(bytes([index + 1]) * 0x800)
+
+	image = open_image(str(tmp_path))
+	state = image.to_state()
+
+	assert len(image) == 0x2000
+	assert image.pages() == list(range(0x20))
+	for index, (name, base) in enumerate(INVADERS_SEGMENTS):
+		assert state.MEM[base:base + 0x800] == bytes([index + 1]) * 0x800
+	assert state.MEM[0x2000] == 0
+
+
+def test_intel_hex(tmp_path):
+	path = tmp_path / 'rom.hex'
+	path.write_text('\n'.join([
+		hex_record(0x0000, 0x00, b'\x3E\x01'),
+		hex_record(0x0002, 0x00, b'\x76'), # contiguous: same segment
+		hex_record(0x1000, 0x00, b'\xAA\xBB'),
+		hex_record(0x0000, 0x01),
+		hex_record(0x2000, 0x00, b'\xCC'), # after end of file
+	]) + '\n')
+
+	image = open_image(str(path))
+	state = image.to_state()
+
+	assert [(segment.base, bytes(segment.data)) for segment in image.segments] == [(0x0000, b'\x3E\x01\x76'), (0x1000, b'\xAA\xBB')]
+	assert state.MEM[0x0000:0x0003] == b'\x3E\x01\x76'
+	assert state.MEM[0x1000:0x1002] == b'\xAA\xBB'
+	assert state.MEM[0x2000] == 0
+
+
+def test_intel_hex_bad_checksum(tmp_path):
+	path = tmp_path / 'rom.hex'
+	path.write_text(hex_record(0x0000, 0x00, b'\x00')[:-2] + '00\n')
+
+	with pytest.raises(ValueError):
+		open_intel_hex(str(path))
+
+
+def test_segment_must_fit():
+	with pytest.raises(ValueError):
+		Segment(0xFFFF, b'\x00\x00')
+
+
+def test_cache(tmp_path):
+	path = tmp_path / 'rom.bin'
+	path.write_bytes(b'\x01\x02')
+
+	image = open_rom(str(path))
+	checksum = image.sha256
+	assert open_rom(str(path)) is image
+	assert open_rom(str(path), 0x10) is not image
+
+	# a rewritten file is mapped again.
+	path.write_bytes(b'\x03\x04\x05')
+	os.utime(path, ns=(0, 0))
+	changed = open_rom(str(path))
+
+	assert changed is not image
+	assert bytes(changed.segments[0].data) == b'\x03\x04\x05'
+	assert changed.sha256 != checksum
+
+
+def test_empty_rom(tmp_path):
+	path = tmp_path / 'empty.bin'
+	path.write_bytes(b'')
+
+	assert len(open_rom(str(path))) == 0
+	assert open_rom(str(path)).to_state().MEM == bytearray(0x10000)
@@ -0,0 +1,55 @@
+import pytest
+
+from emulator.state import initialize_state_from_rom
+
+from emulator.step import run as run_steps
+from emulator.runner import run, StopReason
+
+
+# b counts up to 0 and wraps; then the program halts.
+COUNTDOWN = bytes([
+	0x06, 0x00,       # 0x00 mvi b, 0
+	0x04,             # 0x02 inr b
+	0xC2, 0x02, 0x00, # 0x03 jnz 0x0002
+	0x76,             # 0x06 hlt
+])
+
+
+def test_run_until_halt():
+	result = run(COUNTDOWN)
+
+	assert result.reason == StopReason.HALTED
+	assert result.pc == 0x0007
+	assert result.steps == 1 + 256 * 2 + 1
+	assert result.cycles == 7 + 256 * (5 + 10) + 7
+	assert result.opcode is None
+
+
+def test_run_until_pc():
+	result = run(COUNTDOWN, until_pc=[0x0006, 0x1234])
+
+	assert result.reason == StopReason.BREAKPOINT
+	assert result.pc == 0x0006
+	assert result.state.B == 0x00
+
+
+@pytest.mark.parametrize('max_steps', [0, 1, 100, 5000])
+def test_step_budget(max_steps):
+	result = run(bytes(2), max_steps=max_steps)
+	stepped_state = initialize_state_from_rom(bytes(2))
+	run_steps(stepped_state, max_steps)
+	stepped_state.RUN = False
+
+	assert result.reason == StopReason.BUDGET
+	assert result.steps == max_steps
+	assert result.state == stepped_state
+
+
+@pytest.mark.parametrize('max_cycles', [1, 4, 5, 4097 * 4])
+def test_cycle_budget(max_cycles):
+	# nops are 4 cycles; the run stops at the first op at or past the budget.
+	result = run(bytes(2), max_cycles=max_cycles)
+
+	assert result.reason == StopReason.BUDGET
+	assert result.cycles >= max_cycles
+	assert result.cycles - 4 < max_cycles
@@ -0,0 +1,300 @@
+import pytest
+
+from emulator.state import initialize_state_from_rom
+from emulator.runner import run_state, StopReason
+from emulator.step import step, run, run_cycles
+from emulator.compiler import BlockEngine
+from emulator.scheduler import Scheduler, interrupt, invaders_events, FRAME_CYCLES
+
+
+# a main loop that spins, and interrupt handlers at rst 1 and rst 2 that
+# count into c and b.
+SPIN = bytearray(0x40)
+SPIN[0x00:0x05] = bytes([0x31, 0x00, 0x24, 0xFB, 0x00]) # lxi sp, 0x2400; ei; nop
+SPIN[0x05:0x08] = bytes([0xC3, 0x04, 0x00])             # jmp 0x0004
+SPIN[0x08:0x0B] = bytes([0x0C, 0xFB, 0xC9])             # rst 1: inr c; ei; ret
+SPIN[0x10:0x13] = bytes([0x04, 0xFB, 0xC9])             # rst 2: inr b; ei; ret
+
+
+def test_events_fire_in_order():
+	state = initialize_state_from_rom(b'')
+	events = Scheduler()
+	events.install(state)
+	fired = []
+
+	events.at(30, lambda state, cycle: fired.append(('b', cycle)))
+	events.at(10, lambda state, cycle: fired.append(('a', cycle)))
+	events.at(30, lambda state, cycle: fired.append(('c', cycle)))
+	cancelled = events.at(20, lambda state, cycle: fired.append(('x', cycle)))
+	events.cancel(cancelled)
+	assert events.deadline == 10 and len(events) == 3
+
+	state.CYCLES = 25
+	events.run_due(state)
+	assert fired == [('a', 10)]
+	assert events.deadline == 30
+
+	state.CYCLES = 40
+	events.run_due(state)
+	assert fired == [('a', 10), ('b', 30), ('c', 30)]
+	assert events.deadline == float('inf')
+
+
+def test_every():
+	state = initialize_state_from_rom(b'')
+	events = Scheduler()
+	events.install(state)
+	fired = []
+	events.every(100, lambda state, cycle: fired.append(cycle))
+
+	state.CYCLES = 350
+	events.run_due(state)
+	assert fired == [100, 200, 300]
+	assert events.deadline == 400
+
+
+def test_interrupt_acknowledge():
+	state = initialize_state_from_rom(b'')
+	state.PC, state.SP = 0x1234, 0x2400
+
+	assert interrupt(state, 2)
+	assert (state.PC, state.SP) == (0x0010, 0x23FE)
+	assert (state.MEM[0x23FF], state.MEM[0x23FE]) == (0x12, 0x34)
+	assert state.DI # until the handler enables them again
+	assert state.CYCLES == 11
+
+	assert not interrupt(state, 1)
+	assert state.PC == 0x0010
+
+
+def test_interrupts_during_a_run():
+	state = initialize_state_from_rom(bytes(SPIN))
+	events = Scheduler()
+	events.install(state)
+	events.every(1000, lambda state, cycle: interrupt(state, 2))
+
+	result = run_state(state, max_cycles=10_500)
+
+	assert result.reason == StopReason.BUDGET
+	assert state.B == 10
+	assert state.SP == 0x2400 # every handler returned
+
+
+def test_interrupts_wait_for_ei():
+	state = initialize_state_from_rom(bytes(SPIN))
+	state.DI = True
+	events = Scheduler()
+	events.install(state)
+	events.at(0, lambda state, cycle: interrupt(state, 2))
+
+	# the first event is due before ei runs, and is dropped.
+	run_state(state, max_cycles=2000)
+	assert state.B == 0
+
+	# one due while ei runs waits until the op after it.
+	state = initialize_state_from_rom(bytes(SPIN))
+	events = Scheduler()
+	events.install(state)
+	events.at(11, lambda state, cycle: interrupt(state, 2)) # lxi is 10 cycles; ei ends at 14
+	run_state(state, max_steps=3)
+	assert state.PC == 0x0010
+	assert (state.MEM[0x23FF], state.MEM[0x23FE]) == (0x00, 0x05) # after the nop
+
+
+def test_invaders_interrupts():
+	state = initialize_state_from_rom(bytes(SPIN))
+	events = invaders_events(state)
+
+	run_state(state, max_cycles=3 * FRAME_CYCLES + 100)
+
+	assert events.video.frames == 3
+	assert (state.C, state.B) == (3, 3)
+	assert events.video.missed == 0
+
+
+def test_clone_keeps_its_own_events():
+	state = initialize_state_from_rom(b'')
+	events = Scheduler()
+	events.install(state)
+	fired = []
+	events.every(1000, lambda state, cycle: fired.append((state, cycle)))
+
+	clone = state.clone()
+	assert clone.EVENTS is not events and clone.EVENTS.state is clone
+	clone.CYCLES = 5000
+	clone.EVENTS.run_due(clone)
+	clone.EVENTS.after(10, lambda state, cycle: fired.append((state, cycle)))
+
+	# the clone fired its own copies; the parent's are still pending.
+	assert fired == [(clone, cycle) for cycle in (1000, 2000, 3000, 4000, 5000)]
+	assert clone.EVENTS.deadline == 5010
+	assert events.deadline == 1000 and len(events) == 1 and events.state is state
+
+
+def test_clone_copies_the_video():
+	state = initialize_state_from_rom(bytes(SPIN))
+	events = invaders_events(state)
+	run_state(state, max_cycles=FRAME_CYCLES + 100)
+
+	clone = state.clone()
+	run_state(clone, max_cycles=2 * FRAME_CYCLES)
+
+	assert clone.EVENTS.video is not events.video and clone.EVENTS.video.events is clone.EVENTS
+	assert (clone.EVENTS.video.frames, clone.C, clone.B) == (3, 3, 3)
+	assert (events.video.frames, state.C, state.B) == (1, 1, 1)
+	assert events.deadline == FRAME_CYCLES + FRAME_CYCLES // 2
+
+
+# the same handlers, with a main loop that halts until the next interrupt.
+SLEEP = bytearray(SPIN)
+SLEEP[0x04:0x08] = bytes([0x76, 0xC3, 0x04, 0x00]) # hlt; jmp 0x0004
+
+
+def test_halt_without_events():
+	state = initialize_state_from_rom(bytes(SLEEP))
+	result = run_state(state)
+
+	assert result.reason == StopReason.HALTED
+	assert state.HALTED and result.pc == 0x0005
+	assert result.steps == 3
+
+
+def test_halt_waits_for_interrupts():
+	state = initialize_state_from_rom(bytes(SLEEP))
+	events = invaders_events(state)
+
+	result = run_state(state, max_cycles=60 * FRAME_CYCLES + 100)
+
+	assert result.reason == StopReason.BUDGET
+	assert result.cycles == 60 * FRAME_CYCLES + 100
+	assert events.video.frames == 60
+	assert (state.C, state.B) == (60, 60)
+	# lxi, ei and hlt, then five per interrupt: the handler's three, then jmp and hlt.
+	assert result.steps == 3 + 120 * 5
+	assert state.HALTED
+
+
+def test_halt_with_interrupts_disabled():
+	state = initialize_state_from_rom(bytes(SLEEP))
+	state.MEM[0x03] = 0x00 # no ei
+	state.DI = True
+	invaders_events(state)
+
+	result = run_state(state, max_cycles=10 * FRAME_CYCLES)
+
+	assert result.reason == StopReason.HALTED
+	assert result.cycles < 100
+
+
+def test_resume_while_halted():
+	state = initialize_state_from_rom(bytes(SLEEP))
+	events = invaders_events(state)
+	run_state(state, max_cycles=FRAME_CYCLES // 4)
+	assert state.HALTED
+
+	run_state(state, max_cycles=FRAME_CYCLES)
+	assert events.video.frames == 1
+	assert state.HALTED and state.PC == 0x0005
+
+
+
+def test_step_and_run_service_events():
+	state = initialize_state_from_rom(bytes(SPIN))
+	events = Scheduler()
+	events.install(state)
+	events.every(1000, lambda state, cycle: interrupt(state, 2))
+
+	while state.CYCLES < 3500: step(state)
+	assert state.B == 3
+
+	state = initialize_state_from_rom(bytes(SPIN))
+	events = Scheduler()
+	events.install(state)
+	events.every(1000, lambda state, cycle: interrupt(state, 2))
+
+	run(state, 1000)
+	assert state.B == state.CYCLES // 1000 > 0
+	assert state.SP in (0x2400, 0x23FE)
+
+
+def test_run_cycles_services_events():
+	state = initialize_state_from_rom(bytes(SPIN))
+	events = invaders_events(state)
+
+	run_cycles(state, 3 * FRAME_CYCLES + 100)
+
+	assert events.video.frames == 3
+	assert (state.C, state.B) == (3, 3)
+
+
+def test_run_cycles_wakes_a_halted_cpu():
+	state = initialize_state_from_rom(bytes(SLEEP))
+	events = invaders_events(state)
+
+	assert run_cycles(state, 10 * FRAME_CYCLES + 100) == 10 * FRAME_CYCLES + 100
+	assert events.video.frames == 10
+	assert (state.C, state.B) == (10, 10)
+	assert state.HALTED and state.PC == 0x0005
+
+
+def test_block_engine_services_events():
+	expected = initialize_state_from_rom(bytes(SPIN))
+	invaders_events(expected)
+	run(expected, 20_000)
+
+	state = initialize_state_from_rom(bytes(SPIN))
+	invaders_events(state)
+	BlockEngine(state).run(20_000)
+
+	assert (state.C, state.B) == (expected.C, expected.B) != (0, 0)
+	assert (state.PC, state.SP, state.CYCLES) == (expected.PC, expected.SP, expected.CYCLES)
+
+
+# rst 2 sets a flag at 0x2000 that the main loop polls for; each time it
+# sees it, it clears it, counts the frame in d, and does a little work.
+POLL = bytearray(0x40)
+POLL[0x00:0x07] = bytes([0x31, 0x00, 0x24, 0xFB, 0xC3, 0x20, 0x00])       # lxi sp, 0x2400; ei; jmp 0x0020
+POLL[0x08:0x0A] = bytes([0xFB, 0xC9])                                     # rst 1: ei; ret
+POLL[0x10:0x19] = bytes([0xF5, 0x3E, 0x01, 0x32, 0x00, 0x20, 0xF1, 0xFB, 0xC9]) # rst 2: push psw; mvi a, 1; sta 0x2000; pop psw; ei; ret
+POLL[0x20:0x27] = bytes([0x3A, 0x00, 0x20, 0xB7, 0xCA, 0x20, 0x00])       # lda 0x2000; ora a; jz 0x0020
+POLL[0x27:0x2E] = bytes([0xAF, 0x32, 0x00, 0x20, 0x14, 0x0E, 0x64])       # xra a; sta 0x2000; inr d; mvi c, 100
+POLL[0x2E:0x34] = bytes([0x0D, 0xC2, 0x2E, 0x00, 0xC3, 0x20, 0x00])       # dcr c; jnz 0x002e; jmp 0x0020
+
+
+@pytest.mark.parametrize('skip_idle', [True, False])
+def test_idle_loops(skip_idle):
+	state = initialize_state_from_rom(bytes(POLL))
+	events = invaders_events(state)
+
+	result = run_state(state, max_cycles=30 * FRAME_CYCLES + 1000, skip_idle=skip_idle)
+
+	assert result.reason == StopReason.BUDGET
+	# within an op of the budget; an interrupt taken right at the end can add its rst.
+	assert 30 * FRAME_CYCLES + 1000 - 18 < result.cycles <= 30 * FRAME_CYCLES + 1000 + 11
+	assert events.video.frames == 30
+	assert state.D == 30
+
+	if skip_idle: assert result.idle_cycles > 0.8 * result.cycles
+	else: assert result.idle_cycles == 0
+
+
+def test_loops_that_are_not_idle():
+	# the work loop counts c down, so it's never skipped; nor is a loop that stores.
+	state = initialize_state_from_rom(bytes(POLL))
+	state.MEM[0x05] = 0x2E # jmp 0x002e
+	state.MEM[0x2E:0x35] = bytes([0x0D, 0xC2, 0x2E, 0x00, 0xC3, 0x2E, 0x00]) # dcr c; jnz 0x002e; jmp 0x002e
+	invaders_events(state)
+	assert run_state(state, max_cycles=3 * FRAME_CYCLES).idle_cycles == 0
+
+	state = initialize_state_from_rom(bytes(POLL))
+	state.MEM[0x20:0x26] = bytes([0x32, 0x00, 0x21, 0xC3, 0x20, 0x00]) # sta 0x2100; jmp 0x0020
+	invaders_events(state)
+	assert run_state(state, max_cycles=3 * FRAME_CYCLES).idle_cycles == 0
+
+
+def test_no_idle_skipping_while_debugging():
+	state = initialize_state_from_rom(bytes(POLL))
+	invaders_events(state)
+	result = run_state(state, max_cycles=3 * FRAME_CYCLES, until_pc=0x3000)
+
+	assert result.idle_cycles == 0
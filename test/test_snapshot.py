@@ -0,0 +1,132 @@
+import pytest
+import numpy as np
+
+from emulator.state import State, initialize_state_from_rom
+from emulator.step import run
+from emulator.runner import run_state
+from emulator.memory import invaders_map
+from emulator.ports import invaders_bus
+from emulator.scheduler import invaders_events, FRAME_CYCLES
+from emulator.snapshot import save_state, load_state, open_snapshot, SnapshotError, HEADER, NONE, ZLIB, LZMA
+from emulator.farm import farm
+
+from test.test_ops_base import get_initial_state
+from test.test_scheduler import SPIN
+
+
+@pytest.mark.parametrize('compression', [NONE, ZLIB, LZMA])
+def test_round_trip(tmp_path, compression):
+	np.random.seed(1)
+	state = get_initial_state()
+	run(state, 100) # leaves flags pending
+	state.HALTED = True
+
+	path = tmp_path / 'state.sav'
+	save_state(state, path, compression)
+	loaded = load_state(path)
+
+	assert loaded == state
+	assert loaded.CYCLES == state.CYCLES
+	assert loaded.HALTED and loaded.LAZY == 0
+	if compression == NONE: assert path.stat().st_size == HEADER.size + State.MEMSIZE + len(b'[]')
+
+	state.MEM[0x2000:] = bytes(State.MEMSIZE - 0x2000) # RAM is mostly zeros
+	save_state(state, path, compression)
+	assert load_state(path) == state
+	if compression != NONE: assert path.stat().st_size < HEADER.size + 0x4000
+
+
+def test_mapped(tmp_path):
+	np.random.seed(2)
+	state = get_initial_state()
+	path = tmp_path / 'state.sav'
+	save_state(state, path)
+
+	snapshot = open_snapshot(path)
+	assert snapshot.memory == state.MEM
+	assert snapshot.memory.readonly
+	assert snapshot.pc == state.PC
+	assert snapshot.to_state() == state
+
+	save_state(state, path, ZLIB)
+	with pytest.raises(SnapshotError): open_snapshot(path)
+
+
+@pytest.mark.parametrize('compression', [NONE, ZLIB])
+def test_load_keeps_mirrors(tmp_path, compression):
+	state = invaders_map().install(initialize_state_from_rom(b''))
+	state.MEM[0x4123] = 0x5A
+	path = tmp_path / 'state.sav'
+	save_state(state, path, compression)
+
+	loaded = invaders_map().install(State())
+	load_state(path, loaded)
+	assert loaded.MEM[0x2123] == loaded.MEM[0xE123] == 0x5A
+
+	loaded.MEM[0x2123] = 0xA5 # still one page under every mirror
+	assert loaded.MEM[0x6123] == 0xA5
+
+
+def test_bad_files(tmp_path):
+	path = tmp_path / 'state.sav'
+	save_state(State(), path)
+	data = bytearray(path.read_bytes())
+
+	path.write_bytes(b'not a save state')
+	with pytest.raises(SnapshotError): load_state(path)
+
+	data[8] = 99 # version
+	path.write_bytes(data)
+	with pytest.raises(SnapshotError): load_state(path)
+
+	data[8] = 1
+	path.write_bytes(data[:1000])
+	with pytest.raises(SnapshotError): load_state(path)
+
+
+def invaders(rom: bytes):
+	state = initialize_state_from_rom(rom)
+	invaders_map().install(state)
+	invaders_bus().install(state)
+	invaders_events(state)
+	return state
+
+
+def test_devices_and_interrupts(tmp_path):
+	# run a few frames, save mid-frame, and carry on both from there.
+	state = invaders(bytes(SPIN))
+	state.BUS.invaders.write_shift(4, 0x5A)
+	state.BUS.invaders.press('coin')
+	run_state(state, max_cycles=int(2.3 * FRAME_CYCLES))
+
+	path = tmp_path / 'state.sav'
+	save_state(state, path)
+	loaded = load_state(path, invaders(b''))
+
+	assert loaded == state
+	assert loaded.BUS.invaders.save() == state.BUS.invaders.save()
+	assert loaded.EVENTS.video.frames == 2
+	assert loaded.EVENTS.deadline == state.EVENTS.deadline
+
+	run_state(state, max_cycles=3 * FRAME_CYCLES)
+	run_state(loaded, max_cycles=3 * FRAME_CYCLES)
+	assert loaded == state
+	assert loaded.CYCLES == state.CYCLES
+	assert loaded.EVENTS.video.frames == state.EVENTS.video.frames == 5
+
+	# a machine built differently can't take the devices.
+	bare = initialize_state_from_rom(b'')
+	invaders_events(bare)
+	with pytest.raises(SnapshotError): load_state(path, bare)
+
+
+def test_farm_from_snapshot(tmp_path):
+	state = initialize_state_from_rom(bytes([0x04, 0xC3, 0x00, 0x00])) # inr b; jmp 0
+	run_state(state, max_steps=100)
+	path = tmp_path / 'state.sav'
+	save_state(state, path)
+
+	results = list(farm([{ 'snapshot': str(path), 'max_steps': 100 }], workers=1))
+
+	assert results[0]['registers']['B'] == 100
+	assert results[0]['steps'] == 100
@@ -0,0 +1,126 @@
+import pytest
+import numpy as np
+
+from emulator.state import State
+from emulator.state import Uint16Registers as U16
+from emulator.state import Uint8Registers as U8
+from emulator.state import FlagsRegisters as F
+
+from emulator.opcodes import ALIAS_OPCODE_LIST
+
+from emulator.step import step, run, run_cycles, decode_op, OPS, DISPATCH_TABLE
+from emulator.cycles import CYCLES_TAKEN
+
+from test.test_ops_base import get_initial_state, get_op_name
+
+
+CANONICAL_CODES = { '*nop': 0x00, '*jmp': 0xC3, '*ret': 0xC9, '*call': 0xCD }
+
+
+def halting_state():
+	# hlt, then inr a three times: nothing after the hlt should run.
+	state = get_initial_state()
+	state.MEM[0x0:0x4] = bytes([0x76, 0x3C, 0x3C, 0x3C])
+	state.A = 0
+	return state
+
+
+def test_dispatch_table_is_dense():
+	assert len(OPS) == 256
+	assert len(DISPATCH_TABLE) == 256
+	assert all(op.code == code for code, op in enumerate(OPS))
+
+
+@pytest.mark.parametrize('op', ALIAS_OPCODE_LIST, ids=get_op_name)
+def test_alias_op(op):
+	alias_state = get_initial_state()
+	alias_state.MEM[0x0] = op.code
+
+	canonical_state = alias_state.clone()
+	canonical_state.MEM[0x0] = CANONICAL_CODES[op.name]
+
+	step(alias_state)
+	step(canonical_state)
+	canonical_state.MEM[0x0] = op.code
+
+	assert alias_state == canonical_state, f'{op.name} does not behave like {op.name[1:]}'
+
+
+def test_run_matches_step():
+	# a random program will wander through every kind of op.
+	stepped_state = get_initial_state()
+	run_state = stepped_state.clone()
+
+	for _ in range(1000): step(stepped_state)
+	run(run_state, 1000)
+
+	assert stepped_state == run_state
+
+
+@pytest.mark.parametrize('code, taken, cycles', [
+	(0xC0, True, 11), (0xC0, False, 5), # rnz
+	(0xC4, True, 17), (0xC4, False, 11), # cnz
+	(0xC2, True, 10), (0xC2, False, 10), # jnz
+	(0xC9, True, 10), (0xCD, True, 17), # ret, call
+])
+def test_conditional_cycles(code, taken, cycles):
+	state = get_initial_state()
+	state.MEM[0x0] = code
+	state.Z = not taken
+	state.CYCLES = 0
+
+	step(state)
+
+	assert state.CYCLES == cycles
+
+
+def test_run_counts_cycles():
+	stepped_state = get_initial_state()
+	run_state = stepped_state.clone()
+
+	for _ in range(1000): step(stepped_state)
+	run(run_state, 1000)
+
+	assert stepped_state.CYCLES == run_state.CYCLES > 0
+
+
+@pytest.mark.parametrize('budget', [1, 17, 18, 19, 1000, 33333])
+def test_run_cycles(budget):
+	state = get_initial_state()
+	stepped_state = state.clone()
+
+	used = run_cycles(state, budget)
+
+	# the same instructions, one at a time, stopping at the first
+	# instruction boundary at or past the budget.
+	while stepped_state.CYCLES < budget: step(stepped_state)
+
+	assert used == state.CYCLES >= budget
+	assert used - budget < max(CYCLES_TAKEN)
+	assert state == stepped_state
+
+
+def test_step_stops_at_hlt():
+	state = halting_state()
+
+	for _ in range(4): step(state)
+
+	assert state.HALTED and state.PC == 0x1 and state.A == 0
+
+
+def test_run_stops_at_hlt():
+	state = halting_state()
+
+	assert run(state, 20) == 1
+	assert state.HALTED and state.PC == 0x1 and state.A == 0
+	assert run(state, 20) == 0
+
+
+def test_run_cycles_idles_when_halted():
+	state = halting_state()
+	state.CYCLES = 0
+
+	# the halted cpu burns the rest of the budget without fetching.
+	assert run_cycles(state, 20) == 20
+	assert state.HALTED and state.PC == 0x1 and state.A == 0
+	assert run_cycles(state, 20) == 20 and state.PC == 0x1
@@ -0,0 +1,251 @@
+import pytest
+import numpy as np
+
+from emulator.state import State, initialize_state_from_rom
+from emulator.step import step
+from emulator.memory import invaders_map, ALL_RAM
+from emulator.trace import Trace, RingTrace, StateDiff, WriteLog
+
+from test.test_ops_base import get_initial_state
+
+
+def snapshot(state: State):
+	return (state.A, state.B, state.C, state.D, state.E, state.H, state.L, state.SP, state.PC,
+		tuple(state.FLAGS), state.HALTED, state.CYCLES, bytes(state.MEM))
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_steps_back_to_every_state(seed):
+	np.random.seed(seed)
+	trace = Trace(get_initial_state())
+	state = trace.current_state()
+
+	seen = [snapshot(state)]
+	for _ in range(500):
+		trace.step_forward()
+		seen.append(snapshot(state))
+
+	for expected in reversed(seen[:-1]):
+		trace.step_backward()
+		assert snapshot(state) == expected
+
+	trace.step_backward() # nothing left to undo
+	assert snapshot(state) == seen[0]
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_logged_diffs_match_full_comparison(seed):
+	np.random.seed(seed)
+	trace = Trace(get_initial_state())
+	before = trace.current_state().clone()
+
+	for _ in range(200):
+		trace.step_forward()
+		after = trace.current_state().clone()
+		logged, compared = trace.diffs[-1], StateDiff.between(before, after)
+
+		assert logged.registers == compared.registers
+		assert logged.cycles == compared.cycles
+		assert { addr: new for addr, old, new in logged.memory if old != new } == { addr: new for addr, old, new in compared.memory }
+
+		assert logged.apply(before) == after and before.CYCLES == after.CYCLES
+		before = after
+
+
+def test_writes_through_mirrors():
+	# lxi sp, 0x4400 (a mirror of 0x2400); push b
+	state = invaders_map().install(initialize_state_from_rom(bytes([0x31, 0x00, 0x44, 0xC5])))
+	state.B, state.C = 0x12, 0x34
+	trace = Trace(state)
+
+	trace.step_forward()
+	trace.step_forward()
+	# the push went through the mirror, and is logged where it landed.
+	written = { addr for addr, old, new in trace.diffs[-1].memory }
+	assert written == { 0x23FE, 0x23FF }
+	assert state.MEM[0x23FF] == state.MEM[0x63FF] == 0x12
+
+	trace.step_backward()
+	assert state.MEM[0x23FF] == state.MEM[0x63FF] == 0
+	assert state.SP == 0x4400
+
+
+def test_seek_through_mirrors():
+	state = invaders_map().install(initialize_state_from_rom(bytes([
+		0x21, 0x00, 0x40, # 0x00 lxi h, 0x4000
+		0x34,             # 0x03 inr m
+		0x23,             # 0x04 inx h
+		0xC3, 0x03, 0x00, # 0x05 jmp 0x0003
+	])))
+	trace = Trace(state, keyframe_interval=64)
+	ring = RingTrace(state.clone(), window_steps=100)
+	state = trace.current_state()
+
+	seen = [snapshot(state)]
+	for _ in range(600):
+		trace.step_forward()
+		ring.step_forward()
+		seen.append(snapshot(state))
+
+	# keyframes logged the RAM pages; restoring them leaves no stale mirror.
+	for target in [0, 300, 599, 65, 1]:
+		trace.seek(target)
+		assert snapshot(state) == seen[target]
+
+	ring.restore()
+	assert snapshot(ring.current_state()) == seen[ring.start]
+
+
+def test_write_log_detaches():
+	state = State()
+	log = WriteLog(state)
+	state.MAP.write(state.MEM, 0x10, 0x55)
+	assert log.take() == ((0x10, 0x00, 0x55),)
+	assert log.take() == ()
+
+	log.detach()
+	assert state.MAP is None and state.PAGES is ALL_RAM
+
+
+@pytest.mark.parametrize('keyframes', [{ 'keyframe_interval': 64 }, { 'keyframe_interval': 10 ** 9, 'keyframe_bytes': 16 }])
+def test_seek(keyframes):
+	np.random.seed(5)
+	trace = Trace(get_initial_state(), **keyframes)
+	state = trace.current_state()
+
+	seen = [snapshot(state)]
+	for _ in range(1000):
+		trace.step_forward()
+		seen.append(snapshot(state))
+
+	assert len(trace.keyframes) > 10
+	assert trace.keyframe_steps == sorted(trace.keyframe_steps)
+
+	for target in [0, 999, 500, 501, 499, 1000, 3, 640, 641, 17]:
+		trace.seek(target)
+		assert trace.position == target
+		assert snapshot(state) == seen[target]
+
+	# stepping on from a seek replays what's recorded, then records more.
+	trace.seek(998)
+	trace.step_forward()
+	trace.step_forward()
+	trace.step_forward()
+	assert trace.position == 1001 and len(trace.diffs) == 1001
+	trace.step_backward()
+	assert snapshot(state) == seen[1000]
+
+	trace.seek(1200)
+	assert len(trace.diffs) == 1200
+	with pytest.raises(ValueError): trace.seek(-1)
+
+
+def test_keyframes_share_pages():
+	np.random.seed(6)
+	trace = Trace(get_initial_state(), keyframe_interval=8)
+	for _ in range(200): trace.step_forward()
+
+	first, last = trace.keyframes[0][2], trace.keyframes[-1][2]
+	shared = sum(page is other for page, other in zip(first.pages, last.pages))
+	assert shared > 200 # a few hundred random instructions write to a few pages
+
+
+def test_columns():
+	np.random.seed(7)
+	trace = Trace(get_initial_state())
+	for _ in range(2000): trace.step_forward()
+
+	store = trace.diffs
+	assert len(store) == 2000
+	assert store.nbytes() < 2000 * 40 # a few bytes a step, not a few objects
+	assert store[-1].registers == store[1999].registers
+	assert 'PC' in [name for name, old, new in store[0].registers]
+	with pytest.raises(IndexError): store[2000]
+
+	# a step read back out of the columns moves a state like the store does.
+	state = trace.current_state()
+	copy = state.clone()
+	store[1999].revert(copy)
+	trace.step_backward()
+	assert copy == state and copy.CYCLES == state.CYCLES
+	assert type(state.Z) is bool
+
+
+@pytest.mark.parametrize('window', [{ 'window_steps': 100 }, { 'window_steps': 10 ** 6, 'window_bytes': 600 }])
+def test_ring_keeps_the_window(window):
+	np.random.seed(8)
+	trace = RingTrace(get_initial_state(), **window)
+	state = trace.current_state()
+	data, offsets = trace.data, trace.offsets
+
+	seen = [snapshot(state)]
+	for _ in range(1000):
+		trace.step_forward()
+		seen.append(snapshot(state))
+
+	assert trace.data is data and trace.offsets is offsets # nothing reallocated
+	assert trace.end == trace.position == 1000
+	assert 0 < trace.start and 1000 - trace.start <= 100
+
+	# the base is the state at the window's edge.
+	trace.restore()
+	assert snapshot(state) == seen[trace.start]
+
+	for target in [1000, trace.start + 1, 999, (trace.start + 1000) // 2]:
+		trace.seek(target)
+		assert snapshot(state) == seen[target]
+	with pytest.raises(ValueError): trace.seek(trace.start - 1)
+
+	# stepping back stops at the edge.
+	trace.seek(1000)
+	for expected in reversed(seen[trace.start:-1]):
+		trace.step_backward()
+		assert snapshot(state) == expected
+	trace.step_backward()
+	assert trace.position == trace.start and snapshot(state) == seen[trace.start]
+
+	# and forward replays, then records again.
+	while trace.position < 1000: trace.step_forward()
+	assert snapshot(state) == seen[1000]
+	trace.seek(1010)
+	assert trace.end == trace.position == 1010
+
+
+def test_ring_matches_trace():
+	np.random.seed(9)
+	initial = get_initial_state()
+	ring, trace = RingTrace(initial.clone(), window_steps=50, window_bytes=1000), Trace(initial)
+
+	for _ in range(300):
+		ring.step_forward()
+		trace.step_forward()
+	assert ring.current_state() == trace.current_state()
+
+	trace.seek(ring.start)
+	ring.restore()
+	assert ring.current_state() == trace.current_state()
+	assert ring.current_state().CYCLES == trace.current_state().CYCLES
+
+	with pytest.raises(ValueError): RingTrace(State(), window_bytes=4).step_forward()
+
+
+@pytest.mark.parametrize('kind', [Trace, RingTrace])
+def test_recording_stops_at_hlt(kind):
+	state = get_initial_state()
+	state.MEM[0x0:0x4] = bytes([0x76, 0x3C, 0x3C, 0x3C]) # hlt; inr a; inr a; inr a
+	state.A = 0
+	trace = kind(state)
+
+	for _ in range(4): trace.step_forward()
+	assert trace.position == 1
+	assert state.HALTED and state.PC == 0x1 and state.A == 0
+
+	# seeking past the hlt stops at it, rather than waiting forever.
+	trace.seek(10)
+	assert trace.position == 1
+
+	# stepping back over the hlt wakes the cpu, and it halts again.
+	trace.step_backward()
+	assert not state.HALTED
+	trace.seek(5)
+	assert trace.position == 1 and state.HALTED
@@ -0,0 +1,114 @@
+import pytest
+import numpy as np
+
+from emulator.state import State, initialize_state_from_rom
+from emulator.step import run
+from emulator.trace import Trace
+from emulator.tracefile import TraceWriter, TraceFile, TraceFileError, record, NONE, ZLIB
+
+from test.test_ops_base import get_initial_state
+
+
+def recorded(path, compression, steps=1000, chunk_steps=128, seed=8):
+	np.random.seed(seed)
+	state = get_initial_state()
+	trace = Trace(state, writer=TraceWriter(path, state, compression, chunk_steps))
+	for _ in range(steps): trace.step_forward()
+	trace.close()
+	return trace
+
+
+@pytest.mark.parametrize('compression', [NONE, ZLIB])
+def test_replay_matches_trace(tmp_path, compression):
+	path = tmp_path / 'run.trace'
+	trace = recorded(path, compression)
+
+	trace_file = TraceFile(path)
+	assert len(trace_file) == 1000
+	assert len(trace_file.index) == 8 # 7 full chunks of 128, and the rest
+
+	replay = trace_file.replay()
+	for target in [0, 1000, 500, 128, 127, 129, 999, 640, 3, 1000, 0]:
+		replay.seek(target)
+		trace.seek(target)
+		assert replay.current_state() == trace.current_state(), target
+		assert replay.current_state().CYCLES == trace.current_state().CYCLES
+
+	replay.seek(200)
+	trace.seek(200)
+	for _ in range(100): replay.step_backward(); trace.step_backward()
+	assert replay.current_state() == trace.current_state()
+
+	with pytest.raises(ValueError): replay.seek(1001)
+	replay.seek(1000)
+	replay.step_forward() # nothing past the end
+	assert replay.position == 1000
+	replay.close()
+
+
+def test_columns_are_mapped(tmp_path):
+	path = tmp_path / 'run.trace'
+	recorded(path, NONE)
+
+	trace_file = TraceFile(path)
+	registers, cycles, memory, store = trace_file.chunk(3)
+	assert isinstance(store.register_ids, memoryview) and isinstance(memory, memoryview)
+	assert len(store) == 128
+	assert store[0].registers # every step moves PC
+
+
+def test_unfinished_file(tmp_path):
+	# a writer that never closed leaves whole chunks and no index.
+	path = tmp_path / 'run.trace'
+	np.random.seed(9)
+	state = get_initial_state()
+	writer = TraceWriter(path, state, chunk_steps=100)
+	trace = Trace(state, writer=writer)
+	for _ in range(250): trace.step_forward()
+
+	trace_file = TraceFile(path)
+	assert len(trace_file) == 200 and len(trace_file.index) == 2
+
+	replay = trace_file.replay()
+	replay.seek(150)
+	trace.seek(150)
+	assert replay.current_state() == trace.current_state()
+	writer.close()
+
+
+def test_record(tmp_path):
+	rom = bytes([0x04, 0x32, 0x00, 0x20, 0xC3, 0x00, 0x00]) # inr b; sta 0x2000; jmp 0
+	path = tmp_path / 'run.trace'
+	state = record(initialize_state_from_rom(rom), path, 30000, ZLIB, chunk_steps=4096)
+
+	expected = initialize_state_from_rom(rom)
+	run(expected, 30000)
+	assert state == expected
+	assert state.MAP is None # the write log is gone
+
+	trace_file = TraceFile(path)
+	assert len(trace_file) == 30000
+	assert path.stat().st_size < 8 * 65536 # zlib squeezes the keyframes and the columns
+
+	replay = trace_file.replay()
+	replay.seek(29999)
+	replay.step_forward()
+	assert replay.current_state() == expected
+	assert replay.current_state().MEM[0x2000] == expected.A
+
+
+def test_bad_files(tmp_path):
+	path = tmp_path / 'run.trace'
+	path.write_bytes(b'')
+	with pytest.raises(TraceFileError): TraceFile(path)
+
+	path.write_bytes(b'not a trace file, but long enough to be one')
+	with pytest.raises(TraceFileError): TraceFile(path)
+
+	with TraceWriter(path, State()): pass
+	data = bytearray(path.read_bytes())
+	assert len(TraceFile(path)) == 0
+
+	data[8] = 99 # version
+	path.write_bytes(data)
+	with pytest.raises(TraceFileError): TraceFile(path)
@@ -0,0 +1,138 @@
+import pytest
+
+from emulator.state import initialize_state_from_rom
+from emulator.step import DISPATCH_TABLE
+from emulator.runner import run_state, StopReason
+from emulator.memory import invaders_map, ALL_RAM
+from emulator.watch import Watchpoints, READ, WRITE
+
+
+PROGRAM = bytes([
+	0x31, 0x00, 0x24, # 0x00 lxi sp, 0x2400
+	0x3E, 0x5A,       # 0x03 mvi a, 0x5a
+	0x32, 0xF0, 0x20, # 0x05 sta 0x20f0
+	0x21, 0xF0, 0x20, # 0x08 lxi h, 0x20f0
+	0x46,             # 0x0B mov b, m
+	0xC5,             # 0x0C push b
+	0xD1,             # 0x0D pop d
+	0x76,             # 0x0E hlt
+])
+
+
+def watched(rom=PROGRAM, memory=None):
+	state = initialize_state_from_rom(rom)
+	if memory: memory.install(state)
+	return state, Watchpoints(state)
+
+
+def test_no_watchpoints_costs_nothing():
+	state, watchpoints = watched()
+
+	assert state.PAGES is ALL_RAM
+	assert watchpoints.dispatch is DISPATCH_TABLE
+	assert run_state(state, watchpoints=watchpoints).reason == StopReason.HALTED
+
+
+def test_write_watchpoint():
+	state, watchpoints = watched()
+	watchpoints.add(0x20F0)
+	result = run_state(state, watchpoints=watchpoints)
+
+	assert result.reason == StopReason.WATCHPOINT
+	assert result.watchpoint.kind == WRITE
+	assert result.watchpoint.pc == 0x0005
+	assert result.watchpoint.address == 0x20F0
+	assert (result.watchpoint.old, result.watchpoint.new) == (0x00, 0x5A)
+	assert result.pc == 0x0008 # the op finished
+	assert result.steps == 3
+	assert state.MEM[0x20F0] == 0x5A
+
+
+def test_unwatched_bytes_on_a_watched_page():
+	state, watchpoints = watched()
+	watchpoints.add(0x20F1, 0x2100)
+	result = run_state(state, watchpoints=watchpoints)
+
+	assert result.reason == StopReason.HALTED
+	assert state.MEM[0x20F0] == 0x5A
+
+
+def test_read_watchpoint():
+	state, watchpoints = watched()
+	watchpoints.add(0x20F0, read=True, write=False)
+	result = run_state(state, watchpoints=watchpoints)
+
+	assert result.reason == StopReason.WATCHPOINT
+	assert result.watchpoint.kind == READ
+	assert result.watchpoint.pc == 0x000B
+	assert (result.watchpoint.old, result.watchpoint.new) == (0x5A, 0x5A)
+	assert state.B == 0x5A
+
+
+def test_stack_watchpoints():
+	# push writes 0x23FF and 0x23FE; pop reads them back.
+	state, watchpoints = watched()
+	watchpoints.add(0x23FE, 0x2400)
+	result = run_state(state, watchpoints=watchpoints)
+
+	assert result.watchpoint.pc == 0x000C
+	assert result.watchpoint.address == 0x23FF
+	assert state.MEM[0x23FE] == 0x00 and state.SP == 0x23FE # the whole push happened
+
+	watchpoints.clear()
+	watchpoints.add(0x23FE, 0x2400, read=True, write=False)
+	result = run_state(state, watchpoints=watchpoints)
+
+	assert result.watchpoint.kind == READ
+	assert result.watchpoint.pc == 0x000D
+	assert state.D == 0x5A
+
+
+def test_watch_through_mirror():
+	rom = bytes([
+		0x3E, 0x11,       # mvi a, 0x11
+		0x32, 0xF0, 0x40, # sta 0x40f0 ; mirror of 0x20f0
+		0x76,             # hlt
+	])
+	state, watchpoints = watched(rom, invaders_map())
+	watchpoints.add(0x20F0)
+	result = run_state(state, watchpoints=watchpoints)
+
+	assert result.reason == StopReason.WATCHPOINT
+	assert result.watchpoint.address == 0x40F0
+	assert result.watchpoint.new == state.MEM[0x20F0] == state.MEM[0xE0F0] == 0x11
+
+
+def test_rom_write_watchpoint():
+	rom = bytes([
+		0x3E, 0x11,       # mvi a, 0x11
+		0x32, 0x00, 0x00, # sta 0x0000
+		0x76,             # hlt
+	])
+	state, watchpoints = watched(rom, invaders_map())
+	watchpoints.add(0x0000)
+	result = run_state(state, watchpoints=watchpoints)
+
+	# the write was seen, and ROM ignored it.
+	assert result.watchpoint.old == result.watchpoint.new == 0x3E
+
+
+def test_remove_and_detach():
+	memory = invaders_map()
+	state, watchpoints = watched(memory=memory)
+	watchpoints.add(0x20F0, read=True)
+	watchpoints.remove(0x20F0)
+
+	assert state.PAGES is memory.FAST
+	assert watchpoints.dispatch is DISPATCH_TABLE
+
+	watchpoints.add(0x20F0)
+	watchpoints.detach()
+	assert state.MAP is memory
+	assert state.PAGES is memory.FAST
+
+
+def test_bad_range():
+	state, watchpoints = watched()
+	with pytest.raises(ValueError):
+		watchpoints.add(0xFFFF, 0x10001)